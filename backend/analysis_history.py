@@ -0,0 +1,279 @@
+# Analysis history: every extraction and score, keyed by image hash, plus
+# aggregate tables kept up to date on each insert (SQLite-backed)
+#
+# One row per distinct plan image. A re-upload bumps its upload count and,
+# if its layout, score or city changed, moves its contribution in the
+# aggregates instead of counting the plan twice. Dashboards read the
+# aggregate tables directly; nothing scans the history rows.
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+from ruleset import base_room
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = os.getenv(
+    "HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.sqlite3"),
+)
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "100"))
+# Score histogram bucket width (0-9, 10-19, ... 100)
+SCORE_BUCKET = 10
+
+# Aggregates are kept per city and for everything (city = '')
+ALL_CITIES = ''
+
+
+def normalize_city(raw):
+    return ' '.join(str(raw or '').split()).lower()[:80]
+
+
+class AnalysisHistory:
+    """SQLite store of analyses with incrementally maintained aggregates.
+
+    Several processes may share the file; each insert and its aggregate
+    updates commit in one IMMEDIATE transaction. Write failures are logged
+    and never fail the request that produced the analysis.
+    """
+
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.stats = {"recorded": 0, "repeats": 0, "errors": 0}
+        if self.db_path:
+            self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " image_hash TEXT NOT NULL UNIQUE,"
+            " city TEXT NOT NULL DEFAULT '',"
+            " source TEXT,"
+            " language TEXT,"
+            " score INTEGER NOT NULL,"
+            " layout TEXT NOT NULL,"
+            " uploads INTEGER NOT NULL DEFAULT 1,"
+            " created REAL NOT NULL,"
+            " last_seen REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_analyses_city ON analyses(city, id);"
+            # room x direction of each analysis, for filtered history queries
+            "CREATE TABLE IF NOT EXISTS analysis_rooms ("
+            " analysis_id INTEGER NOT NULL,"
+            " room TEXT NOT NULL,"
+            " direction TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_analysis_rooms_lookup ON analysis_rooms(room, direction, analysis_id);"
+            "CREATE INDEX IF NOT EXISTS idx_analysis_rooms_owner ON analysis_rooms(analysis_id);"
+            # Aggregates
+            "CREATE TABLE IF NOT EXISTS agg_totals ("
+            " city TEXT PRIMARY KEY, analyses INTEGER NOT NULL, score_sum INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS agg_score_histogram ("
+            " city TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (city, bucket));"
+            "CREATE TABLE IF NOT EXISTS agg_room_directions ("
+            " city TEXT NOT NULL, room TEXT NOT NULL, direction TEXT NOT NULL, count INTEGER NOT NULL,"
+            " PRIMARY KEY (city, room, direction));"
+        )
+
+    # --- Aggregate maintenance ---
+
+    @staticmethod
+    def _apply(conn, city, score, pairs, sign):
+        """Add (sign=1) or remove (sign=-1) one analysis from the aggregates."""
+        bucket = min(score, 100) // SCORE_BUCKET
+        for c in {ALL_CITIES, city}:
+            conn.execute(
+                "INSERT INTO agg_totals (city, analyses, score_sum) VALUES (?, ?, ?)"
+                " ON CONFLICT(city) DO UPDATE SET analyses = analyses + excluded.analyses,"
+                " score_sum = score_sum + excluded.score_sum",
+                (c, sign, sign * score),
+            )
+            conn.execute(
+                "INSERT INTO agg_score_histogram (city, bucket, count) VALUES (?, ?, ?)"
+                " ON CONFLICT(city, bucket) DO UPDATE SET count = count + excluded.count",
+                (c, bucket, sign),
+            )
+            conn.executemany(
+                "INSERT INTO agg_room_directions (city, room, direction, count) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(city, room, direction) DO UPDATE SET count = count + excluded.count",
+                [(c, room, direction, sign) for room, direction in pairs],
+            )
+
+    @staticmethod
+    def _pairs(layout):
+        # Each room type counts once per direction per plan
+        return sorted({(base_room(room), direction) for room, direction in layout.items()})
+
+    def record(self, image_hash, layout, score, source=None, language=None, city=None):
+        """Store one analysis and fold it into the aggregates.
+
+        Returns the analysis id, or None if the store is disabled or the
+        write failed.
+        """
+        if not self.db_path or not image_hash:
+            return None
+        city = normalize_city(city)
+        pairs = self._pairs(layout)
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, city, score, layout FROM analyses WHERE image_hash = ?", (image_hash,)
+                ).fetchone()
+                if row is None:
+                    analysis_id = conn.execute(
+                        "INSERT INTO analyses (image_hash, city, source, language, score, layout,"
+                        " created, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (image_hash, city, source, language, score,
+                         json.dumps(layout, ensure_ascii=False), now, now),
+                    ).lastrowid
+                    self._apply(conn, city, score, pairs, 1)
+                    changed = True
+                else:
+                    analysis_id = row["id"]
+                    # A repeat upload keeps its first city unless a new one is given
+                    city = city or row["city"]
+                    old_layout = json.loads(row["layout"])
+                    changed = (city, score, layout) != (row["city"], row["score"], old_layout)
+                    if changed:
+                        self._apply(conn, row["city"], row["score"], self._pairs(old_layout), -1)
+                        self._apply(conn, city, score, pairs, 1)
+                        conn.execute("DELETE FROM analysis_rooms WHERE analysis_id = ?", (analysis_id,))
+                    conn.execute(
+                        "UPDATE analyses SET city = ?, source = ?, language = ?, score = ?, layout = ?,"
+                        " uploads = uploads + 1, last_seen = ? WHERE id = ?",
+                        (city, source, language, score, json.dumps(layout, ensure_ascii=False),
+                         now, analysis_id),
+                    )
+                if changed:
+                    conn.executemany(
+                        "INSERT INTO analysis_rooms (analysis_id, room, direction) VALUES (?, ?, ?)",
+                        [(analysis_id, room, direction) for room, direction in pairs],
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.warning("History write failed: %s", e)
+            return None
+        self.stats["recorded" if row is None else "repeats"] += 1
+        return analysis_id
+
+    def rebuild_aggregates(self):
+        """Recompute every aggregate from the history rows (repair / migration)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("agg_totals", "agg_score_histogram", "agg_room_directions", "analysis_rooms"):
+                conn.execute(f"DELETE FROM {table}")
+            for row in conn.execute("SELECT id, city, score, layout FROM analyses").fetchall():
+                pairs = self._pairs(json.loads(row["layout"]))
+                self._apply(conn, row["city"], row["score"], pairs, 1)
+                conn.executemany(
+                    "INSERT INTO analysis_rooms (analysis_id, room, direction) VALUES (?, ?, ?)",
+                    [(row["id"], room, direction) for room, direction in pairs],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- Queries ---
+
+    def page(self, limit=20, before=None, city=None, room=None, direction=None, image_hash=None):
+        """Newest-first page of analyses.
+
+        Keyset pagination: pass the returned `next` as `before` for the
+        following page. `room` / `direction` keep analyses that have that
+        room (in that direction).
+        """
+        limit = max(1, min(HISTORY_PAGE_MAX, int(limit)))
+        where, args = [], []
+        if before is not None:
+            where.append("a.id < ?")
+            args.append(int(before))
+        if city:
+            where.append("a.city = ?")
+            args.append(normalize_city(city))
+        if image_hash:
+            where.append("a.image_hash = ?")
+            args.append(image_hash)
+        if room or direction:
+            sub = ["r.analysis_id = a.id"]
+            if room:
+                sub.append("r.room = ?")
+                args.append(base_room(room))
+            if direction:
+                sub.append("r.direction = ?")
+                args.append(direction)
+            where.append(f"EXISTS (SELECT 1 FROM analysis_rooms r WHERE {' AND '.join(sub)})")
+        sql = "SELECT a.* FROM analyses a"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY a.id DESC LIMIT ?"
+        rows = self._conn().execute(sql, args + [limit + 1]).fetchall()
+        items = [{
+            "id": row["id"],
+            "image_hash": row["image_hash"],
+            "city": row["city"] or None,
+            "source": row["source"],
+            "language": row["language"],
+            "score": row["score"],
+            "layout": json.loads(row["layout"]),
+            "uploads": row["uploads"],
+            "created": row["created"],
+            "last_seen": row["last_seen"],
+        } for row in rows[:limit]]
+        return {"items": items, "next": items[-1]["id"] if len(rows) > limit else None}
+
+    def aggregates(self, city=None, room=None):
+        """Precomputed totals, score histogram and room x direction counts."""
+        city = normalize_city(city)
+        conn = self._conn()
+        totals = conn.execute(
+            "SELECT analyses, score_sum FROM agg_totals WHERE city = ?", (city,)).fetchone()
+        analyses = totals["analyses"] if totals else 0
+        counts = dict(conn.execute(
+            "SELECT bucket, count FROM agg_score_histogram WHERE city = ?", (city,)).fetchall())
+        # Ordered buckets; the last one is a perfect 100
+        histogram = [{"min": b * SCORE_BUCKET, "max": min(b * SCORE_BUCKET + SCORE_BUCKET - 1, 100),
+                      "count": counts.get(b, 0)} for b in range(100 // SCORE_BUCKET + 1)]
+        sql = "SELECT room, direction, count FROM agg_room_directions WHERE city = ? AND count > 0"
+        args = [city]
+        if room:
+            sql += " AND room = ?"
+            args.append(base_room(room))
+        rooms = {}
+        for row in conn.execute(sql + " ORDER BY room, count DESC", args):
+            rooms.setdefault(row["room"], {})[row["direction"]] = row["count"]
+        return {
+            "city": city or None,
+            "analyses": analyses,
+            "mean_score": round(totals["score_sum"] / analyses, 1) if analyses else None,
+            "score_histogram": histogram,
+            "room_directions": rooms,
+        }
+
+    def cities(self):
+        return [row["city"] for row in self._conn().execute(
+            "SELECT city FROM agg_totals WHERE city != '' AND analyses > 0 ORDER BY analyses DESC")]
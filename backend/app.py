@@ -1,48 +1,51 @@
 import os
 import json
-import google.generativeai as genai
-from flask import Flask, request, jsonify, render_template
-from flask_cors import CORS
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from vastu_engine import analyze_vastu
-from PIL import Image
-import io
 
+# Load .env before the local modules read their settings
 load_dotenv()
 
+from metrics import (
+    register_collector, render as render_metrics, request_seconds, requests_total, setup_logging
+)
+
+setup_logging()
+
+from flask import Flask, Response, g, request, jsonify, render_template
+from flask_cors import CORS
+from PIL import UnidentifiedImageError
+from vastu_engine import analyze_vastu
+from extraction import (
+    MODEL_NAME, api_key, call_model, extract_plan, extraction_cache, finish_extraction,
+    history, is_quota_error, prepare_upload, record_analysis, router, similar_plans, stream_model, upstream,
+    UpstreamUnavailable
+)
+from progressive import ProgressiveAnalysis, error_event, ndjson
+from responses import COMPRESSIBLE_TYPES, compress, pick_language, scored_response_body
+from rescoring import rescore
+from ruleset_export import RULESET_MAX_AGE, get_export
+from layout_optimizer import InfeasibleLayout, optimize_layout
+from pdf_ingest import PdfPlanError, analyze_pdf, is_pdf
+from plan_geometry import PlanGeometry
+from job_queue import JobError, JobQueue, RetryableJobError
+import startup
+from upload_ingest import MAX_UPLOAD_BYTES, UnsafeImage, UploadTooLarge, detach_upload, memory_report
+from vector_plans import VectorPlanError
+
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 CORS(app)
+# Reject oversized bodies before they are parsed (headroom for the form fields)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
-    # Use the model that we confirmed working
-    model = genai.GenerativeModel('gemini-flash-latest')
-else:
-    print("WARNING: GEMINI_API_KEY not found in environment variables.")
-
-PROMPT = """
-You are an expert in architectural floor plan analysis.
-
-Analyze the uploaded house plan image.
-
-Extract:
-1. List of rooms with approximate position (top-left, bottom-right etc.)
-2. Identify room type (bedroom, kitchen, toilet, pooja room, hall, entrance)
-3. Estimate directional alignment assuming top of image is North.
-4. Return structured JSON format only.
-
-Do not explain. Return clean JSON.
-Example JSON:
-{
-  "entrance": "south",
-  "kitchen": "north-east",
-  "master_bedroom": "south-west",
-  "toilet": "north",
-  "pooja_room": "east"
-}
-"""
+# Batch analysis limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+BATCH_MAX_BYTES = int(float(os.getenv("BATCH_MAX_MB", "200")) * 1024 * 1024)
 
 @app.route('/')
 def home():
@@ -52,68 +55,77 @@ def home():
     except Exception as e:
         return f"Error loading UI: {str(e)}", 500
 
+def _request_language():
+    """Form/query `language` field first, then Accept-Language."""
+    return pick_language(request.form.get('language') or request.args.get('language'),
+                         request.headers.get('Accept-Language'))
+
+def _request_city():
+    return request.form.get('city') or request.args.get('city')
+
+def _analysis_response(data, language, room_weights=None, prepared=None, **extra):
+    # Assembled from pre-serialized cards; compressed in _compress()
+    score, body = scored_response_body(data, language, room_weights, **extra)
+    if prepared is not None:
+        record_analysis(prepared, data, score, language, _request_city())
+    response = Response(body, mimetype='application/json')
+    response.headers['Content-Language'] = language
+    response.vary.add('Accept-Language')
+    return response
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
-    print("Request received at /analyze")
-    if not api_key:
-        return jsonify({"error": "API Key not configured on server"}), 500
-
+    logger.info("Request received at /analyze")
     if 'image' not in request.files:
         return jsonify({"error": "No image uploaded"}), 400
     
     file = request.files['image']
-    
-    img_bytes = file.read()
-    print(f"Image received: {len(img_bytes)} bytes")
-    img = Image.open(io.BytesIO(img_bytes))
+    language = _request_language()
+
+    if is_pdf(file):
+        if not api_key:
+            return jsonify({"error": "API Key not configured on server"}), 500
+        return _analyze_pdf(file, language, _request_city())
+
+    try:
+        prepared = prepare_upload(file)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except UnsafeImage as e:
+        return jsonify({"error": f"Unsafe image: {str(e)}"}), 400
+    except VectorPlanError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnidentifiedImageError:
+        return jsonify({"error": "Uploaded file is not a supported image"}), 400
+
+    if prepared.ready:
+        return _analysis_response(prepared.data, language, prepared=prepared,
+                                  cached=prepared.cached, source=prepared.source)
+    # Only raster plans need the model (SVG/DXF and cache hits are served above)
+    if not api_key:
+        return jsonify({"error": "API Key not configured on server"}), 500
     
     try:
-        print("Sending request to Gemini...")
-        
-        response = model.generate_content([PROMPT, img])
-        print("Gemini Response received.")
-        # Extract JSON from response
-        raw_text = response.text
-        print(f"Raw Gemini Text: {raw_text}")
-        
+        raw_text = call_model(prepared)
 
-        # Helper to clean JSON string
-        def clean_json(text):
-            if "```json" in text:
-                try:
-                    text = text.split("```json")[1].split("```")[0]
-                except IndexError:
-                    pass
-            elif "```" in text:
-                try:
-                    text = text.split("```")[1].split("```")[0]
-                except IndexError:
-                    pass
-            return text.strip()
-
-        cleaned_text = clean_json(raw_text)
-        print(f"Cleaned JSON Text: {cleaned_text}")
-        
         try:
-            data = json.loads(cleaned_text)
+            data = finish_extraction(prepared, raw_text)
         except json.JSONDecodeError as je:
-            print(f"JSON Decode Error: {je}")
+            logger.warning("JSON Decode Error: %s", je)
             # Fallback: try to repair common JSON issues or return error
             return jsonify({"error": f"AI response was not valid JSON: {str(je)}"}), 500
         
         # Analyze Vastu using the engine
-        analysis = analyze_vastu(data)
-        
-        return jsonify({
-            "raw_data": data,
-            "analysis": analysis
-        })
+        return _analysis_response(data, language, prepared=prepared,
+                                  preprocessing=prepared.preprocessing, source=prepared.source)
         
+    except UpstreamUnavailable as e:
+        return _upstream_unavailable(e)
     except Exception as e:
-        print(f"Error during analysis: {str(e)}")
+        logger.error("Error during analysis: %s", e)
         
         # Check for quota exceeded error (429)
-        if "429" in str(e) or "quota" in str(e).lower():
+        if is_quota_error(e):
             # Return a specific error code for quota issues
             return jsonify({
                 "error": "API Quota Exceeded. Please try again in a minute.",
@@ -123,10 +135,427 @@ def analyze():
         # Fallback for demo if API fails or quota exceeded
         return jsonify({"error": str(e)}), 500
 
+def _analyze_pdf(file, language, city=None):
+    # Multi-floor plan set: every page is extracted and scored as a floor
+    try:
+        report = analyze_pdf(file, language, city)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except PdfPlanError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(report)
+    response.headers['Content-Language'] = language
+    response.vary.add('Accept-Language')
+    return response
+
+def _upstream_unavailable(e):
+    # Fail fast while Gemini is saturated; /jobs queues the work instead
+    response = jsonify({
+        "error": "AI service is busy. Please try again shortly.",
+        "details": str(e),
+        "retry_after": e.retry_after
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+def _batch_item(index, filename, file, language, city=None):
+    """Analyze one plan of a batch; failures are reported, not raised."""
+    result = {"index": index, "filename": filename}
+    try:
+        prepared, data = extract_plan(file)
+        analysis = analyze_vastu(data, language)
+        record_analysis(prepared, data, analysis["score"], language, city)
+        result.update({
+            "status": "ok",
+            "raw_data": data,
+            "analysis": analysis,
+            "cached": prepared.cached,
+            "source": prepared.source
+        })
+    except UploadTooLarge as e:
+        result.update({"status": "error", "code": 413, "error": str(e)})
+    except UnsafeImage as e:
+        result.update({"status": "error", "code": 400, "error": f"Unsafe image: {str(e)}"})
+    except VectorPlanError as e:
+        result.update({"status": "error", "code": 400, "error": str(e)})
+    except UnidentifiedImageError:
+        result.update({"status": "error", "code": 400, "error": "Uploaded file is not a supported image"})
+    except json.JSONDecodeError as je:
+        result.update({"status": "error", "code": 500, "error": f"AI response was not valid JSON: {str(je)}"})
+    except UpstreamUnavailable as e:
+        result.update({"status": "error", "code": 503, "error": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        logger.error("Error during batch item %d: %s", index, e)
+        if is_quota_error(e):
+            result.update({"status": "error", "code": 429, "error": "API Quota Exceeded. Please try again in a minute."})
+        else:
+            result.update({"status": "error", "code": 500, "error": str(e)})
+    finally:
+        file.close()
+    return result
+
+@app.route('/analyze/geometry', methods=['POST'])
+def analyze_geometry():
+    """Score a plan from room outlines instead of an image (no model call).
+
+    JSON body: rooms ([{room, bbox: [x0, y0, x1, y1]} or {room, polygon:
+    [[x, y], ...]}]), bounds (plan outline, default the rooms' extent),
+    zones (8 or 16), north (degrees clockwise from the top), language.
+    Each room scores by its area share in every zone; its card is for the
+    zone holding most of it.
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        plan = PlanGeometry.from_json(body)
+        layout, weights, report = plan.layout(), plan.room_weights(), plan.report()
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    language = pick_language(body.get('language'), request.headers.get('Accept-Language'))
+    return _analysis_response(layout, language, room_weights=weights, geometry=report)
+
+@app.route('/analyze/delta', methods=['POST'])
+def analyze_delta():
+    """Re-score a previous analysis after room edits (no image, no model call).
+
+    JSON body: token (the `analysis_token` of the last response) and rooms
+    ({room: new direction, or null to remove it}). Returns a patch: score,
+    score_delta, the changed rooms' cards (`added`), `removed` rooms and the
+    next analysis_token (see rescoring.py).
+    """
+    body = request.get_json(silent=True) or {}
+    token = body.get('token')
+    if not isinstance(token, str) or not token:
+        return jsonify({"error": "Provide the 'token' of a previous analysis"}), 400
+    try:
+        patch = rescore(token, body.get('rooms'))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(patch, mimetype='application/json')
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many plans in one request, streaming NDJSON as each finishes.
+
+    Each line is one plan's result (with its upload `index`); a final
+    `{"done": true, ...}` line summarizes the batch.
+    """
+    logger.info("Request received at /analyze/batch")
+    if not api_key:
+        return jsonify({"error": "API Key not configured on server"}), 500
+
+    # The batch body may legitimately be larger than a single upload
+    request.max_content_length = BATCH_MAX_BYTES
+    files = request.files.getlist('images') + request.files.getlist('image')
+    if not files:
+        return jsonify({"error": "No images uploaded"}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"Too many images: limit is {BATCH_MAX_FILES} per batch"}), 400
+    language = _request_language()
+    city = _request_city()
+    items = []
+    try:
+        for i, f in enumerate(files):
+            items.append((i, f.filename, detach_upload(f)))
+    except UploadTooLarge as e:
+        for _, _, spool in items:
+            spool.close()
+        return jsonify({"error": f"{files[len(items)].filename}: {e}"}), 413
+
+    def generate():
+        ok = failed = 0
+        with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as pool:
+            futures = [pool.submit(_batch_item, i, name, spool, language, city) for i, name, spool in items]
+            for future in as_completed(futures):
+                result = future.result()
+                if result["status"] == "ok":
+                    ok += 1
+                else:
+                    failed += 1
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "total": len(files), "ok": ok, "failed": failed}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """Analyze one plan, streaming NDJSON events as the model answers.
+
+    `{"event": "room", ...}` carries each room's suggestion card as soon as
+    the model has named its direction; a final `{"event": "result", ...}`
+    has the full analysis (or `{"event": "error", "code": ...}`).
+    """
+    logger.info("Request received at /analyze/stream")
+    if 'image' not in request.files:
+        return jsonify({"error": "No image uploaded"}), 400
+    language = _request_language()
+    progress = ProgressiveAnalysis(language, started=g.request_start, city=_request_city())
+
+    try:
+        prepared = prepare_upload(request.files['image'])
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except UnsafeImage as e:
+        return jsonify({"error": f"Unsafe image: {str(e)}"}), 400
+    except VectorPlanError as e:
+        return jsonify({"error": str(e)}), 400
+    except UnidentifiedImageError:
+        return jsonify({"error": "Uploaded file is not a supported image"}), 400
+    if not (prepared.ready or api_key):
+        return jsonify({"error": "API Key not configured on server"}), 500
+
+    def generate():
+        try:
+            if prepared.ready:
+                for event in progress.replay(prepared.data):
+                    yield ndjson(event)
+                yield ndjson(progress.result(prepared.data, prepared, cached=prepared.cached, source=prepared.source))
+                return
+            for text in stream_model(prepared):
+                for event in progress.feed(text):
+                    yield ndjson(event)
+            data = finish_extraction(prepared, progress.text)
+            yield ndjson(progress.result(data, prepared, preprocessing=prepared.preprocessing, source=prepared.source))
+        except Exception as e:
+            logger.error("Error during streamed analysis: %s", e)
+            yield ndjson(error_event(e))
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _run_job(file, params):
+    """Job handler: same pipeline as /analyze, run on a queue worker."""
+    if is_pdf(file):
+        try:
+            return analyze_pdf(file, params.get('language', 'en'), params.get('city'))
+        except UploadTooLarge as e:
+            raise JobError(str(e), 413)
+        except PdfPlanError as e:
+            raise JobError(str(e), 400)
+    try:
+        prepared, data = extract_plan(file)
+    except UploadTooLarge as e:
+        raise JobError(str(e), 413)
+    except UnsafeImage as e:
+        raise JobError(f"Unsafe image: {str(e)}", 400)
+    except VectorPlanError as e:
+        raise JobError(str(e), 400)
+    except UnidentifiedImageError:
+        raise JobError("Uploaded file is not a supported image", 400)
+    except json.JSONDecodeError as je:
+        raise JobError(f"AI response was not valid JSON: {str(je)}", 500)
+    except UpstreamUnavailable as e:
+        raise RetryableJobError(str(e))
+    except Exception as e:
+        if is_quota_error(e):
+            raise RetryableJobError(str(e))
+        raise
+    language = params.get('language', 'en')
+    analysis = analyze_vastu(data, language)
+    record_analysis(prepared, data, analysis["score"], language, params.get('city'))
+    return {
+        "raw_data": data,
+        "analysis": analysis,
+        "cached": prepared.cached,
+        "source": prepared.source
+    }
+
+job_queue = JobQueue(_run_job)
+
+@app.before_request
+def _start_job_workers():
+    g.request_start = time.perf_counter()
+    # Started lazily so each (possibly forked) worker process runs its own pool
+    job_queue.start()
+
+@app.after_request
+def _record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    start = g.get('request_start')
+    if start is not None:
+        # Streamed bodies (batch) are timed up to the first byte
+        request_seconds.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+    requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.after_request
+def _compress(response):
+    # Streamed bodies (batch, stream) and files are sent as they are
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    if not response.mimetype.startswith(COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = compress(response.get_data(), request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@register_collector
+def _job_metrics():
+    jobs = job_queue.metrics()
+    yield ("vastu_jobs", "gauge", "Jobs by status.",
+           [({"status": "queued"}, jobs["queue_depth"])] +
+           [({"status": k}, jobs[k]) for k in ("running", "done", "failed")])
+    yield ("vastu_jobs_oldest_queued_age_seconds", "gauge", "Age of the oldest queued job.",
+           [({}, jobs["oldest_queued_age_seconds"])])
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    if not api_key:
+        return jsonify({"error": "API Key not configured on server"}), 500
+    if 'image' not in request.files:
+        return jsonify({"error": "No image uploaded"}), 400
+    try:
+        priority = max(-10, min(10, int(request.form.get('priority', 0))))
+    except ValueError:
+        return jsonify({"error": "priority must be an integer"}), 400
+
+    job_id = job_queue.submit(
+        request.files['image'],
+        params={"language": _request_language(), "city": _request_city()},
+        priority=priority,
+    )
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status/result. `?wait=N` long-polls up to N seconds for completion."""
+    try:
+        wait = max(0.0, min(60.0, float(request.args.get('wait', 0))))
+    except ValueError:
+        wait = 0.0
+    job = job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/jobs/metrics', methods=['GET'])
+def job_metrics():
+    return jsonify(job_queue.metrics())
+
+@app.route('/optimize', methods=['POST'])
+def optimize():
+    """Best achievable room placements for a room list and constraints.
+
+    JSON body: rooms (list), fixed ({room: direction}), forbidden (list of
+    zones or {room: [zones]}), one_room_per_zone (bool, default true),
+    top_k (default 5), current (optional existing layout), language.
+    """
+    body = request.get_json(silent=True) or {}
+    rooms = body.get('rooms') or list((body.get('current') or {}).keys())
+    if not rooms or not isinstance(rooms, list):
+        return jsonify({"error": "Provide 'rooms' (list) or a 'current' layout"}), 400
+    try:
+        top_k = max(1, min(50, int(body.get('top_k', 5))))
+        result = optimize_layout(
+            rooms,
+            fixed=body.get('fixed'),
+            forbidden=body.get('forbidden'),
+            one_room_per_zone=bool(body.get('one_room_per_zone', True)),
+            top_k=top_k,
+            current=body.get('current'),
+        )
+    except (InfeasibleLayout, ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Full cards for the winning layout so the UI can render it directly
+    best = result["alternatives"][0]
+    language = pick_language(body.get('language'), request.headers.get('Accept-Language'))
+    best["analysis"] = analyze_vastu(best["layout"], language)
+    return jsonify(result)
+
+@app.route('/ruleset', methods=['GET'])
+def ruleset():
+    """Compact rules and translations for scoring on the client.
+
+    `?languages=ta` limits the card texts to those languages (English is
+    always included). Send the ETag back as If-None-Match to get a 304.
+    """
+    languages = [lang.strip() for lang in request.args.get('languages', '').split(',') if lang.strip()]
+    export = get_export(languages)
+    headers = {
+        'ETag': export.etag,
+        'Cache-Control': f'public, max-age={RULESET_MAX_AGE}',
+        'Vary': 'Accept-Encoding',
+        'X-Ruleset-Version': str(export.source.version),
+    }
+    if export.matches(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    body, encoding = export.encoded(request.headers.get('Accept-Encoding'))
+    response = Response(body, mimetype='application/json', headers=headers)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Past analyses, newest first.
+
+    Query: limit (default 20), before (the previous page's `next`), city,
+    room, direction, image_hash.
+    """
+    try:
+        page = history.page(
+            limit=request.args.get('limit', 20),
+            before=request.args.get('before'),
+            city=request.args.get('city'),
+            room=request.args.get('room'),
+            direction=request.args.get('direction'),
+            image_hash=request.args.get('image_hash'),
+        )
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+    return jsonify(page)
+
+@app.route('/history/aggregates', methods=['GET'])
+def history_aggregates():
+    """Precomputed dashboard numbers for a city (or everything): score
+    histogram and room x direction counts, optionally for one `room`."""
+    result = history.aggregates(city=request.args.get('city'), room=request.args.get('room'))
+    result["cities"] = history.cities()
+    return jsonify(result)
+
+@app.errorhandler(413)
+def too_large(e):
+    return jsonify({"error": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"}), 413
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({"status": "healthy", "api_key_set": bool(api_key), "model": "gemini-flash-latest"})
+    return jsonify({
+        "status": "healthy",
+        "api_key_set": bool(api_key),
+        "model": MODEL_NAME,
+        "extraction_cache": extraction_cache.stats,
+        "similar_plans": similar_plans.stats,
+        "memory": memory_report(),
+        "jobs": job_queue.metrics(),
+        "history": history.stats,
+        "upstream": upstream.report(),
+        "models": router.report()
+    })
+
+@app.route('/livez', methods=['GET'])
+def livez():
+    # Liveness: the process answers; nothing else is checked
+    return jsonify({"status": "alive"})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: preloaded and warmed up (see startup.py). One report, so
+    # the status code and the body can't disagree
+    report = startup.report()
+    if not report["ready"]:
+        startup.ensure_warm_up()
+        return jsonify({"status": "starting", **report}), 503
+    return jsonify({"status": "ready", **report})
 
 if __name__ == '__main__':
-    print("VastuAI Backend Running on http://localhost:5000")
+    # Development server; production runs `gunicorn` (see gunicorn.conf.py)
+    logger.info("VastuAI Backend Running on http://localhost:5000")
+    startup.warm_up()
     app.run(debug=True, port=5000)
@@ -0,0 +1,269 @@
+# Async (ASGI) serving mode
+#
+# Run with:  uvicorn asgi:app --port 5000
+#
+# /analyze (and its streaming variant) is served natively: the Gemini round trip is awaited on the event
+# loop (bounded by GEMINI_MAX_CONCURRENCY) so an in-flight analysis holds no
+# thread, while spooling, decoding and scoring run on a small executor.
+# Every other route is the regular Flask app mounted through a2wsgi.
+
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load .env before the local modules read their settings
+load_dotenv()
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from PIL import UnidentifiedImageError
+
+from app import app as flask_app
+import startup
+from metrics import request_seconds, requests_total
+from extraction import (
+    UpstreamUnavailable, api_key, call_model_async, finish_extraction, is_quota_error, prepare_upload,
+    record_analysis, stream_model_async
+)
+from progressive import ProgressiveAnalysis, error_event, ndjson
+from pdf_ingest import PdfPlanError, analyze_pdf, is_pdf
+from responses import compress, pick_language, scored_response_body
+from upload_ingest import MAX_UPLOAD_BYTES, UnsafeImage, UploadTooLarge
+from vector_plans import VectorPlanError
+
+# Upper bound on concurrent upstream model calls per process
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+# Threads for CPU-bound work (decode, hashing, preprocessing, scoring)
+ENGINE_WORKERS = int(os.getenv("ENGINE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+logger = logging.getLogger(__name__)
+
+engine_executor = ThreadPoolExecutor(max_workers=ENGINE_WORKERS, thread_name_prefix="engine")
+_model_semaphore = None
+
+
+def model_semaphore():
+    # Created lazily so it binds to the server's running loop
+    global _model_semaphore
+    if _model_semaphore is None:
+        _model_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+    return _model_semaphore
+
+
+async def run_engine(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(engine_executor, fn, *args)
+
+
+async def analyze(request):
+    start = time.perf_counter()
+    response = await _analyze(request)
+    request_seconds.observe(time.perf_counter() - start, endpoint='/analyze', method='POST')
+    requests_total.inc(endpoint='/analyze', method='POST', status=response.status_code)
+    return response
+
+
+def check_content_length(request):
+    """Error response for a malformed or oversized Content-Length, else None."""
+    length = request.headers.get('content-length')
+    if not length:
+        return None
+    try:
+        length = int(length)
+    except ValueError:
+        length = -1
+    if length < 0:
+        return JSONResponse({"error": "Invalid Content-Length header"}, status_code=400)
+    if length > MAX_UPLOAD_BYTES + 1024 * 1024:
+        return JSONResponse({"error": f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"}, status_code=413)
+    return None
+
+
+def request_language(request, form):
+    return pick_language(form.get('language') or request.query_params.get('language'),
+                         request.headers.get('accept-language'))
+
+
+def request_city(request, form):
+    return form.get('city') or request.query_params.get('city')
+
+
+def _analysis_response(request, data, language, extra, prepared, city):
+    # Pre-serialized cards, compressed here (the Flask app does it in after_request)
+    score, body = scored_response_body(data, language, **extra)
+    record_analysis(prepared, data, score, language, city)
+    body, encoding = compress(body, request.headers.get('accept-encoding'))
+    headers = {'Content-Language': language, 'Vary': 'Accept-Encoding, Accept-Language'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def _analyze_pdf(request, file, language, city):
+    # Blocks on one model call per floor, so it runs on the default executor
+    # rather than tying up the small engine pool
+    loop = asyncio.get_running_loop()
+    try:
+        report = await loop.run_in_executor(None, analyze_pdf, file, language, city)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except PdfPlanError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(report, headers={'Content-Language': language, 'Vary': 'Accept-Language'})
+
+
+async def _analyze(request):
+    logger.info("Request received at /analyze (async)")
+    rejected = check_content_length(request)
+    if rejected is not None:
+        return rejected
+
+    form = await request.form(max_part_size=MAX_UPLOAD_BYTES + 1)
+    try:
+        upload_file = form.get('image')
+        if upload_file is None or isinstance(upload_file, str):
+            return JSONResponse({"error": "No image uploaded"}, status_code=400)
+        language = request_language(request, form)
+        city = request_city(request, form)
+
+        if is_pdf(upload_file.file):
+            if not api_key:
+                return JSONResponse({"error": "API Key not configured on server"}, status_code=500)
+            return await _analyze_pdf(request, upload_file.file, language, city)
+
+        try:
+            prepared = await run_engine(prepare_upload, upload_file.file)
+        except UploadTooLarge as e:
+            return JSONResponse({"error": str(e)}, status_code=413)
+        except UnsafeImage as e:
+            return JSONResponse({"error": f"Unsafe image: {str(e)}"}, status_code=400)
+        except VectorPlanError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except UnidentifiedImageError:
+            return JSONResponse({"error": "Uploaded file is not a supported image"}, status_code=400)
+    finally:
+        await form.close()
+
+    if prepared.ready:
+        return await run_engine(_analysis_response, request, prepared.data, language,
+                                {"cached": prepared.cached, "source": prepared.source}, prepared, city)
+    # Only raster plans need the model (SVG/DXF and cache hits are served above)
+    if not api_key:
+        return JSONResponse({"error": "API Key not configured on server"}, status_code=500)
+
+    try:
+        async with model_semaphore():
+            raw_text = await call_model_async(prepared)
+
+        try:
+            data = await run_engine(finish_extraction, prepared, raw_text)
+        except json.JSONDecodeError as je:
+            logger.warning("JSON Decode Error: %s", je)
+            return JSONResponse({"error": f"AI response was not valid JSON: {str(je)}"}, status_code=500)
+
+        return await run_engine(_analysis_response, request, data, language,
+                                {"preprocessing": prepared.preprocessing, "source": prepared.source}, prepared, city)
+
+    except UpstreamUnavailable as e:
+        # Fail fast while Gemini is saturated; /jobs queues the work instead
+        return JSONResponse({
+            "error": "AI service is busy. Please try again shortly.",
+            "details": str(e),
+            "retry_after": e.retry_after
+        }, status_code=503, headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error("Error during analysis: %s", e)
+        if is_quota_error(e):
+            return JSONResponse({
+                "error": "API Quota Exceeded. Please try again in a minute.",
+                "details": "The free tier limit for the AI model has been reached."
+            }, status_code=429)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def analyze_stream(request):
+    """Streaming /analyze (NDJSON events); see app.analyze_stream."""
+    start = time.perf_counter()
+    response = await _analyze_stream(request, start)
+    # Streamed bodies are timed up to the first byte, as in the Flask app
+    request_seconds.observe(time.perf_counter() - start, endpoint='/analyze/stream', method='POST')
+    requests_total.inc(endpoint='/analyze/stream', method='POST', status=response.status_code)
+    return response
+
+
+async def _analyze_stream(request, start):
+    logger.info("Request received at /analyze/stream (async)")
+    rejected = check_content_length(request)
+    if rejected is not None:
+        return rejected
+
+    form = await request.form(max_part_size=MAX_UPLOAD_BYTES + 1)
+    try:
+        upload_file = form.get('image')
+        if upload_file is None or isinstance(upload_file, str):
+            return JSONResponse({"error": "No image uploaded"}, status_code=400)
+        language = request_language(request, form)
+        city = request_city(request, form)
+
+        try:
+            prepared = await run_engine(prepare_upload, upload_file.file)
+        except UploadTooLarge as e:
+            return JSONResponse({"error": str(e)}, status_code=413)
+        except UnsafeImage as e:
+            return JSONResponse({"error": f"Unsafe image: {str(e)}"}, status_code=400)
+        except VectorPlanError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except UnidentifiedImageError:
+            return JSONResponse({"error": "Uploaded file is not a supported image"}, status_code=400)
+    finally:
+        await form.close()
+    if not (prepared.ready or api_key):
+        return JSONResponse({"error": "API Key not configured on server"}, status_code=500)
+
+    progress = ProgressiveAnalysis(language, started=start, city=city)
+
+    async def generate():
+        try:
+            if prepared.ready:
+                for event in progress.replay(prepared.data):
+                    yield ndjson(event)
+                yield ndjson(await run_engine(lambda: progress.result(prepared.data, prepared, cached=prepared.cached, source=prepared.source)))
+                return
+            async with model_semaphore():
+                async for text in stream_model_async(prepared):
+                    for event in progress.feed(text):
+                        yield ndjson(event)
+            data = await run_engine(finish_extraction, prepared, progress.text)
+            yield ndjson(await run_engine(lambda: progress.result(data, prepared, preprocessing=prepared.preprocessing, source=prepared.source)))
+        except Exception as e:
+            logger.error("Error during streamed analysis: %s", e)
+            yield ndjson(error_event(e))
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+_cors = [Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+
+@asynccontextmanager
+async def lifespan(app):
+    # Preload and warm up before uvicorn starts accepting connections
+    await asyncio.get_running_loop().run_in_executor(None, startup.warm_up)
+    yield
+
+
+app = Starlette(lifespan=lifespan, routes=[
+    # Same permissive CORS as flask_cors gives the mounted routes
+    Route('/analyze', analyze, methods=['POST'], middleware=_cors),
+    Route('/analyze/stream', analyze_stream, methods=['POST'], middleware=_cors),
+    Mount('/', app=WSGIMiddleware(flask_app)),
+])
@@ -0,0 +1,218 @@
+# Offline micro-benchmarks for the engine and request pipeline
+#
+#   python bench.py                          # run, write bench_results.json
+#   python bench.py --save-baseline          # run and store as the baseline
+#   python bench.py --compare                # fail (exit 1) on regressions
+#   python bench.py --compare --threshold 0.15 --threshold-for preprocess_lineart_4k=0.5
+#
+# No API key or network needed: images are synthesized, the model is never called.
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+
+from vastu_engine import analyze_vastu
+from reply_parser import parse_layout
+from responses import analysis_response_body
+from plan_geometry import PlanGeometry
+from image_preprocess import preprocess
+from upload_ingest import Upload, open_plan
+from synthetic_plans import make_plan, make_vector_plan
+from vector_plans import parse_vector_plan
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = os.path.join(HERE, "bench_results.json")
+BASELINE_PATH = os.path.join(HERE, "bench_baseline.json")
+
+ROOMS = ['kitchen', 'master bedroom', 'toilet', 'entrance', 'pooja room', 'hall',
+         'dining', 'study', 'store room', 'balcony']
+DIRECTIONS = ['north', 'north-east', 'east', 'south-east', 'south', 'south-west', 'west', 'north-west']
+
+
+def make_layout(n, seed=0):
+    rng = random.Random(seed)
+    return {f"{ROOMS[i % len(ROOMS)]}{'' if i < len(ROOMS) else f' {i}'}": rng.choice(DIRECTIONS)
+            for i in range(n)}
+
+
+def make_geometry(n, seed=0):
+    """Random rooms on a 10k x 10k plan: boxes, L-shaped and slanted polygons."""
+    rng = random.Random(seed)
+    rooms = []
+    for i in range(n):
+        x, y = rng.uniform(0, 9000), rng.uniform(0, 9000)
+        w, h = rng.uniform(100, 1000), rng.uniform(100, 1000)
+        room = {"room": ROOMS[i % len(ROOMS)]}
+        if i % 10 == 9:
+            room["polygon"] = [[x, y], [x + w, y], [x + w, y + h / 2], [x + w / 2, y + h], [x, y + h]]
+        elif i % 3 == 2:
+            room["polygon"] = [[x, y], [x + w, y], [x + w, y + h / 2], [x + w / 2, y + h / 2],
+                               [x + w / 2, y + h], [x, y + h]]
+        else:
+            room["bbox"] = [x, y, x + w, y + h]
+        rooms.append(room)
+    return {"rooms": rooms, "bounds": [0, 0, 10000, 10000], "zones": 16}
+
+
+def _upload(data):
+    return Upload(io.BytesIO(data), len(data), None)
+
+
+def measure(fn, min_time=0.2, repeats=5):
+    """Best seconds per call over `repeats` runs of an auto-sized loop.
+
+    The minimum (as timeit recommends) is the least noisy estimate; slower
+    runs measure the machine, not the code.
+    """
+    fn()  # warm-up
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats or loops >= 1_000_000:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return min(samples), loops
+
+
+def benchmarks(quick=False):
+    cases = {}
+
+    for n in (1, 5, 20, 100):
+        layout = make_layout(n)
+        for lang in ('en', 'ta'):
+            cases[f"analyze_vastu_{n}rooms_{lang}"] = (lambda l=layout, g=lang: analyze_vastu(l, g))
+            cases[f"analysis_response_{n}rooms_{lang}"] = (lambda l=layout, g=lang: analysis_response_body(l, g))
+
+    for n in (30, 500):
+        plan = make_geometry(n)
+        cases[f"zone_shares_{n}rooms"] = (lambda b=plan: PlanGeometry.from_json(b).room_weights())
+
+    for n in (12, 200):
+        for fmt in ('svg', 'dxf'):
+            data = make_vector_plan(n, fmt)
+            cases[f"vector_parse_{fmt}_{n}rooms"] = (lambda d=data, f=fmt: parse_vector_plan(d, f))
+
+    replies = {
+        "fenced": '```json\n' + json.dumps(make_layout(8)) + '\n```',
+        "bare": json.dumps(make_layout(8)),
+        "prose": "Here is the analysis:\n```\n" + json.dumps(make_layout(8), indent=2) + "\n```\nDone.",
+        "structured": json.dumps({"rooms": [{"room": r, "direction": d} for r, d in make_layout(8).items()]}),
+        "trailing_comma": "```json\n" + json.dumps(make_layout(8), indent=2)[:-2] + ",\n}\n```",
+    }
+    for name, text in replies.items():
+        cases[f"json_cleanup_{name}"] = (lambda t=text: parse_layout(t))
+
+    images = {
+        "lineart_4k": make_plan((4000, 3000), 'JPEG', 'lineart'),
+        "photo_12mp": make_plan((4000, 3000), 'JPEG', 'photo'),
+        "lineart_png_1k": make_plan((1200, 900), 'PNG', 'lineart'),
+    }
+    if quick:
+        images = {k: v for k, v in images.items() if k.endswith('1k')}
+    for name, data in images.items():
+        cases[f"decode_{name}"] = (lambda d=data: open_plan(_upload(d)))
+
+        def run_preprocess(d=data):
+            up = _upload(d)
+            preprocess(open_plan(up), up)
+        cases[f"preprocess_{name}"] = run_preprocess
+
+    return cases
+
+
+def run(quick=False, only=None):
+    results = {}
+    min_time = 0.05 if quick else 0.3
+    for name, fn in benchmarks(quick).items():
+        if only and only not in name:
+            continue
+        seconds, loops = measure(fn, min_time=min_time)
+        results[name] = {"seconds": seconds, "loops": loops}
+        print(f"{name:40s} {seconds * 1e6:12.1f} us/op  ({loops} loops)")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold, overrides):
+    """Return the list of benchmarks slower than baseline by more than their threshold."""
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"{name:40s} (new, no baseline)")
+            continue
+        ratio = result["seconds"] / base["seconds"] - 1
+        limit = overrides.get(name, threshold)
+        flag = "REGRESSION" if ratio > limit else "ok"
+        print(f"{name:40s} {ratio:+7.1%}  (limit +{limit:.0%})  {flag}")
+        if ratio > limit:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vastu engine/pipeline micro-benchmarks.")
+    parser.add_argument('--quick', action='store_true', help="Shorter runs, small images only")
+    parser.add_argument('--only', help="Run benchmarks whose name contains this string")
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help="Compare with the baseline; exit 1 on regression")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed slowdown as a fraction (0.25 = 25%%)")
+    parser.add_argument('--threshold-for', action='append', default=[], metavar='NAME=FRACTION',
+                        help="Per-benchmark threshold override (repeatable)")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.threshold_for:
+        name, _, value = item.partition('=')
+        overrides[name] = float(value)
+
+    current = run(quick=args.quick, only=args.only)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 2
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, overrides)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
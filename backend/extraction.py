@@ -0,0 +1,433 @@
+# Floor-plan extraction pipeline (upload -> room/direction dict)
+#
+# Shared by the Flask app and the async (ASGI) server. The CPU/IO steps are
+# plain synchronous functions; only the model call differs between the two.
+
+import os
+import json
+import time
+import logging
+import threading
+
+from analysis_history import AnalysisHistory
+from extraction_cache import ExtractionCache, cache_key
+from plan_similarity import NearDuplicateIndex, dhash
+from image_preprocess import preprocess
+from upload_ingest import open_plan, spool_upload
+from vector_plans import VectorPlanError, parse_vector_plan, sniff_stream
+from upstream_guard import UpstreamGuard, UpstreamUnavailable, is_quota_error
+from model_router import ModelRouter, register_router_metrics
+from metrics import Counter, register_collector, stage_seconds, timed
+from reply_parser import parse_layout
+from vocabulary import CENTER, DIRECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for load tests (see fake_gemini.py); never calls the real API
+USE_FAKE_MODEL = os.getenv("GEMINI_FAKE", "").lower() in ("1", "true", "yes")
+# Append every raw model reply here (JSONL) to build a replay set for the stand-in
+RECORD_PATH = os.getenv("GEMINI_RECORD_PATH")
+
+# Ask for schema-constrained JSON (no fences or prose to strip). Set to 0 for
+# models that don't support response schemas; replies are repaired either way.
+STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+
+LAYOUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rooms": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "room": {"type": "string"},
+                    "direction": {"type": "string", "enum": list(DIRECTIONS) + [CENTER]},
+                },
+                "required": ["room", "direction"],
+            },
+        },
+    },
+    "required": ["rooms"],
+}
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": LAYOUT_SCHEMA,
+} if STRUCTURED_OUTPUT else None
+
+# Configure Gemini. Complex plans may go to another model and slow calls
+# are hedged (see model_router.py); MODEL_NAME is the default model.
+MODEL_NAME = os.getenv("GEMINI_MODEL", 'gemini-flash-latest')
+api_key = os.getenv("GEMINI_API_KEY")
+if USE_FAKE_MODEL:
+    # Separate name so fake replies never share cache entries with real ones
+    MODEL_NAME = 'fake-gemini'
+    api_key = api_key or 'fake'
+elif not api_key:
+    logger.warning("GEMINI_API_KEY not found in environment variables.")
+
+# Warm the model connection (a free count_tokens call) before taking traffic
+WARMUP = os.getenv("GEMINI_WARMUP", "1").lower() not in ("0", "false", "no")
+WARMUP_TIMEOUT = float(os.getenv("GEMINI_WARMUP_TIMEOUT_SECONDS", "5"))
+
+# Created by load_model(): importing the Gemini SDK takes about a second, which
+# /health, the benchmarks and the offline tools never need to pay
+model = None
+# Clients of the other routed models, by name
+_models = {}
+_model_lock = threading.Lock()
+
+
+def _create_client(name):
+    if USE_FAKE_MODEL:
+        from fake_gemini import FakeModel
+        logger.warning("GEMINI_FAKE is set: using the local Gemini stand-in for %s, no real model calls.", name)
+        return FakeModel.from_env()
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(name, generation_config=GENERATION_CONFIG)
+
+
+def load_model(name=None):
+    """Create the client for a model, MODEL_NAME by default (importing the SDK on first use).
+
+    Opens no connection: the SDK connects on the first call, so a client
+    built in a pre-fork master is safe to share with its workers.
+    """
+    global model
+    if not api_key:
+        return None
+    if name is None or name == MODEL_NAME:
+        if model is None:
+            with _model_lock:
+                if model is None:
+                    model = _create_client(MODEL_NAME)
+        return model
+    client = _models.get(name)
+    if client is None:
+        with _model_lock:
+            client = _models.get(name)
+            if client is None:
+                client = _models[name] = _create_client(name)
+    return client
+
+
+def get_model(name=None):
+    if model is not None and (name is None or name == MODEL_NAME):
+        return model
+    return load_model(name)
+
+
+def load_models():
+    """Clients for every routed model (see model_router.py)."""
+    return [load_model(name) for name in router.models()]
+
+
+def warm_model():
+    """Open this process's connection to Gemini ahead of the first request.
+
+    Returns True when the round trip succeeded; failures are logged, not
+    raised (the first real request will simply pay the connection cost).
+    """
+    client = load_model()
+    if not WARMUP or client is None or not hasattr(client, 'count_tokens'):
+        return False
+    try:
+        with timed("gemini_warmup"):
+            # One attempt: the SDK's default retries would hold start-up for a minute
+            client.count_tokens("ping", request_options={"timeout": WARMUP_TIMEOUT, "retry": None})
+        return True
+    except Exception as e:
+        logger.warning("Gemini warm-up failed: %s", e)
+        return False
+
+
+PROMPT = """
+You are an expert in architectural floor plan analysis.
+
+Analyze the uploaded house plan image.
+
+Extract:
+1. List of rooms with approximate position (top-left, bottom-right etc.)
+2. Identify room type (bedroom, kitchen, toilet, pooja room, hall, entrance)
+3. Estimate directional alignment assuming top of image is North.
+4. Return structured JSON format only.
+
+Do not explain. Return clean JSON with one entry per room. Direction is one of
+north, north-east, east, south-east, south, south-west, west, north-west or
+center.
+Example JSON:
+{
+  "rooms": [
+    {"room": "entrance", "direction": "south"},
+    {"room": "kitchen", "direction": "north-east"},
+    {"room": "master_bedroom", "direction": "south-west"},
+    {"room": "toilet", "direction": "north"},
+    {"room": "pooja_room", "direction": "east"}
+  ]
+}
+"""
+
+salvaged_replies = Counter(
+    "vastu_extraction_salvaged_total", "Model replies that needed repair but were used instead of failing.")
+reply_repairs = Counter(
+    "vastu_extraction_repairs_total", "Repairs applied to model replies, by kind.", ["repair"])
+unparseable_replies = Counter(
+    "vastu_extraction_unparseable_total", "Model replies with no usable JSON (paid calls wasted).")
+extractions = Counter(
+    "vastu_extractions_total",
+    "Layouts produced, by source (model, cache, similar, or vector for SVG/DXF parsed locally).", ["source"])
+
+# Repeat uploads of the same plan skip the model call
+extraction_cache = ExtractionCache()
+# Re-saved / resized copies of a known plan reuse its extraction
+similar_plans = NearDuplicateIndex()
+# Shared rate limit, jittered retries and circuit breaker around the model
+upstream = UpstreamGuard()
+# Model choice by plan complexity, hedged calls
+router = register_router_metrics(ModelRouter(upstream, get_model, MODEL_NAME))
+# Every analysis by image hash, for /history and the dashboard aggregates
+history = AnalysisHistory()
+
+
+def plan_cache_key(digest, model_name):
+    """Extraction cache key: the upload, the prompt and the model that read it."""
+    if USE_FAKE_MODEL and model_name != MODEL_NAME:
+        # Fake replies never share entries with a real model's
+        model_name = f"{MODEL_NAME}/{model_name}"
+    return cache_key(digest, PROMPT, model_name)
+
+
+def plan_scope(model_name):
+    """Near-duplicate index scope: the prompt and model, without the upload."""
+    return plan_cache_key("", model_name)
+
+
+class PreparedPlan:
+    """Result of the pre-model steps for one upload.
+
+    Either `data` is already known (cache or near-duplicate hit, or a vector
+    plan read locally), or `blob` holds the preprocessed image to send to
+    the model. `source` says which: cache, similar, vector or model.
+    `digest` is the SHA-256 of the uploaded bytes; `model` is the model
+    routed to read the image (its reply is cached under that model).
+    """
+
+    def __init__(self, key, data=None, phash=None, blob=None, preprocessing=None, source='model', digest=None,
+                 model=None):
+        self.key = key
+        self.model = model
+        self.digest = digest
+        self.data = data
+        self.phash = phash
+        self.blob = blob
+        self.preprocessing = preprocessing
+        self.source = source
+
+    @property
+    def ready(self):
+        """True when no model call is needed."""
+        return self.data is not None
+
+    @property
+    def cached(self):
+        return self.source in ('cache', 'similar')
+
+
+def prepare_upload(file):
+    """Spool, hash, look up and (on a miss) decode + preprocess an upload.
+
+    SVG/DXF plans are parsed locally instead (see vector_plans.py).
+    May raise UploadTooLarge, UnsafeImage, VectorPlanError or
+    PIL.UnidentifiedImageError.
+    """
+    with spool_upload(file) as upload:
+        logger.info("Image received: %d bytes%s", upload.size, " (spooled to disk)" if upload.on_disk else "")
+
+        kind = sniff_stream(upload.stream)
+        if kind is not None:
+            with timed("vector_parse"):
+                data = parse_vector_plan(upload.getvalue(), kind)
+            logger.info("%s plan parsed locally: %d rooms", kind.upper(), len(data))
+            extractions.inc(source='vector')
+            return PreparedPlan(upload.digest, data=data, source='vector', digest=upload.digest)
+
+        # The routed model is only known after preprocessing: look under each
+        key = data = None
+        with timed("cache_lookup"):
+            for name in router.models():
+                key = plan_cache_key(upload.digest, name)
+                data = extraction_cache.get(key)
+                if data is not None:
+                    break
+        if data is not None:
+            logger.info("Extraction cache hit.")
+            extractions.inc(source='cache')
+            return PreparedPlan(key, data=data, source='cache', digest=upload.digest)
+
+        with timed("image_decode"):
+            img = open_plan(upload)
+        with timed("near_duplicate_lookup"):
+            phash = dhash(img)
+            scopes = {plan_scope(name): name for name in router.models()}
+            match = similar_plans.lookup(phash, scopes)
+        if match is not None:
+            logger.info("Near-duplicate plan found, reusing extraction.")
+            scope, data = match
+            key = plan_cache_key(upload.digest, scopes[scope])
+            extraction_cache.put(key, data)
+            extractions.inc(source='similar')
+            return PreparedPlan(key, data=data, phash=phash, source='similar', digest=upload.digest)
+
+        # Shrink/normalize the plan before paying for the upstream transfer
+        with timed("preprocess"):
+            blob, prep = preprocess(img, upload)
+        logger.debug("Preprocessed image: %s", prep)
+        model_name = router.route(prep)[0]
+        return PreparedPlan(plan_cache_key(upload.digest, model_name), phash=phash, blob=blob,
+                            preprocessing=prep, digest=upload.digest, model=model_name)
+
+
+_record_lock = threading.Lock()
+
+
+def _record_reply(raw_text):
+    try:
+        with _record_lock, open(RECORD_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"text": raw_text}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning("Could not record model reply to %s: %s", RECORD_PATH, e)
+
+
+def finish_extraction(prepared, raw_text):
+    """Parse (repairing if needed) the model reply and remember it.
+
+    Raises json.JSONDecodeError when the reply holds nothing usable.
+    """
+    logger.debug("Raw Gemini Text: %s", raw_text)
+    if RECORD_PATH and not USE_FAKE_MODEL:
+        _record_reply(raw_text)
+    with timed("json_parse"):
+        try:
+            data, repairs = parse_layout(raw_text)
+        except json.JSONDecodeError:
+            unparseable_replies.inc()
+            raise
+    if repairs:
+        # The call was paid for; a repaired reply beats a 500 and a re-upload
+        salvaged_replies.inc()
+        for repair in repairs:
+            reply_repairs.inc(repair=repair)
+        logger.info("Model reply repaired (%s)", ", ".join(repairs))
+
+    extraction_cache.put(prepared.key, data)
+    similar_plans.add(prepared.phash, data, plan_scope(prepared.model))
+    extractions.inc(source='model')
+    return data
+
+
+def _replied(prepared, model_name):
+    # A hedge to another model may have answered: cache under the model that did
+    if model_name != prepared.model:
+        prepared.model = model_name
+        prepared.key = plan_cache_key(prepared.digest, model_name)
+
+
+def call_model(prepared):
+    logger.info("Sending request to Gemini...")
+    with timed("gemini_call"):
+        text, model_name = router.generate([PROMPT, prepared.blob], prepared.preprocessing)
+    _replied(prepared, model_name)
+    logger.info("Gemini Response received.")
+    return text
+
+
+async def call_model_async(prepared):
+    logger.info("Sending request to Gemini (async)...")
+    with timed("gemini_call"):
+        text, model_name = await router.generate_async([PROMPT, prepared.blob], prepared.preprocessing)
+    _replied(prepared, model_name)
+    logger.info("Gemini Response received.")
+    return text
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks without text parts (e.g. only a finish reason)
+        return ''
+
+
+def stream_model(prepared):
+    """Yield the model reply piece by piece as Gemini streams it."""
+    logger.info("Sending streaming request to Gemini...")
+    # Streams are routed like other calls but not hedged (their cards are already on the wire)
+    name = prepared.model
+    start = time.perf_counter()
+    # The call returns once the first chunk is in; retries only cover that part
+    response = upstream.call(lambda: get_model(name).generate_content([PROMPT, prepared.blob], stream=True))
+    stage_seconds.observe(time.perf_counter() - start, stage="gemini_first_chunk")
+    for chunk in response:
+        yield _chunk_text(chunk)
+    stage_seconds.observe(time.perf_counter() - start, stage="gemini_call")
+    logger.info("Gemini stream complete.")
+
+
+async def stream_model_async(prepared):
+    logger.info("Sending streaming request to Gemini (async)...")
+    name = prepared.model
+    start = time.perf_counter()
+    response = await upstream.call_async(
+        lambda: get_model(name).generate_content_async([PROMPT, prepared.blob], stream=True))
+    stage_seconds.observe(time.perf_counter() - start, stage="gemini_first_chunk")
+    async for chunk in response:
+        yield _chunk_text(chunk)
+    stage_seconds.observe(time.perf_counter() - start, stage="gemini_call")
+    logger.info("Gemini stream complete.")
+
+
+def record_analysis(prepared, data, score, language=None, city=None):
+    """Add a finished analysis to the history (failures are logged, not raised)."""
+    if not data:
+        return
+    with timed("history_write"):
+        history.record(prepared.digest, data, score, source=prepared.source, language=language, city=city)
+
+
+def extract_plan(file):
+    """Full synchronous extraction for one upload.
+
+    Returns (prepared, data); errors propagate to the caller.
+    """
+    prepared = prepare_upload(file)
+    if prepared.ready:
+        return prepared, prepared.data
+    raw_text = call_model(prepared)
+    return prepared, finish_extraction(prepared, raw_text)
+
+
+@register_collector
+def _pipeline_metrics():
+    cache = extraction_cache.stats
+    yield ("vastu_extraction_cache_lookups_total", "counter",
+           "Exact-match extraction cache lookups by result.",
+           [({"result": "memory_hit"}, cache["memory_hits"]),
+            ({"result": "disk_hit"}, cache["disk_hits"]),
+            ({"result": "miss"}, cache["misses"])])
+    near = similar_plans.stats
+    yield ("vastu_near_duplicate_lookups_total", "counter",
+           "Perceptual-hash near-duplicate lookups by result.",
+           [({"result": "hit"}, near["hits"]), ({"result": "miss"}, near["misses"])])
+    up = upstream.report()
+    yield ("vastu_upstream_calls_total", "counter", "Gemini call attempts.", [({}, up["calls"])])
+    yield ("vastu_upstream_retries_total", "counter", "Gemini call retries.", [({}, up["retries"])])
+    yield ("vastu_rate_limit_wait_seconds_total", "counter",
+           "Time spent waiting for the shared Gemini rate budget.",
+           [({}, up["rate_limiter"]["waited_seconds"])])
+    yield ("vastu_rate_limit_rejections_total", "counter",
+           "Requests refused because no rate budget arrived in time.",
+           [({}, up["rate_limiter"]["rejected"])])
+    yield ("vastu_circuit_open", "gauge", "1 while the Gemini circuit breaker is open.",
+           [({}, 0 if up["circuit"]["state"] == "closed" else 1)])
+    yield ("vastu_circuit_short_circuited_total", "counter",
+           "Calls refused by the open circuit breaker.", [({}, up["circuit"]["short_circuited"])])
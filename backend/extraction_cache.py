@@ -0,0 +1,129 @@
+# Extraction Cache (content-addressed: image bytes + prompt + model)
+
+import logging
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.getenv(
+    "EXTRACTION_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_cache.sqlite3"),
+)
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def cache_key(img_digest, prompt, model_name):
+    """Hash of everything that determines the model's extraction.
+
+    `img_digest` is the SHA-256 hex digest of the uploaded image bytes.
+    """
+    h = hashlib.sha256()
+    h.update(model_name.encode('utf-8'))
+    h.update(b'\0')
+    h.update(hashlib.sha256(prompt.encode('utf-8')).digest())
+    h.update(b'\0')
+    h.update(img_digest.encode('ascii'))
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Two-tier cache: bounded in-process LRU in front of a SQLite file.
+
+    The SQLite tier is shared by every worker process pointing at the same
+    file, and entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if self.db_path:
+            self._init_db()
+            self.purge_expired()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_created ON extractions(created)")
+        conn.commit()
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._lru[key] = data
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._lru[key]
+
+        if self.db_path:
+            try:
+                row = self._conn().execute(
+                    "SELECT data FROM extractions WHERE key = ? AND created >= ?",
+                    (key, time.time() - self.ttl),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Extraction cache read failed: %s", e)
+                row = None
+            if row is not None:
+                data = json.loads(row[0])
+                self._remember(key, data)
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                return data
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if not self.db_path:
+            return
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, data, created) VALUES (?, ?, ?)",
+                (key, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Extraction cache write failed: %s", e)
+
+    def purge_expired(self):
+        """Delete rows past their TTL; returns the number removed."""
+        if not self.db_path:
+            return 0
+        conn = self._conn()
+        cur = conn.execute("DELETE FROM extractions WHERE created < ?", (time.time() - self.ttl,))
+        conn.commit()
+        return cur.rowcount
@@ -0,0 +1,163 @@
+# Local Gemini stand-in for offline load and capacity testing
+#
+# Enabled with GEMINI_FAKE=1 (see extraction.py). It replays recorded model
+# replies with a configurable latency distribution, random upstream errors
+# and periodic 429 bursts, raising the same google.api_core exceptions the
+# real client does so retries, the rate limiter and the circuit breaker
+# behave as in production.
+
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+
+from google.api_core import exceptions as google_exceptions
+
+# JSONL of recorded replies: {"text": "<raw model text>"} per line, or a bare
+# room -> direction object. Set GEMINI_RECORD_PATH on a real deployment to
+# capture one.
+RESPONSES_PATH = os.getenv("GEMINI_FAKE_RESPONSES")
+# Log-normal latency: median and shape (sigma of the underlying normal)
+LATENCY_MS = float(os.getenv("GEMINI_FAKE_LATENCY_MS", "1500"))
+LATENCY_SIGMA = float(os.getenv("GEMINI_FAKE_LATENCY_SIGMA", "0.4"))
+# Fraction of calls failing with a 503 / 500
+ERROR_RATE = float(os.getenv("GEMINI_FAKE_ERROR_RATE", "0"))
+# Answer 429 for the last BURST_SECONDS of every BURST_EVERY seconds (0 disables bursts)
+BURST_EVERY = float(os.getenv("GEMINI_FAKE_BURST_EVERY_SECONDS", "0"))
+BURST_SECONDS = float(os.getenv("GEMINI_FAKE_BURST_SECONDS", "5"))
+SEED = os.getenv("GEMINI_FAKE_SEED")
+
+DEFAULT_RESPONSES = [
+    {"entrance": "north-east", "kitchen": "south-east", "master_bedroom": "south-west",
+     "toilet": "north-west", "pooja_room": "north-east", "hall": "north"},
+    {"entrance": "south", "kitchen": "north-east", "master_bedroom": "north-east",
+     "toilet": "north", "pooja_room": "south"},
+    {"entrance": "east", "kitchen": "north-west", "master_bedroom": "south-west",
+     "toilet": "west", "hall": "east", "study": "west"},
+]
+
+
+# Share of the latency spent before the first streamed chunk
+FIRST_CHUNK_SHARE = 0.4
+STREAM_CHUNKS = 8
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _split(text, parts):
+    step = max(1, -(-len(text) // parts))
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+class FakeStream:
+    """Iterable of text chunks spread over the remaining latency."""
+
+    def __init__(self, text, remaining):
+        self.chunks = [FakeResponse(t) for t in _split(text, STREAM_CHUNKS)]
+        self.gap = remaining / len(self.chunks)
+
+    def __iter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if i:
+                time.sleep(self.gap)
+            yield chunk
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self.chunks):
+            if i:
+                await asyncio.sleep(self.gap)
+            yield chunk
+
+
+def _structured(layout):
+    """A layout as the schema-constrained model returns it."""
+    return json.dumps({"rooms": [{"room": room, "direction": d} for room, d in layout.items()]})
+
+
+def load_responses(path):
+    replies = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict) and isinstance(record.get('text'), str):
+                replies.append(record['text'])
+            else:
+                replies.append(_structured(record))
+    if not replies:
+        raise ValueError(f"No recorded responses in {path}")
+    return replies
+
+
+class FakeModel:
+    """Drop-in for genai.GenerativeModel's generate_content(_async), streaming included."""
+
+    def __init__(self, responses=None, latency_ms=LATENCY_MS, latency_sigma=LATENCY_SIGMA,
+                 error_rate=ERROR_RATE, burst_every=BURST_EVERY, burst_seconds=BURST_SECONDS, seed=None):
+        self.responses = responses or [_structured(r) for r in DEFAULT_RESPONSES]
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._start = time.monotonic()
+        self.stats = {"calls": 0, "errors": 0, "throttled": 0}
+
+    @classmethod
+    def from_env(cls):
+        responses = load_responses(RESPONSES_PATH) if RESPONSES_PATH else None
+        return cls(responses, seed=int(SEED) if SEED else None)
+
+    def _plan_call(self):
+        """Decide latency and outcome for one call: (seconds, exception or reply)."""
+        with self._lock:
+            self.stats["calls"] += 1
+            delay = self._rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000.0
+            elapsed = time.monotonic() - self._start
+            if self.burst_every > 0 and elapsed % self.burst_every >= self.burst_every - self.burst_seconds:
+                self.stats["throttled"] += 1
+                # Quota rejections come back fast
+                return min(delay, 0.05), google_exceptions.TooManyRequests(
+                    "Resource has been exhausted (fake burst)")
+            if self._rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                error = self._rng.choice([
+                    google_exceptions.ServiceUnavailable("The model is overloaded (fake)"),
+                    google_exceptions.InternalServerError("Internal error (fake)"),
+                ])
+                return delay, error
+            text = self.responses[self._next % len(self.responses)]
+            self._next += 1
+            return delay, FakeResponse(text)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        delay, outcome = self._plan_call()
+        if isinstance(outcome, Exception):
+            time.sleep(delay)
+            raise outcome
+        if stream:
+            time.sleep(delay * FIRST_CHUNK_SHARE)
+            return FakeStream(outcome.text, delay * (1 - FIRST_CHUNK_SHARE))
+        time.sleep(delay)
+        return outcome
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        delay, outcome = self._plan_call()
+        if isinstance(outcome, Exception):
+            await asyncio.sleep(delay)
+            raise outcome
+        if stream:
+            await asyncio.sleep(delay * FIRST_CHUNK_SHARE)
+            return FakeStream(outcome.text, delay * (1 - FIRST_CHUNK_SHARE))
+        await asyncio.sleep(delay)
+        return outcome
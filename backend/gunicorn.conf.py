@@ -0,0 +1,50 @@
+# Production server for the Flask app (pre-forking)
+#
+# Run from backend/ with:  gunicorn
+#
+# The master preloads the app, the Gemini SDK and the ruleset once; workers
+# are forked from it, reset their connections and warm up (see startup.py)
+# before they accept requests. Probe /livez for liveness, /readyz for readiness.
+
+import os
+import tempfile
+
+# Workers pool their counters in snapshot files so any of them can answer /metrics
+os.environ.setdefault("METRICS_MULTIPROC_DIR",
+                      os.path.join(tempfile.gettempdir(), f"vastu-metrics-{os.getenv('PORT', '5000')}"))
+
+wsgi_app = "app:app"
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+# Requests mostly wait on Gemini, so each worker serves several at once
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+preload_app = True
+# Model calls (with retries) and PDF sets can take a while
+timeout = int(os.getenv("WEB_TIMEOUT_SECONDS", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks can't build up
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "2000"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    from dotenv import load_dotenv
+    load_dotenv()
+    import startup
+    from metrics import clear_snapshots
+    clear_snapshots()
+    startup.preload()
+
+
+def post_fork(server, worker):
+    import startup
+    startup.after_fork()
+
+
+def post_worker_init(worker):
+    # Runs in the worker before its accept loop starts
+    import startup
+    startup.warm_up()
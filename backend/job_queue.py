@@ -0,0 +1,353 @@
+# Durable background jobs for long-running analyses (SQLite-backed)
+
+import logging
+import os
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv(
+    "JOBS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.sqlite3"),
+)
+JOBS_DIR = os.getenv(
+    "JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs_data"),
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A running job whose worker died is handed out again after this long (live
+# workers renew the lease every third of it)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retry delay after a retryable failure: 10s, 20s, 40s, ... (quota windows are a minute)
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 120
+# Finished jobs (and their inputs) are kept this long for polling clients
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+POLL_INTERVAL = 0.5
+
+
+class JobError(Exception):
+    """Raised by a handler for a permanent failure with an HTTP-style code."""
+
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.code = code
+
+
+class RetryableJobError(Exception):
+    """Raised by a handler when the job should be retried later (e.g. quota)."""
+
+
+class JobQueue:
+    """Priority job queue persisted in SQLite.
+
+    Jobs survive restarts: anything still 'running' when its lease expires
+    (worker crashed or process restarted) goes back to 'queued', or to
+    'failed' once it has used up JOB_MAX_ATTEMPTS. Several processes may
+    share the same database; claiming is done inside an IMMEDIATE
+    transaction so each job is handed to exactly one worker. A retried job
+    is not claimable (by any worker) before its `run_after` time.
+
+    Nothing touches the disk until first use, so importing the app (e.g. in
+    the gunicorn master) creates no files or threads; start() runs per
+    worker process.
+    """
+
+    def __init__(self, handler, db_path=JOBS_DB_PATH, jobs_dir=JOBS_DIR, workers=JOB_WORKERS):
+        self.handler = handler
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self._local = threading.local()
+        self._threads = []
+        # Ids of the jobs this process is running, for the lease heartbeat
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._changed = threading.Condition()
+        self._initialized = False
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            if not self._initialized:
+                with self._start_lock:
+                    if not self._initialized:
+                        os.makedirs(self.jobs_dir, exist_ok=True)
+                        self._init_db(conn)
+                        self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " params TEXT NOT NULL,"
+            " input_path TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL,"
+            " lease_until REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " error_code INTEGER,"
+            " run_after REAL)"
+        )
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "run_after" not in columns:
+            # Databases created before retries were scheduled
+            conn.execute("ALTER TABLE jobs ADD COLUMN run_after REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority DESC, created)")
+
+    # --- Client side ---
+
+    def submit(self, fileobj, params=None, priority=0):
+        """Persist the input and enqueue it. Returns the job id."""
+        conn = self._conn()
+        job_id = uuid.uuid4().hex
+        input_path = os.path.join(self.jobs_dir, job_id)
+        with open(input_path, 'wb') as f:
+            shutil.copyfileobj(getattr(fileobj, 'stream', fileobj), f, 64 * 1024)
+        conn.execute(
+            "INSERT INTO jobs (id, status, priority, params, input_path, created)"
+            " VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, int(priority), json.dumps(params or {}), input_path, time.time()),
+        )
+        self._notify()
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "priority": row["priority"],
+            "attempts": row["attempts"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"],
+        }
+        if row["status"] == 'queued' and row["run_after"]:
+            job["retry_at"] = row["run_after"]
+        if row["status"] == 'queued':
+            job["queue_position"] = self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+                " AND (priority > ? OR (priority = ? AND created < ?))",
+                (row["priority"], row["priority"], row["created"]),
+            ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+            job["error_code"] = row["error_code"]
+        return job
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once it is finished or `timeout` passes."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in ('done', 'failed'):
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            # Local workers notify; other processes are picked up by polling
+            with self._changed:
+                self._changed.wait(min(POLL_INTERVAL, remaining))
+
+    def metrics(self):
+        conn = self._conn()
+        counts = {status: n for status, n in conn.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+        oldest = conn.execute("SELECT MIN(created) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        now = time.time()
+        return {
+            "queue_depth": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "oldest_queued_age_seconds": round(now - oldest, 1) if oldest else 0,
+            "workers": len([t for t in self._threads if t.is_alive()]),
+        }
+
+    # --- Worker side ---
+
+    def start(self):
+        """Start the worker threads (idempotent, safe to call per request)."""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+            logger.info("Job queue started with %d workers", self.workers)
+
+    def stop(self):
+        self._stop.set()
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _claim(self):
+        conn = self._conn()
+        now = time.time()
+        # Idle workers poll with a plain read; the write lock (shared with
+        # every other SQLite writer) is only taken when there is work
+        pending = conn.execute(
+            "SELECT 1 FROM jobs WHERE (status = 'queued' AND (run_after IS NULL OR run_after <= ?))"
+            " OR (status = 'running' AND lease_until < ?) LIMIT 1",
+            (now, now),
+        ).fetchone()
+        if pending is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Reclaim jobs whose worker died mid-run; a job that keeps killing
+            # its worker (OOM, crash in a native library) fails for good
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished = ?, lease_until = NULL,"
+                " error = 'Worker stopped while running the job', error_code = 500"
+                " WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, JOB_MAX_ATTEMPTS),
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', lease_until = NULL WHERE status = 'running' AND lease_until < ?",
+                (now,),
+            )
+            row = conn.execute(
+                "SELECT id, params, input_path, attempts FROM jobs WHERE status = 'queued'"
+                " AND (run_after IS NULL OR run_after <= ?)"
+                " ORDER BY priority DESC, created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, lease_until = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    (now, now + JOB_LEASE_SECONDS, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finish(self, job_id, status, result=None, error=None, error_code=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished = ?, lease_until = NULL,"
+            " result = ?, error = ?, error_code = ? WHERE id = ?",
+            (status, time.time(),
+             json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, error_code, job_id),
+        )
+        self._notify()
+
+    def _requeue(self, job_id, error, delay):
+        # No worker (in any process) claims it again before run_after
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', lease_until = NULL, run_after = ?, error = ? WHERE id = ?",
+            (time.time() + delay, error, job_id),
+        )
+
+    def _heartbeat(self):
+        """Renew the leases of this process's running jobs so long jobs are not reclaimed."""
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            with self._running_lock:
+                ids = list(self._running)
+            if not ids:
+                continue
+            try:
+                self._conn().execute(
+                    f"UPDATE jobs SET lease_until = ? WHERE status = 'running'"
+                    f" AND id IN ({','.join('?' * len(ids))})",
+                    [time.time() + JOB_LEASE_SECONDS] + ids,
+                )
+            except sqlite3.Error as e:
+                logger.warning("Job lease renewal failed: %s", e)
+
+    def _work(self):
+        last_cleanup = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() - last_cleanup > 600:
+                    self.purge_finished()
+                    last_cleanup = time.monotonic()
+                row = self._claim()
+                if row is not None:
+                    self._run(row)
+                    continue
+            except sqlite3.Error as e:
+                # e.g. "database is locked" while storing a result: the job's
+                # lease runs out and it is picked up again
+                logger.warning("Job queue unavailable: %s", e)
+            except Exception:
+                logger.exception("Job worker error")
+            # Keep the thread alive whatever happened; nothing replaces it
+            with self._changed:
+                self._changed.wait(POLL_INTERVAL)
+
+    def _run(self, row):
+        job_id = row["id"]
+        attempts = row["attempts"] + 1
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            with open(row["input_path"], 'rb') as f:
+                result = self.handler(f, json.loads(row["params"]))
+            self._finish(job_id, 'done', result=result)
+        except RetryableJobError as e:
+            if attempts >= JOB_MAX_ATTEMPTS:
+                self._finish(job_id, 'failed', error=str(e), error_code=429)
+            else:
+                delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                logger.info("Job %s will be retried in %ds: %s", job_id, delay, e)
+                self._requeue(job_id, str(e), delay)
+                return
+        except Exception as e:
+            logger.warning("Job %s failed: %s", job_id, e)
+            self._finish(job_id, 'failed', error=str(e), error_code=getattr(e, 'code', 500))
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+        # The result is stored; the input is no longer needed
+        try:
+            os.remove(row["input_path"])
+        except OSError:
+            pass
+
+    def purge_finished(self):
+        """Drop finished jobs (and inputs) past JOB_RETENTION_SECONDS."""
+        conn = self._conn()
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        rows = conn.execute(
+            "SELECT id, input_path FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+            (cutoff,),
+        ).fetchall()
+        for row in rows:
+            if row["input_path"] and os.path.exists(row["input_path"]):
+                os.remove(row["input_path"])
+            conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        return len(rows)
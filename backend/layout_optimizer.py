@@ -0,0 +1,184 @@
+# Layout optimizer: best room -> direction assignments under constraints
+#
+# Scores are the engine's own rule weights (see vastu_batch.RuleMatrix), so an
+# optimized layout scores exactly what analyze_vastu() would give it.
+
+import heapq
+
+from vastu_batch import get_rule_matrix, normalize_direction
+
+
+class InfeasibleLayout(ValueError):
+    pass
+
+
+def _clip(raw):
+    return max(0, min(100, raw))
+
+
+def optimize_layout(rooms, fixed=None, forbidden=None, one_room_per_zone=True,
+                    zones=None, top_k=5, current=None):
+    """Search room -> zone assignments for the highest total rule weight.
+
+    rooms:      room names to place (spelling is kept in the output); a
+                repeated room is placed again as "<room>_2", "<room>_3", ...
+    fixed:      {room: direction} that must not move
+    forbidden:  list of zones nobody may use, or {room: [zones]}
+    one_room_per_zone: at most one room per zone (an assignment problem)
+    zones:      candidate zones, default every direction in the ruleset
+    top_k:      number of distinct alternatives to return
+    current:    optional existing layout to report deltas against
+
+    Branch and bound: rooms are placed most-impactful first and a branch is
+    cut as soon as its optimistic bound (each remaining room's best allowed
+    zone, ignoring conflicts) can't beat the current k-th best. Rooms the
+    knowledge base has no rules for can't change the score, so they are kept
+    out of the search and given leftover zones at the end.
+    """
+    matrix = get_rule_matrix()
+    rooms = _room_keys(rooms)
+    fixed = dict(fixed or {})
+    zones = [normalize_direction(z) for z in (zones or matrix.directions[1:])]
+
+    if isinstance(forbidden, dict):
+        forbidden_for = {r: {normalize_direction(z) for z in zs} for r, zs in forbidden.items()}
+        forbidden_all = set()
+    else:
+        forbidden_for = {}
+        forbidden_all = {normalize_direction(z) for z in (forbidden or [])}
+
+    free_rooms = [r for r in rooms if r not in fixed]
+    base = 50
+    taken = set()
+    for room, direction in fixed.items():
+        base += int(matrix.weights[matrix.room_code(room), matrix.direction_code(direction)])
+        d = normalize_direction(direction)
+        if one_room_per_zone and d in taken:
+            raise InfeasibleLayout(f"Two fixed rooms share the {direction} zone")
+        taken.add(d)
+
+    # Allowed (weight, zone) options per free room, best first
+    options = {}
+    neutral = []
+    for room in free_rooms:
+        banned = forbidden_all | forbidden_for.get(room, set())
+        allowed = [z for z in zones if z not in banned and not (one_room_per_zone and z in taken)]
+        if not allowed:
+            raise InfeasibleLayout(f"No allowed zone left for {room}")
+        r = matrix.room_code(room)
+        opts = sorted(((int(matrix.weights[r, matrix.direction_code(z)]), z) for z in allowed),
+                      key=lambda o: -o[0])
+        if r == 0 or all(w == 0 for w, _ in opts):
+            neutral.append((room, [z for _, z in opts]))
+        else:
+            options[room] = opts
+
+    # Most impactful rooms first makes the bound tight early
+    order = sorted(options, key=lambda room: options[room][-1][0] - options[room][0][0])
+    suffix = [0] * (len(order) + 1)
+    for i in range(len(order) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + options[order[i]][0][0]
+
+    best = []  # min-heap of (raw, counter, assignment)
+    counter = 0
+    explored = 0
+    assignment = {}
+    used = set(taken)
+
+    def dfs(i, total):
+        nonlocal counter, explored
+        explored += 1
+        if len(best) >= top_k and total + suffix[i] <= best[0][0]:
+            return
+        if i == len(order):
+            placed = _place_neutral(neutral, used, one_room_per_zone)
+            if placed is None:
+                return
+            counter += 1
+            entry = (total, counter, {**fixed, **assignment, **placed})
+            if len(best) < top_k:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heappushpop(best, entry)
+            return
+        room = order[i]
+        for weight, zone in options[room]:
+            if one_room_per_zone and zone in used:
+                continue
+            # Options are sorted: once even this one can't make the cut, stop
+            if len(best) >= top_k and total + weight + suffix[i + 1] <= best[0][0]:
+                break
+            assignment[room] = zone
+            used.add(zone)
+            dfs(i + 1, total + weight)
+            used.discard(zone)
+            del assignment[room]
+
+    dfs(0, base)
+    if not best:
+        raise InfeasibleLayout("Not enough zones for every room")
+
+    ranked = sorted(best, key=lambda e: (-e[0], e[1]))
+    top_raw = ranked[0][0]
+    current_score = None
+    if current:
+        current_score = _clip(50 + sum(
+            int(matrix.weights[matrix.room_code(r), matrix.direction_code(d)]) for r, d in current.items()))
+
+    names = rooms + [room for room in fixed if room not in rooms]
+    alternatives = []
+    for raw, _, layout in ranked:
+        alt = {
+            "layout": {room: layout[room] for room in names},
+            "score": _clip(raw),
+            "raw_score": raw,
+            "delta": raw - top_raw,
+        }
+        if current_score is not None:
+            alt["delta_vs_current"] = _clip(raw) - current_score
+        alternatives.append(alt)
+
+    return {"alternatives": alternatives, "current_score": current_score, "explored": explored}
+
+
+def _room_keys(rooms):
+    """Unique keys for a room list, suffixing repeats like LayoutBuilder.
+
+    ruleset.base_room maps "bedroom_2" back to the bedroom rules.
+    """
+    keys = []
+    seen = set()
+    for room in rooms:
+        key = room
+        n = 2
+        while key in seen:
+            key = f"{room}_{n}"
+            n += 1
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+def _place_neutral(neutral, used, one_room_per_zone):
+    """Give rule-less rooms any allowed zone (they don't affect the score)."""
+    placed = {}
+    taken = set(used)
+    for room, allowed in neutral:
+        zone = next((z for z in allowed if not (one_room_per_zone and z in taken)), None)
+        if zone is None:
+            return None
+        placed[room] = zone
+        taken.add(zone)
+    return placed
+
+
+def suggest_moves(current, **constraints):
+    """Convenience wrapper: keep the current rooms, suggest better zones."""
+    result = optimize_layout(list(current), current=current, **constraints)
+    for alt in result["alternatives"]:
+        alt["moves"] = {
+            room: {"from": current[room], "to": zone}
+            for room, zone in alt["layout"].items()
+            if normalize_direction(current[room]) != zone
+        }
+    return result
@@ -0,0 +1,187 @@
+# End-to-end load generator for /analyze
+#
+#   GEMINI_FAKE=1 GEMINI_RATE_PER_MINUTE=0 uvicorn asgi:app --port 5000   # server under test
+#   python load_test.py --concurrency 1,4,16,64 --duration 30
+#
+# Each step runs N concurrent clients for the given duration and reports
+# throughput, p50/p95/p99 latency and an error breakdown. The step where
+# throughput stops growing while latency climbs is the saturation point.
+# Every upload is a distinct synthetic plan (so the extraction caches miss)
+# unless --repeat-ratio sends some already-seen plans again.
+
+import sys
+import math
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.request
+
+from synthetic_plans import make_plan
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _multipart(fields, filename, data):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+        f'Content-Type: image/png\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class PlanSource:
+    """Hands out fresh plans, or (with probability repeat_ratio) a seen one."""
+
+    def __init__(self, size, repeat_ratio, seed):
+        self.size = size
+        self.repeat_ratio = repeat_ratio
+        self._rng = random.Random(seed)
+        self._next_seed = seed * 1_000_003
+        self._seen = []
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self._seen and self._rng.random() < self.repeat_ratio:
+                return self._rng.choice(self._seen)
+            self._next_seed += 1
+            plan_seed = self._next_seed
+        data = make_plan(self.size, 'PNG', 'lineart', seed=plan_seed)
+        with self._lock:
+            if len(self._seen) < 256:
+                self._seen.append(data)
+        return data
+
+
+def _error_label(status, body):
+    try:
+        message = json.loads(body).get('error', '')
+    except (ValueError, AttributeError):
+        message = ''
+    return f"{status} {message[:60]}".strip()
+
+
+def run_step(url, concurrency, duration, max_requests, plans, timeout, fields):
+    results = []  # (latency_seconds, label) where label is None on success
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    issued = [0]
+
+    def client():
+        while time.monotonic() < deadline:
+            with lock:
+                if max_requests and issued[0] >= max_requests:
+                    return
+                issued[0] += 1
+            body, content_type = _multipart(fields, 'plan.png', plans.next())
+            req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    resp.read()
+                label = None
+            except urllib.error.HTTPError as e:
+                label = _error_label(e.code, e.read())
+            except (urllib.error.URLError, OSError) as e:
+                reason = getattr(e, 'reason', e)
+                label = "timeout" if 'timed out' in str(reason) else f"connection: {reason}"
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((elapsed, label))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(lat for lat, label in results if label is None)
+    errors = {}
+    for _, label in results:
+        if label is not None:
+            errors[label] = errors.get(label, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(latencies),
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "errors": dict(sorted(errors.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def find_saturation(steps, gain=0.1):
+    """First step whose throughput improved by less than `gain` over the previous one."""
+    for prev, step in zip(steps, steps[1:]):
+        if step["throughput_rps"] < prev["throughput_rps"] * (1 + gain):
+            return prev["concurrency"]
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the /analyze endpoint.")
+    parser.add_argument('--url', default='http://localhost:5000/analyze')
+    parser.add_argument('--concurrency', default='1,2,4,8,16',
+                        help="Comma-separated concurrency levels, one step each")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds per step")
+    parser.add_argument('--requests', type=int, default=0, help="Cap on requests per step (0 = no cap)")
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                        help="Fraction of uploads that resend an already-seen plan (cache hits)")
+    parser.add_argument('--image-size', default='1200x900', help="Synthetic plan size, WxH")
+    parser.add_argument('--language', default=None, help="Sent as the 'language' form field")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=int(time.time()))
+    parser.add_argument('--json', dest='json_out', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    size = tuple(int(v) for v in args.image_size.lower().split('x'))
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+    fields = {'language': args.language} if args.language else {}
+    plans = PlanSource(size, args.repeat_ratio, args.seed)
+
+    print(f"{'clients':>7} {'reqs':>6} {'ok':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  errors")
+    steps = []
+    for level in levels:
+        step = run_step(args.url, level, args.duration, args.requests, plans, args.timeout, fields)
+        steps.append(step)
+        errors = ", ".join(f"{label}: {n}" for label, n in step["errors"].items()) or "-"
+        print(f"{step['concurrency']:>7} {step['requests']:>6} {step['ok']:>6} {step['throughput_rps']:>8.2f} "
+              f"{step['p50_ms'] or 0:>9.1f} {step['p95_ms'] or 0:>9.1f} {step['p99_ms'] or 0:>9.1f}  {errors}")
+        sys.stdout.flush()
+
+    saturation = find_saturation(steps)
+    if saturation is not None:
+        print(f"Throughput stops scaling at ~{saturation} concurrent clients.")
+    else:
+        print("No saturation within the tested concurrency levels.")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump({"url": args.url, "steps": steps, "saturation_concurrency": saturation}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
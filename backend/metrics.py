@@ -0,0 +1,256 @@
+# Metrics (Prometheus text format) and logging setup
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for log shippers
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# Under gunicorn every worker counts on its own and a scrape reaches just one
+# of them. With this set, each process writes its counters and histograms to
+# <dir>/<pid>.json (at most SNAPSHOT_SECONDS old) and /metrics sums the files.
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+SNAPSHOT_SECONDS = 5
+
+# Seconds; spans sub-millisecond engine work up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """Configure the root logger once (level from LOG_LEVEL, format from LOG_FORMAT)."""
+    root = logging.getLogger()
+    if getattr(root, '_vastu_configured', False):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(_JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root._vastu_configured = True
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{n}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(total, value):
+        return (total or 0) + value
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted((self._values if values is None else values).items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        with _lock:
+            _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @staticmethod
+    def merge(total, state):
+        return list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ('le',)
+        for key, state in sorted((self._values if values is None else values).items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_label_str(names, key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+def register_collector(fn):
+    """Register a callback evaluated at scrape time.
+
+    It returns an iterable of (name, type, help, [(labels_dict, value), ...]),
+    which lets modules expose the stats dicts they already keep.
+    """
+    with _lock:
+        _collectors.append(fn)
+    return fn
+
+
+def _snapshot_path(pid=None):
+    return os.path.join(MULTIPROC_DIR, f"{pid or os.getpid()}.json")
+
+
+def write_snapshot():
+    """Save this process's counters and histograms for the other workers' scrapes."""
+    with _lock:
+        snapshot = {m.name: [[list(key), list(v) if isinstance(v, list) else v]
+                             for key, v in m._values.items()] for m in _metrics}
+    path = _snapshot_path()
+    try:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        logging.getLogger(__name__).warning("Could not write metrics snapshot %s: %s", path, e)
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_SECONDS)
+        write_snapshot()
+
+
+def start_snapshots():
+    """Write snapshots periodically (and at exit) when METRICS_MULTIPROC_DIR is set.
+
+    Call once per worker process, after the fork. Counts inherited from the
+    master are dropped; otherwise every worker's file would repeat them.
+    """
+    if not MULTIPROC_DIR:
+        return
+    with _lock:
+        for metric in _metrics:
+            metric._values.clear()
+    import atexit
+    atexit.register(write_snapshot)
+    threading.Thread(target=_snapshot_loop, name="metrics-snapshot", daemon=True).start()
+
+
+def clear_snapshots():
+    """Forget the counts of a previous server run (call in the master before forking)."""
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith(".json"):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+def _merged_values():
+    # name -> {labels: value} summed over every process's snapshot. Files of
+    # exited workers stay, so counters never go backwards when one recycles.
+    write_snapshot()
+    merged = {}
+    for name in os.listdir(MULTIPROC_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(MULTIPROC_DIR, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric_name, samples in snapshot.items():
+            merged.setdefault(metric_name, []).extend(samples)
+    return merged
+
+
+def render():
+    with _lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    lines = []
+    snapshots = _merged_values() if MULTIPROC_DIR else None
+    for metric in metrics:
+        if snapshots is None:
+            with _lock:
+                lines.extend(metric.render())
+            continue
+        values = {}
+        for key, value in snapshots.get(metric.name, ()):
+            key = tuple(key)
+            values[key] = metric.merge(values.get(key), value)
+        lines.extend(metric.render(values))
+    # Collected gauges (readiness, breaker, caches) describe the answering worker
+    for collect in collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            logging.getLogger(__name__).warning("Metrics collector failed: %s", e)
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_label_str(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Shared instruments ---
+
+stage_seconds = Histogram(
+    "vastu_stage_seconds", "Time spent in each /analyze pipeline stage.", ["stage"])
+request_seconds = Histogram(
+    "vastu_http_request_seconds", "HTTP request latency.", ["endpoint", "method"])
+requests_total = Counter(
+    "vastu_http_requests_total", "HTTP requests by endpoint and status.", ["endpoint", "method", "status"])
+upstream_errors = Counter(
+    "vastu_upstream_errors_total", "Failed Gemini calls by kind.", ["kind"])
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
@@ -0,0 +1,371 @@
+# Model routing and hedged requests for layout extraction
+#
+# Each plan goes to a model picked by its estimated complexity: the bits per
+# pixel of the preprocessed payload. Clean line art compresses to well under
+# 0.1 bpp, while phone photos of plans (paper texture, shadows, perspective)
+# stay above 1.5. Complex plans go to GEMINI_COMPLEX_MODEL when one is set.
+#
+# If the chosen model has not answered by its recent GEMINI_HEDGE_PERCENTILE
+# latency, one backup request is sent (to GEMINI_HEDGE_MODEL, by default the
+# same model) and the first reply that parses as a layout wins. Backups take
+# a rate-limit token only if one is free right now, never retry, and are
+# capped at GEMINI_HEDGE_MAX_RATIO of recent calls, so a slow upstream is not
+# hit with twice the load. They never become the circuit breaker's half-open
+# probe. The losing async call is cancelled; a blocking (sync) call cannot be
+# interrupted, so its reply is just dropped.
+#
+# Sync calls run on a pool of GEMINI_HEDGE_WORKERS threads so the caller can
+# take whichever reply comes first. Nothing ever queues for that pool: with no
+# thread free, the primary runs unhedged on the calling thread and a hedge is
+# skipped, so queueing can't inflate latencies or trigger hedges.
+#
+# /metrics reports calls, hedge rate, hedge outcomes and latency saved per model.
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import Counter, Histogram, register_collector
+from reply_parser import parse_layout
+from upstream_guard import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Plans at or above this many bits per pixel go to the complex-plan model
+COMPLEX_MODEL = os.getenv("GEMINI_COMPLEX_MODEL", "")
+COMPLEX_BPP = float(os.getenv("GEMINI_COMPLEX_BPP", "1.0"))
+
+HEDGE = os.getenv("GEMINI_HEDGE", "1").lower() not in ("0", "false", "no")
+HEDGE_MODEL = os.getenv("GEMINI_HEDGE_MODEL", "")
+HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "95"))
+# Hedge delay until a model has LATENCY_MIN_SAMPLES latencies, and its floor
+HEDGE_INITIAL_DELAY = float(os.getenv("GEMINI_HEDGE_INITIAL_SECONDS", "8"))
+HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_SECONDS", "1"))
+HEDGE_MAX_RATIO = float(os.getenv("GEMINI_HEDGE_MAX_RATIO", "0.1"))
+# Threads running sync model calls (primaries and hedges)
+HEDGE_WORKERS = int(os.getenv("GEMINI_HEDGE_WORKERS", "32"))
+
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+model_calls = Counter(
+    "vastu_model_calls_total", "Model requests by model and role (primary or hedge).", ["model", "role"])
+model_seconds = Histogram(
+    "vastu_model_call_seconds", "Model reply time by model (successful calls).", ["model"])
+hedges = Counter(
+    "vastu_model_hedges_total",
+    "Backup requests by primary model and outcome (won, lost, skipped: no budget).", ["model", "outcome"])
+hedge_saved = Counter(
+    "vastu_model_hedge_saved_seconds_total",
+    "Latency saved by winning hedges, by primary model (a lower bound when the primary was cancelled).",
+    ["model"])
+
+
+def estimate_complexity(preprocessing):
+    """Bits per pixel of the payload sent to the model (0 if unknown)."""
+    if not preprocessing:
+        return 0.0
+    width, height = preprocessing["processed_dimensions"]
+    return preprocessing["processed_bytes"] * 8 / max(1, width * height)
+
+
+def is_valid_reply(text):
+    try:
+        parse_layout(text)
+    except ValueError:
+        return False
+    return True
+
+
+class LatencyTracker:
+    """Recent reply times of one model."""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """p-th percentile (nearest rank), or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def expected_beyond(self, seconds):
+        """Mean of the recent latencies above `seconds` (itself if none are)."""
+        with self._lock:
+            slower = [s for s in self._samples if s > seconds]
+        return sum(slower) / len(slower) if slower else seconds
+
+
+class ModelRouter:
+    """Picks the model for a plan and races a hedge against slow replies.
+
+    `guard` is the UpstreamGuard every request goes through; `client_for`
+    returns the client for a model name.
+    """
+
+    def __init__(self, guard, client_for, model, complex_model=COMPLEX_MODEL, hedge_model=HEDGE_MODEL,
+                 hedge=HEDGE):
+        self.guard = guard
+        self.client_for = client_for
+        self.model = model
+        self.complex_model = complex_model or model
+        self.hedge_model = hedge_model
+        self.hedge = hedge
+        self._latency = {}
+        self._recent_hedges = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_slots = threading.BoundedSemaphore(HEDGE_WORKERS)
+        self.stats = {}
+
+    def models(self):
+        """Every model this router may call."""
+        return list(dict.fromkeys(m for m in (self.model, self.complex_model, self.hedge_model) if m))
+
+    def route(self, preprocessing=None):
+        """(model, backup model) for a plan."""
+        complex_plan = self.complex_model != self.model and estimate_complexity(preprocessing) >= COMPLEX_BPP
+        model = self.complex_model if complex_plan else self.model
+        return model, self.hedge_model or model
+
+    def _tracker(self, model):
+        tracker = self._latency.get(model)
+        if tracker is None:
+            with self._lock:
+                tracker = self._latency.setdefault(model, LatencyTracker())
+        return tracker
+
+    def hedge_delay(self, model):
+        seconds = self._tracker(model).percentile(HEDGE_PERCENTILE)
+        return HEDGE_INITIAL_DELAY if seconds is None else max(HEDGE_MIN_DELAY, seconds)
+
+    def _count(self, model, key):
+        with self._lock:
+            counts = self.stats.setdefault(model, {"calls": 0, "hedged": 0, "won": 0, "lost": 0, "skipped": 0,
+                                                   "saved_seconds": 0.0})
+            counts[key] += 1
+
+    def _may_hedge(self):
+        # Budget: at most HEDGE_MAX_RATIO of recent calls
+        with self._lock:
+            recent = self._recent_hedges
+            return not recent or sum(recent) / len(recent) < HEDGE_MAX_RATIO
+
+    def _started(self, model):
+        model_calls.inc(model=model, role="primary")
+        self._count(model, "calls")
+
+    def _observe(self, model, seconds):
+        self._tracker(model).record(seconds)
+        model_seconds.observe(seconds, model=model)
+
+    def _settle(self, model, outcome, saved=None):
+        """Book-keeping once a call is decided.
+
+        outcome: primary (no hedge needed), won / lost (the hedge answered
+        first / did not), skipped (no budget for a hedge).
+        """
+        hedged = outcome in ("won", "lost")
+        with self._lock:
+            self._recent_hedges.append(1 if hedged else 0)
+        if outcome != "primary":
+            hedges.inc(model=model, outcome=outcome)
+            self._count(model, outcome)
+        if hedged:
+            self._count(model, "hedged")
+        if saved is not None:
+            self._saved(model, saved)
+
+    @staticmethod
+    def _not_won(errors):
+        # Outcome when the hedge's reply was not used
+        return "skipped" if isinstance(errors.get("hedge"), UpstreamUnavailable) else "lost"
+
+    def _saved(self, model, seconds):
+        seconds = max(0.0, seconds)
+        hedge_saved.inc(seconds, model=model)
+        with self._lock:
+            self.stats[model]["saved_seconds"] = round(self.stats[model]["saved_seconds"] + seconds, 3)
+
+    # --- Sync ---
+
+    def _generate(self, model, contents):
+        start = time.perf_counter()
+        text = self.client_for(model).generate_content(contents).text
+        self._observe(model, time.perf_counter() - start)
+        return text
+
+    def _executor(self):
+        # Created on first use so each (forked) worker process has its own threads
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="model-call")
+        return self._pool
+
+    def _submit(self, fn, *args, **kwargs):
+        """Start fn on the call pool if a thread is free right now, else None."""
+        if not self._pool_slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._pool_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._pool_slots.release())
+        return future
+
+    def generate(self, contents, preprocessing=None):
+        """(reply text, model that wrote it) for `contents`: the routed model, hedged if it is slow."""
+        model, backup = self.route(preprocessing)
+        self._started(model)
+        primary = self._submit(self.guard.call, lambda: self._generate(model, contents)) if self.hedge else None
+        if primary is None:
+            # Hedging off, or every call thread busy: no queueing, no hedge
+            if self.hedge:
+                self._settle(model, "primary")
+            return self.guard.call(lambda: self._generate(model, contents)), model
+
+        # The primary started on a free thread just now, so the delay is its own latency
+        start = time.perf_counter()
+        done, _ = wait([primary], timeout=self.hedge_delay(model))
+        if done:
+            self._settle(model, "primary")
+            return primary.result(), model
+        hedge = None
+        if self._may_hedge():
+            hedge = self._submit(self.guard.call, lambda: self._generate(backup, contents),
+                                 max_wait=0, retries=0, probe=False)
+        if hedge is None:
+            self._settle(model, "skipped")
+            return primary.result(), model
+
+        logger.info("%s slower than %.1fs; hedging with %s", model, time.perf_counter() - start, backup)
+        model_calls.inc(model=backup, role="hedge")
+        roles = {primary: "primary", hedge: "hedge"}
+        errors, invalid = {}, None
+        pending = set(roles)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: roles[f] != "primary"):
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors[roles[future]] = e
+                    continue
+                if not is_valid_reply(text):
+                    invalid = invalid or (text, model if roles[future] == "primary" else backup)
+                    continue
+                if roles[future] == "primary":
+                    self._settle(model, self._not_won(errors))
+                    return text, model
+                self._settle(model, "won")
+                won_at = time.perf_counter() - start
+                # The primary cannot be interrupted; time it out in the background
+                primary.add_done_callback(lambda _: self._saved(model, time.perf_counter() - start - won_at))
+                return text, backup
+        self._settle(model, self._not_won(errors))
+        if invalid is not None:
+            # Nothing parsed: the first reply, left for finish_extraction() to reject
+            return invalid
+        raise errors.get("primary") or errors["hedge"]
+
+    # --- Async ---
+
+    async def _generate_async(self, model, contents):
+        start = time.perf_counter()
+        response = await self.client_for(model).generate_content_async(contents)
+        self._observe(model, time.perf_counter() - start)
+        return response.text
+
+    async def generate_async(self, contents, preprocessing=None):
+        model, backup = self.route(preprocessing)
+        self._started(model)
+        if not self.hedge:
+            return await self.guard.call_async(lambda: self._generate_async(model, contents)), model
+
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self.guard.call_async(lambda: self._generate_async(model, contents)))
+        roles = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay(model))
+            if done:
+                self._settle(model, "primary")
+                return primary.result(), model
+            if not self._may_hedge():
+                self._settle(model, "skipped")
+                return await primary, model
+
+            logger.info("%s slower than %.1fs; hedging with %s", model, time.perf_counter() - start, backup)
+            model_calls.inc(model=backup, role="hedge")
+            hedge = asyncio.ensure_future(self.guard.call_async(
+                lambda: self._generate_async(backup, contents), max_wait=0, retries=0, probe=False))
+            roles[hedge] = "hedge"
+            errors, invalid = {}, None
+            pending = set(roles)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: roles[t] != "primary"):
+                    if task.exception() is not None:
+                        errors[roles[task]] = task.exception()
+                        continue
+                    text = task.result()
+                    if not is_valid_reply(text):
+                        invalid = invalid or (text, model if roles[task] == "primary" else backup)
+                        continue
+                    if roles[task] == "primary":
+                        self._settle(model, self._not_won(errors))
+                        return text, model
+                    won_at = time.perf_counter() - start
+                    if not primary.done():
+                        # Cancelled: the primary took at least won_at; count that,
+                        # and its recent slower latencies as what it would have taken
+                        self._observe(model, won_at)
+                        self._settle(model, "won", self._tracker(model).expected_beyond(won_at) - won_at)
+                    else:
+                        self._settle(model, "won")
+                    return text, backup
+            self._settle(model, self._not_won(errors))
+            if invalid is not None:
+                return invalid
+            raise errors.get("primary") or errors["hedge"]
+        finally:
+            # The losing call (or both, if the request itself was cancelled)
+            for task in roles:
+                task.cancel()
+
+    def report(self):
+        with self._lock:
+            models = {model: dict(counts) for model, counts in self.stats.items()}
+        for model, counts in models.items():
+            counts["hedge_rate"] = round(counts["hedged"] / counts["calls"], 4) if counts["calls"] else 0.0
+            counts["hedge_delay_seconds"] = round(self.hedge_delay(model), 3)
+        return {
+            "model": self.model,
+            "complex_model": self.complex_model if self.complex_model != self.model else None,
+            "hedge_model": self.hedge_model or None,
+            "hedging": self.hedge,
+            "models": models,
+        }
+
+
+def register_router_metrics(router):
+    @register_collector
+    def _router_metrics():
+        models = router.report()["models"]
+        yield ("vastu_model_hedge_rate", "gauge", "Share of calls to a model that needed a hedge.",
+               [({"model": m}, c["hedge_rate"]) for m, c in models.items()])
+        yield ("vastu_model_hedge_delay_seconds", "gauge", "Current hedge delay (latency percentile) by model.",
+               [({"model": m}, c["hedge_delay_seconds"]) for m, c in models.items()])
+    return router
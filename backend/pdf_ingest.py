@@ -0,0 +1,202 @@
+# Multi-page PDF plans: one floor per page, analyzed in parallel
+#
+# Pages are rasterized one at a time, straight at the resolution the model
+# gets (PREPROCESS_MAX_DIMENSION), and each page image goes through the
+# regular single-plan pipeline (cache, near-duplicates, model). At most
+# PDF_MAX_WORKERS pages are rendered-but-unfinished at any moment, so a
+# 40-page set costs the memory of a few page images, not forty.
+#
+# Rendering needs pypdfium2; without it PDF uploads are refused with a 400.
+
+import io
+import os
+import re
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional, only PDF uploads need it
+    pdfium = None
+
+from extraction import extract_plan, record_analysis
+from image_preprocess import MAX_DIMENSION
+from metrics import Counter, stage_seconds
+from ruleset import get_ruleset
+from upload_ingest import UnsafeImage, UploadTooLarge, spool_upload
+from upstream_guard import UpstreamUnavailable, is_quota_error
+from vastu_engine import analyze_vastu
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "30"))
+# Floors analyzed concurrently (and page images held) per PDF
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "4"))
+
+# A page title such as "GROUND FLOOR PLAN" or "Level 2"
+_FLOOR_TITLE = re.compile(r'\b(floor|level|basement|terrace|stilt|mezzanine|cellar|roof)\b', re.I)
+
+# PDFium is not thread-safe; every call into it goes through this lock
+_pdfium_lock = threading.Lock()
+
+pdf_pages = Counter("vastu_pdf_pages_total", "PDF pages analyzed, by result.", ["result"])
+
+
+class PdfPlanError(ValueError):
+    """A PDF upload that can't be analyzed (reported as a 400)."""
+
+
+def is_pdf(file):
+    """Peek at an upload (FileStorage or binary file) without consuming it."""
+    stream = getattr(file, 'stream', file)
+    head = stream.read(1024)
+    stream.seek(0)
+    return b'%PDF-' in head
+
+
+def _page_title(page, number):
+    text = page.get_textpage()
+    try:
+        lines = text.get_text_range().splitlines()
+    finally:
+        text.close()
+    for line in lines:
+        line = ' '.join(line.split())
+        if _FLOOR_TITLE.search(line) and len(line) <= 60:
+            return line
+    return f"Page {number}"
+
+
+def _render_page(doc, index):
+    """(title, PNG bytes) for one page, rendered with its longer side at MAX_DIMENSION."""
+    with _pdfium_lock:
+        start = time.perf_counter()
+        page = doc[index]
+        try:
+            width, height = page.get_size()
+            scale = MAX_DIMENSION / max(width, height, 1)
+            bitmap = page.render(scale=scale, grayscale=True)
+            try:
+                img = bitmap.to_pil()
+            finally:
+                bitmap.close()
+            title = _page_title(page, index + 1)
+        finally:
+            page.close()
+    buf = io.BytesIO()
+    img.save(buf, 'PNG', optimize=False)
+    stage_seconds.observe(time.perf_counter() - start, stage="pdf_render")
+    return title, buf.getvalue()
+
+
+def _analyze_floor(number, title, png, language, city=None):
+    """One page through the single-plan pipeline; failures are reported, not raised."""
+    floor = {"page": number, "title": title}
+    try:
+        prepared, data = extract_plan(io.BytesIO(png))
+        analysis = analyze_vastu(data, language)
+        record_analysis(prepared, data, analysis["score"], language, city)
+        floor.update({
+            "status": "ok",
+            "raw_data": data,
+            "analysis": analysis,
+            "cached": prepared.cached,
+            "source": prepared.source
+        })
+    except UploadTooLarge as e:
+        floor.update({"status": "error", "code": 413, "error": str(e)})
+    except UnsafeImage as e:
+        floor.update({"status": "error", "code": 400, "error": f"Unsafe image: {str(e)}"})
+    except json.JSONDecodeError as je:
+        floor.update({"status": "error", "code": 500, "error": f"AI response was not valid JSON: {str(je)}"})
+    except UpstreamUnavailable as e:
+        floor.update({"status": "error", "code": 503, "error": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        logger.error("Error analyzing PDF page %d: %s", number, e)
+        if is_quota_error(e):
+            floor.update({"status": "error", "code": 429, "error": "API Quota Exceeded. Please try again in a minute."})
+        else:
+            floor.update({"status": "error", "code": 500, "error": str(e)})
+    pdf_pages.inc(result=floor["status"])
+    return floor
+
+
+def building_report(floors, language='en'):
+    """Whole-building summary over the floors that had rooms.
+
+    The building score is the mean floor score (each floor is a plan of
+    its own); defects are listed with the floor they are on.
+    """
+    scored = [f for f in floors if f["status"] == "ok" and f["raw_data"]]
+    if not scored:
+        return {"score": None, "floors_scored": 0, "rooms": 0, "defects": []}
+    score = round(sum(f["analysis"]["score"] for f in scored) / len(scored))
+    ruleset = get_ruleset()
+    gt = ruleset.strings(language if language in ruleset.languages else 'en')
+    # Same thresholds as analyze_vastu
+    explanation = gt['excellent'] if score > 80 else gt['average'] if score > 50 else gt['poor']
+    weakest = min(scored, key=lambda f: f["analysis"]["score"])
+    return {
+        "score": score,
+        "explanation": explanation,
+        "floors_scored": len(scored),
+        "rooms": sum(len(f["raw_data"]) for f in scored),
+        "weakest_floor": {"page": weakest["page"], "title": weakest["title"],
+                          "score": weakest["analysis"]["score"]},
+        "defects": [
+            {"page": f["page"], "title": f["title"], "card_title": card["card_title"], "remedy": card["remedy"]}
+            for f in scored for card in f["analysis"]["suggestions"] if card["suggestion_type"] == "defect"
+        ],
+    }
+
+
+def analyze_pdf(file, language='en', city=None):
+    """Analyze every page of a PDF plan set as a floor.
+
+    Returns {"pages", "floors": [per-page result], "building": summary}.
+    Raises UploadTooLarge, or PdfPlanError for unreadable/oversized PDFs.
+    """
+    if pdfium is None:
+        raise PdfPlanError("PDF uploads are not supported on this server (pypdfium2 is not installed)")
+    start = time.perf_counter()
+    with spool_upload(file) as upload:
+        with _pdfium_lock:
+            try:
+                doc = pdfium.PdfDocument(upload.stream)
+            except pdfium.PdfiumError as e:
+                raise PdfPlanError(f"Unreadable PDF: {e}")
+            pages = len(doc)
+        try:
+            if pages > PDF_MAX_PAGES:
+                raise PdfPlanError(f"PDF has {pages} pages; limit is {PDF_MAX_PAGES}")
+            logger.info("PDF received: %d pages", pages)
+
+            # A slot is held from rendering a page until its floor is done
+            slots = threading.BoundedSemaphore(PDF_MAX_WORKERS)
+            futures = []
+            with ThreadPoolExecutor(max_workers=PDF_MAX_WORKERS, thread_name_prefix="pdf") as pool:
+                for index in range(pages):
+                    slots.acquire()
+                    try:
+                        title, png = _render_page(doc, index)
+                    except pdfium.PdfiumError as e:
+                        slots.release()
+                        pdf_pages.inc(result="error")
+                        futures.append({"page": index + 1, "title": f"Page {index + 1}", "status": "error",
+                                        "code": 400, "error": f"Page could not be rendered: {e}"})
+                        continue
+                    future = pool.submit(_analyze_floor, index + 1, title, png, language, city)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                    # Drop our reference; the worker owns the page image now
+                    del png
+            floors = [f if isinstance(f, dict) else f.result() for f in futures]
+        finally:
+            with _pdfium_lock:
+                doc.close()
+
+    stage_seconds.observe(time.perf_counter() - start, stage="pdf_total")
+    return {"pages": pages, "floors": floors, "building": building_report(floors, language)}
@@ -0,0 +1,463 @@
+# Plan geometry: room outlines -> Vastu zone shares
+#
+# One direction word per room is lossy for rooms that straddle zones and for
+# big floors (multi-unit, 30+ rooms). Given room bounding boxes or polygons
+# (any units, e.g. image pixels with North at the top unless `north` says
+# otherwise), each room's area is split over the 8 or 16 compass zones around
+# the plan centre and the central Brahmasthan (the middle ninth of the plan),
+# and its rule weight becomes the share-weighted sum over those zones.
+#
+# The plan is rasterized once into a zone-label grid with one integral image
+# per zone, so the zone areas of every bounding box come out of a handful of
+# vectorized lookups, as do the edges of axis-aligned polygons (L-shaped
+# rooms); polygons with slanted walls are sampled at cell centres, one grid
+# row at a time so memory doesn't grow with the vertex count. A bucket-grid
+# index over the room boxes answers point/region queries without scanning
+# every room.
+
+import os
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from metrics import timed
+from reply_parser import ROOM_FIELDS, pick_field
+from vastu_batch import get_rule_matrix
+from vocabulary import CENTER, DIRECTIONS, normalize_room
+
+# Raster resolution along the plan's longer side
+GRID_CELLS = int(os.getenv("ZONE_GRID_CELLS", "256"))
+# Largest plan accepted by /analyze/geometry
+MAX_ROOMS = int(os.getenv("GEOMETRY_MAX_ROOMS", "2000"))
+# Vertices allowed per room outline and over the whole plan
+MAX_POLYGON_POINTS = int(os.getenv("GEOMETRY_MAX_POLYGON_POINTS", "4096"))
+MAX_PLAN_POINTS = int(os.getenv("GEOMETRY_MAX_PLAN_POINTS", "100000"))
+# Upper bound on buckets along each side of the room index
+INDEX_CELLS = 32
+
+# Clockwise from North, each zone centred on its bearing
+ZONES_8 = DIRECTIONS
+ZONES_16 = ('north', 'north-north-east', 'north-east', 'east-north-east',
+            'east', 'east-south-east', 'south-east', 'south-south-east',
+            'south', 'south-south-west', 'south-west', 'west-south-west',
+            'west', 'west-north-west', 'north-west', 'north-north-west')
+ZONE_SETS = {8: ZONES_8, 16: ZONES_16}
+
+# Shares below this are left out of the report
+MIN_REPORTED_SHARE = 0.001
+
+
+def _fold_matrix(zones):
+    """(zones + 1, 9) map from zone shares to the 8 directions + centre.
+
+    The ruleset knows 8 directions; a 16-zone sub-direction such as
+    north-north-east lies half in each neighbour's 45-degree sector.
+    """
+    n = len(zones)
+    fold = np.zeros((n + 1, len(DIRECTIONS) + 1))
+    step = n // len(DIRECTIONS)
+    for k in range(n):
+        if k % step == 0:
+            fold[k, k // step] = 1.0
+        else:
+            fold[k, k // step] = 0.5
+            fold[k, (k // step + 1) % len(DIRECTIONS)] = 0.5
+    fold[n, len(DIRECTIONS)] = 1.0
+    return fold
+
+
+@lru_cache(maxsize=8)
+def _zone_raster(rows, cols, n_zones, north):
+    """Zone label per cell and one integral image per zone.
+
+    Label n_zones marks the Brahmasthan. sat[z, i, j] is the number of
+    zone-z cells above and left of grid corner (i, j).
+    """
+    dy = np.arange(rows) + 0.5 - rows / 2
+    dx = np.arange(cols) + 0.5 - cols / 2
+    # Compass bearing of each cell centre (image y grows downwards)
+    bearing = (np.degrees(np.arctan2(dx[None, :], -dy[:, None])) - north) % 360.0
+    width = 360.0 / n_zones
+    labels = (np.floor((bearing + width / 2) / width).astype(np.int64) % n_zones)
+    centre = (np.abs(dy) < rows / 6)[:, None] & (np.abs(dx) < cols / 6)[None, :]
+    labels[centre] = n_zones
+
+    onehot = (labels[None, :, :] == np.arange(n_zones + 1)[:, None, None]).astype(np.float32)
+    sat = np.zeros((n_zones + 1, rows + 1, cols + 1), dtype=np.float32)
+    sat[:, 1:, 1:] = onehot.cumsum(axis=1).cumsum(axis=2)
+    return labels, sat
+
+
+def _integral(sat, ys, xs):
+    """Integral images sampled at fractional grid coordinates: (zones + 1, n).
+
+    Bilinear interpolation is exact here: the integral of a piecewise
+    constant raster is bilinear inside each cell.
+    """
+    rows, cols = sat.shape[1] - 1, sat.shape[2] - 1
+    y0 = np.minimum(np.floor(ys).astype(np.int64), rows - 1)
+    x0 = np.minimum(np.floor(xs).astype(np.int64), cols - 1)
+    fy, fx = ys - y0, xs - x0
+    return (sat[:, y0, x0] * ((1 - fy) * (1 - fx))
+            + sat[:, y0 + 1, x0] * (fy * (1 - fx))
+            + sat[:, y0, x0 + 1] * ((1 - fy) * fx)
+            + sat[:, y0 + 1, x0 + 1] * (fy * fx))
+
+
+def _polygon_cells(poly, rows, cols):
+    """Cell block covered by a polygon (grid units): (r0, c0, mask of cell centres inside)."""
+    r0 = max(0, int(math.floor(poly[:, 1].min())))
+    r1 = min(rows, int(math.ceil(poly[:, 1].max())))
+    c0 = max(0, int(math.floor(poly[:, 0].min())))
+    c1 = min(cols, int(math.ceil(poly[:, 0].max())))
+    if r1 <= r0 or c1 <= c0:
+        return r0, c0, np.zeros((0, 0), dtype=bool)
+    cx = np.arange(c0, c1) + 0.5
+    ax, ay = poly[:, 0], poly[:, 1]
+    bx, by = np.append(ax[1:], ax[0]), np.append(ay[1:], ay[0])
+    inside = np.zeros((r1 - r0, c1 - c0), dtype=bool)
+    for k, y in enumerate(np.arange(r0, r1) + 0.5):
+        # Even-odd rule: count edges crossed by a ray from each centre towards +x
+        spans = (ay > y) != (by > y)
+        if not spans.any():
+            continue
+        sx, sy = ax[spans], ay[spans]
+        cross_x = np.sort(sx + (y - sy) / (by[spans] - sy) * (bx[spans] - sx))
+        right = len(cross_x) - np.searchsorted(cross_x, cx, side='right')
+        inside[k] = right % 2 == 1
+    return r0, c0, inside
+
+
+class GridIndex:
+    """Uniform bucket grid over bounding boxes (x0, y0, x1, y1).
+
+    Rooms are registered in every bucket their box touches, so a query
+    only looks at the rooms near the queried point or box.
+    """
+
+    def __init__(self, boxes, bounds, cells=None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.x0, self.y0 = bounds[0], bounds[1]
+        # About one box per bucket
+        self.cells = cells or max(1, min(INDEX_CELLS, math.ceil(math.sqrt(len(self.boxes)))))
+        cells = self.cells
+        self.cw = (bounds[2] - bounds[0]) / cells
+        self.ch = (bounds[3] - bounds[1]) / cells
+        self.buckets = {}
+        for i, box in enumerate(self.boxes):
+            c0, r0, c1, r1 = self._span(box)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    self.buckets.setdefault((r, c), []).append(i)
+
+    def _cell(self, value, origin, size):
+        return min(self.cells - 1, max(0, int((value - origin) // size)))
+
+    def _span(self, box):
+        return (self._cell(box[0], self.x0, self.cw), self._cell(box[1], self.y0, self.ch),
+                self._cell(box[2], self.x0, self.cw), self._cell(box[3], self.y0, self.ch))
+
+    def query(self, box):
+        """Indices of boxes intersecting `box` (touching edges don't count)."""
+        c0, r0, c1, r1 = self._span(box)
+        candidates = set()
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                candidates.update(self.buckets.get((r, c), ()))
+        boxes = self.boxes
+        return sorted(i for i in candidates
+                      if boxes[i, 0] < box[2] and box[0] < boxes[i, 2]
+                      and boxes[i, 1] < box[3] and box[1] < boxes[i, 3])
+
+    def at(self, x, y):
+        """Indices of boxes containing the point (x, y)."""
+        boxes = self.boxes
+        bucket = self.buckets.get((self._cell(y, self.y0, self.ch), self._cell(x, self.x0, self.cw)), ())
+        return [i for i in bucket
+                if boxes[i, 0] <= x <= boxes[i, 2] and boxes[i, 1] <= y <= boxes[i, 3]]
+
+
+def _number_list(value, what, length=None):
+    if not isinstance(value, (list, tuple)) or (length is not None and len(value) != length):
+        raise ValueError(f"{what} must be a list of {length} numbers" if length else f"{what} must be a list")
+    try:
+        out = [float(v) for v in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"{what} must contain only numbers")
+    if not all(math.isfinite(v) for v in out):
+        raise ValueError(f"{what} must contain only finite numbers")
+    return out
+
+
+class PlanGeometry:
+    """Rooms with outlines on one floor plan.
+
+    rooms:  list of (name, bbox (x0, y0, x1, y1), polygon as an (n, 2) array or None)
+    bounds: plan outline (x0, y0, x1, y1), default the union of the room boxes
+    zones:  8 or 16 compass zones (plus the Brahmasthan)
+    north:  clockwise angle in degrees from the top of the plan to North
+    """
+
+    def __init__(self, rooms, bounds=None, zones=8, north=0.0):
+        if zones not in ZONE_SETS:
+            raise ValueError("zones must be 8 or 16")
+        if not rooms:
+            raise ValueError("Plan has no rooms")
+        points = sum(len(poly) for _, _, poly in rooms if poly is not None)
+        if points > MAX_PLAN_POINTS:
+            raise ValueError(f"At most {MAX_PLAN_POINTS} outline points per plan")
+        for name, _, poly in rooms:
+            if poly is not None and len(poly) > MAX_POLYGON_POINTS:
+                raise ValueError(f"Outline of '{name}' has more than {MAX_POLYGON_POINTS} points")
+        self.zones = ZONE_SETS[zones]
+        self.north = float(north) % 360.0
+        self.names = [name for name, _, _ in rooms]
+        self.boxes = np.array([box for _, box, _ in rooms], dtype=np.float64)
+        self.polygons = [poly for _, _, poly in rooms]
+        if bounds is None:
+            bounds = (self.boxes[:, 0].min(), self.boxes[:, 1].min(),
+                      self.boxes[:, 2].max(), self.boxes[:, 3].max())
+        self.bounds = tuple(float(v) for v in bounds)
+        width, height = self.bounds[2] - self.bounds[0], self.bounds[3] - self.bounds[1]
+        if width <= 0 or height <= 0:
+            raise ValueError("Plan bounds must have a positive width and height")
+        # Square-ish cells, about GRID_CELLS along the longer side; multiples
+        # of 3 so the Brahmasthan's edges fall on cell edges
+        scale = GRID_CELLS / 3 / max(width, height)
+        self.cols = 3 * max(1, round(width * scale))
+        self.rows = 3 * max(1, round(height * scale))
+        self._shares = None
+        self._index = None
+
+        # Room keys as the engine sees them; repeated rooms get _2, _3, ...
+        self.keys = []
+        seen = set()
+        next_suffix = {}
+        for name in self.names:
+            key = base = normalize_room(name)
+            n = next_suffix.get(base, 2)
+            while key in seen:
+                key = f"{base}_{n}"
+                n += 1
+            next_suffix[base] = n
+            seen.add(key)
+            self.keys.append(key)
+
+    @classmethod
+    def from_json(cls, body):
+        """Build from a request body; raises ValueError with a client-facing message.
+
+        {"rooms": [{"room": "kitchen", "bbox": [x0, y0, x1, y1]},
+                   {"room": "hall", "polygon": [[x, y], ...]}, ...],
+         "bounds": [x0, y0, x1, y1], "zones": 8, "north": 0}
+        """
+        entries = body.get('rooms')
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("Provide 'rooms' as a non-empty list")
+        if len(entries) > MAX_ROOMS:
+            raise ValueError(f"At most {MAX_ROOMS} rooms per plan")
+        rooms = []
+        for i, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                raise ValueError(f"rooms[{i}] must be an object")
+            name = pick_field(entry, ROOM_FIELDS)
+            if not isinstance(name, str) or not name.strip():
+                raise ValueError(f"rooms[{i}] needs a 'room' name")
+            if entry.get('polygon') is not None:
+                points = entry['polygon']
+                if not isinstance(points, list) or len(points) < 3:
+                    raise ValueError(f"rooms[{i}].polygon needs at least 3 points")
+                if len(points) > MAX_POLYGON_POINTS:
+                    raise ValueError(f"rooms[{i}].polygon has more than {MAX_POLYGON_POINTS} points")
+                try:
+                    poly = np.asarray(points, dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise ValueError(f"rooms[{i}].polygon must be a list of [x, y] numbers")
+                if poly.ndim != 2 or poly.shape[1] != 2 or not np.isfinite(poly).all():
+                    raise ValueError(f"rooms[{i}].polygon must be a list of [x, y] numbers")
+                box = (poly[:, 0].min(), poly[:, 1].min(), poly[:, 0].max(), poly[:, 1].max())
+            elif entry.get('bbox') is not None:
+                poly = None
+                box = _number_list(entry['bbox'], f"rooms[{i}].bbox", 4)
+            else:
+                raise ValueError(f"rooms[{i}] needs a 'bbox' or a 'polygon'")
+            if box[2] <= box[0] or box[3] <= box[1]:
+                raise ValueError(f"rooms[{i}] ('{name}') has no area")
+            rooms.append((name, tuple(box), poly))
+
+        bounds = body.get('bounds')
+        if bounds is not None:
+            bounds = _number_list(bounds, "bounds", 4)
+        zones = body.get('zones', 8)
+        if zones not in (8, 16, '8', '16'):
+            raise ValueError("zones must be 8 or 16")
+        north = body.get('north', 0)
+        if isinstance(north, bool) or not isinstance(north, (int, float)) or not math.isfinite(north):
+            raise ValueError("north must be a number of degrees")
+        return cls(rooms, bounds=bounds, zones=int(zones), north=north)
+
+    def _to_grid(self, xs, ys):
+        x0, y0, x1, y1 = self.bounds
+        gx = np.clip((np.asarray(xs) - x0) / (x1 - x0) * self.cols, 0, self.cols)
+        gy = np.clip((np.asarray(ys) - y0) / (y1 - y0) * self.rows, 0, self.rows)
+        return gx, gy
+
+    def shares(self):
+        """(rooms, zones + 1) fraction of each room's in-plan area per zone; last column is the Brahmasthan."""
+        if self._shares is not None:
+            return self._shares
+        with timed("zone_overlap"):
+            labels, sat = _zone_raster(self.rows, self.cols, len(self.zones), self.north)
+            gx0, gy0 = self._to_grid(self.boxes[:, 0], self.boxes[:, 1])
+            gx1, gy1 = self._to_grid(self.boxes[:, 2], self.boxes[:, 3])
+            # Rectangle sums from the four corners, every room and zone at once
+            areas = (_integral(sat, gy1, gx1) - _integral(sat, gy0, gx1)
+                     - _integral(sat, gy1, gx0) + _integral(sat, gy0, gx0)).T.astype(np.float64)
+
+            rectilinear, other = [], []
+            for i, poly in enumerate(self.polygons):
+                if poly is not None:
+                    (rectilinear if _is_rectilinear(poly) else other).append(i)
+            if rectilinear:
+                areas[rectilinear] = self._rectilinear_areas(sat, rectilinear)
+            for i in other:
+                areas[i] = self._sampled_areas(labels, i)
+
+            totals = areas.sum(axis=1)
+            outside = np.flatnonzero(totals <= 1e-9)
+            if outside.size:
+                raise ValueError(f"Room '{self.names[outside[0]]}' lies outside the plan bounds")
+            self._shares = np.clip(areas / totals[:, None], 0.0, 1.0)
+        return self._shares
+
+    def _rectilinear_areas(self, sat, rooms):
+        """Exact zone areas of axis-aligned polygons, all at once.
+
+        By Green's theorem a region's integral is a sum over its boundary
+        of the integral image's differences along the horizontal edges
+        (vertical edges add nothing); for a box this is the four-corner sum.
+        """
+        polys = [self.polygons[i] for i in rooms]
+        counts = np.array([len(p) for p in polys])
+        firsts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        owners = np.repeat(np.arange(len(rooms)), counts)
+        points = np.concatenate(polys)
+        gx, gy = self._to_grid(points[:, 0], points[:, 1])
+        # Each vertex's successor, wrapping around within its own polygon
+        successor = np.arange(len(points)) + 1
+        successor[firsts + counts - 1] = firsts
+        nx, ny = gx[successor], gy[successor]
+        # Orientation (shoelace sign) in grid coordinates
+        signs = np.where(np.add.reduceat(gx * ny - nx * gy, firsts) < 0, -1.0, 1.0)
+        flat = gy == ny
+        edges = (_integral(sat, gy[flat], nx[flat]) - _integral(sat, gy[flat], gx[flat])).T.astype(np.float64)
+        areas = np.zeros((len(rooms), sat.shape[0]))
+        np.add.at(areas, owners[flat], edges)
+        return -signs[:, None] * areas
+
+    def _sampled_areas(self, labels, i):
+        """Zone areas (in cells) of a polygon with slanted edges, sampled at cell centres."""
+        poly = self.polygons[i]
+        gx, gy = self._to_grid(poly[:, 0], poly[:, 1])
+        r0, c0, inside = _polygon_cells(np.column_stack([gx, gy]), self.rows, self.cols)
+        block = labels[r0:r0 + inside.shape[0], c0:c0 + inside.shape[1]]
+        counts = np.bincount(block[inside], minlength=len(self.zones) + 1)
+        if counts.sum() == 0 and len(block):
+            # Thinner than a cell: the zone under its centre
+            cy = min(self.rows - 1, int(gy.mean()))
+            cx = min(self.cols - 1, int(gx.mean()))
+            counts[labels[cy, cx]] = 1
+        return counts
+
+    def direction_shares(self):
+        """Shares over the 8 directions + centre (what the ruleset can score)."""
+        return self.shares() @ _fold_matrix(self.zones)
+
+    def room_weights(self):
+        """Share-weighted rule weight per room key (vectorized over the rule matrix)."""
+        matrix = get_rule_matrix()
+        rooms = np.array([matrix.room_code(key) for key in self.keys])
+        columns = np.array([matrix.direction_code(d) for d in DIRECTIONS + (CENTER,)])
+        weights = matrix.weights[rooms[:, None], columns[None, :]] * self.direction_shares()
+        return dict(zip(self.keys, weights.sum(axis=1).tolist()))
+
+    def layout(self):
+        """room key -> dominant direction (the card shown for the room)."""
+        labels = DIRECTIONS + (CENTER,)
+        return {key: labels[k] for key, k in zip(self.keys, self.direction_shares().argmax(axis=1).tolist())}
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = GridIndex(self.boxes, self.bounds)
+        return self._index
+
+    def rooms_at(self, x, y):
+        """Keys of the rooms whose outline contains (x, y)."""
+        hits = []
+        for i in self.index.at(x, y):
+            poly = self.polygons[i]
+            if poly is not None:
+                gx, gy = self._to_grid(poly[:, 0], poly[:, 1])
+                px, py = self._to_grid([x], [y])
+                if not point_in_polygon(px[0], py[0], np.column_stack([gx, gy])):
+                    continue
+            hits.append(self.keys[i])
+        return hits
+
+    def overlaps(self, min_fraction=0.05):
+        """Pairs of rooms whose bounding boxes overlap by more than `min_fraction` of the smaller one.
+
+        Usually a drawing or extraction error (a room counted twice); found
+        through the index, not by comparing every pair.
+        """
+        boxes = self.boxes
+        areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+        pairs = []
+        for i, box in enumerate(boxes):
+            for j in self.index.query(box):
+                if j <= i:
+                    continue
+                w = min(box[2], boxes[j, 2]) - max(box[0], boxes[j, 0])
+                h = min(box[3], boxes[j, 3]) - max(box[1], boxes[j, 1])
+                if w * h > min_fraction * min(areas[i], areas[j]):
+                    pairs.append([self.keys[i], self.keys[j]])
+        return pairs
+
+    def report(self):
+        """Per-room zone shares, Brahmasthan occupants and overlapping rooms."""
+        shares = self.shares()
+        dominant = self.layout()
+        names = self.zones + (CENTER,)
+        rooms = {}
+        for key, row in zip(self.keys, shares.tolist()):
+            rooms[key] = {
+                "zone": dominant[key],
+                "shares": {names[z]: round(s, 3) for z, s in enumerate(row) if s >= MIN_REPORTED_SHARE},
+            }
+        centre = shares[:, -1]
+        return {
+            "zones": len(self.zones),
+            "north": self.north,
+            "rooms": rooms,
+            "brahmasthan": [self.keys[i] for i in np.flatnonzero(centre >= MIN_REPORTED_SHARE).tolist()],
+            "overlaps": self.overlaps(),
+        }
+
+
+def _is_rectilinear(poly):
+    steps = np.diff(poly, axis=0, append=poly[:1])
+    return bool((steps == 0).any(axis=1).all())
+
+
+def point_in_polygon(x, y, poly):
+    """Even-odd test for one point; `poly` is a sequence or (n, 2) array of vertices."""
+    points = poly.tolist() if isinstance(poly, np.ndarray) else poly
+    inside = False
+    bx, by = points[-1]
+    for ax, ay in points:
+        if (ay > y) != (by > y) and x < ax + (y - ay) * (bx - ax) / (by - ay):
+            inside = not inside
+        bx, by = ax, ay
+    return inside
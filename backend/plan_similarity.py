@@ -0,0 +1,275 @@
+# Near-duplicate plan lookup (perceptual hash + BK-tree)
+
+import logging
+import os
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from extraction_cache import CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_DB_PATH = os.getenv(
+    "PLAN_SIMILARITY_DB",
+    os.getenv(
+        "EXTRACTION_CACHE_DB",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_cache.sqlite3"),
+    ),
+)
+# Maximum Hamming distance (out of 64 bits) for two plans to count as the same.
+# Re-saved copies land within 3 bits (rescaled ones mostly do); distinct plans
+# have been seen as close as 7, and a miss only costs one more model call.
+MAX_DISTANCE = int(os.getenv("PLAN_SIMILARITY_MAX_DISTANCE", "3"))
+# Plans kept in the index (newest first); older ones expire with the extraction cache
+SIMILARITY_MAX_ENTRIES = int(os.getenv("PLAN_SIMILARITY_MAX_ENTRIES", "20000"))
+# Expired plans are dropped (and the tree rebuilt) at least this often
+PRUNE_INTERVAL = 600
+
+
+def dhash(img, size=8):
+    """64-bit difference hash of an image.
+
+    Robust to re-encoding, rescaling and small colour/brightness changes,
+    which covers re-saved JPEGs and resized PNGs of the same plan.
+    """
+    small = ImageOps.exif_transpose(img).convert('L').resize((size + 1, size), Image.LANCZOS)
+    px = small.tobytes()
+    value = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (px[offset + col] > px[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance."""
+
+    def __init__(self):
+        self.root = None  # [hash, payload, {distance: child}]
+        self.size = 0
+
+    def add(self, h, payload):
+        node = [h, payload, {}]
+        if self.root is None:
+            self.root = node
+            self.size = 1
+            return
+        current = self.root
+        while True:
+            d = hamming(h, current[0])
+            if d == 0:
+                # Same hash: keep the newest payload
+                current[1] = payload
+                return
+            child = current[2].get(d)
+            if child is None:
+                current[2][d] = node
+                self.size += 1
+                return
+            current = child
+
+    def nearest(self, h, max_distance):
+        """Closest (distance, hash, payload) within max_distance, or None."""
+        if self.root is None:
+            return None
+        best = None
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance and (best is None or d < best[0]):
+                best = (d, node[0], node[1])
+                if d == 0:
+                    break
+            limit = best[0] if best is not None else max_distance
+            for cd, child in node[2].items():
+                if d - limit <= cd <= d + limit:
+                    stack.append(child)
+        return best
+
+
+class NearDuplicateIndex:
+    """Perceptual-hash index of previously extracted plans.
+
+    Hashes are persisted to SQLite so the index survives restarts and is
+    shared with other workers (each worker reloads rows it hasn't seen).
+    Every entry has a `scope` (the model and prompt that extracted it) and
+    is only matched within it, as extraction cache keys are. Like the
+    extraction cache, entries expire after `ttl` seconds and only the newest
+    `max_entries` are kept; pruning rebuilds the BK-trees, which can't
+    remove nodes in place.
+    """
+
+    def __init__(self, db_path=SIMILARITY_DB_PATH, max_distance=MAX_DISTANCE,
+                 max_entries=SIMILARITY_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # scope -> BKTree
+        self.trees = {}
+        # (scope, hash) -> (created, data), oldest first; what the trees are rebuilt from
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_rowid = 0
+        self._pruned_at = time.monotonic()
+        self.stats = {"hits": 0, "misses": 0}
+        if self.db_path:
+            self._init_db()
+            self.purge_expired()
+            self._sync()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS plan_hashes ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " phash TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created REAL NOT NULL DEFAULT 0,"
+            " scope TEXT NOT NULL DEFAULT '')"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(plan_hashes)")}
+        if "created" not in columns:
+            # Indexes written before entries expired: start their TTL now
+            conn.execute("ALTER TABLE plan_hashes ADD COLUMN created REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE plan_hashes SET created = ?", (time.time(),))
+        if "scope" not in columns:
+            # Older rows don't say which model/prompt read them; never match them
+            conn.execute("ALTER TABLE plan_hashes ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+            conn.execute("DELETE FROM plan_hashes")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_plan_hashes_created ON plan_hashes(created)")
+        conn.commit()
+
+    def _remember(self, scope, h, created, data):
+        # Caller holds self._lock
+        self._entries.pop((scope, h), None)
+        self._entries[(scope, h)] = (created, data)
+        self.trees.setdefault(scope, BKTree()).add(h, (created, data))
+
+    def _prune(self):
+        """Drop expired and surplus entries and rebuild the trees. Caller holds self._lock."""
+        cutoff = time.time() - self.ttl
+        while self._entries:
+            key, (created, _) = next(iter(self._entries.items()))
+            if created >= cutoff and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+        trees = {}
+        for (scope, h), entry in self._entries.items():
+            trees.setdefault(scope, BKTree()).add(h, entry)
+        self.trees = trees
+        self._pruned_at = time.monotonic()
+
+    def _prune_due(self):
+        # A little slack over max_entries so the tree isn't rebuilt on every add
+        return (len(self._entries) > self.max_entries + self.max_entries // 10
+                or time.monotonic() - self._pruned_at > PRUNE_INTERVAL)
+
+    def purge_expired(self):
+        """Delete rows past their TTL or beyond max_entries; returns the number removed."""
+        with self._lock:
+            self._prune()
+        if not self.db_path:
+            return 0
+        try:
+            conn = self._conn()
+            removed = conn.execute("DELETE FROM plan_hashes WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM plan_hashes WHERE id <= (SELECT id FROM plan_hashes ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("Plan hash index purge failed: %s", e)
+            return 0
+        return removed
+
+    def _sync(self):
+        """Pull rows added by other workers since the last sync."""
+        try:
+            rows = self._conn().execute(
+                "SELECT id, scope, phash, data, created FROM plan_hashes WHERE id > ? ORDER BY id",
+                (self._last_rowid,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Plan hash index read failed: %s", e)
+            return
+        with self._lock:
+            for rowid, scope, phash, data, created in rows:
+                if rowid > self._last_rowid:
+                    self._remember(scope, int(phash, 16), created, json.loads(data))
+                    self._last_rowid = rowid
+            due = self._prune_due()
+        if due:
+            self.purge_expired()
+
+    def _nearest(self, h, scopes):
+        # Caller holds self._lock
+        matches = []
+        for scope in scopes:
+            tree = self.trees.get(scope)
+            match = tree.nearest(h, self.max_distance) if tree is not None else None
+            if match is not None:
+                matches.append((match[0], scope, match[2]))
+        return min(matches, key=lambda m: m[0], default=None)
+
+    def lookup(self, h, scopes):
+        """Return (scope, extraction) of the closest known plan in `scopes`, or None."""
+        if h == 0:
+            # Featureless image (blank/uniform); every such upload would collide
+            return None
+        if self.db_path:
+            self._sync()
+        with self._lock:
+            match = self._nearest(h, scopes)
+            if match is not None and match[2][0] < time.time() - self.ttl:
+                # Expired since the last prune; it may hide a live neighbour
+                self._prune()
+                match = self._nearest(h, scopes)
+            if match is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return match[1], match[2][1]
+
+    def add(self, h, data, scope):
+        if h == 0:
+            return
+        if self.db_path:
+            try:
+                conn = self._conn()
+                conn.execute(
+                    "INSERT INTO plan_hashes (scope, phash, data, created) VALUES (?, ?, ?, ?)",
+                    (scope, f"{h:016x}", json.dumps(data, ensure_ascii=False), time.time()),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Plan hash index write failed: %s", e)
+            # Our own row (and any others) come in through the normal sync
+            self._sync()
+            return
+        with self._lock:
+            self._remember(scope, h, time.time(), data)
+            due = self._prune_due()
+        if due:
+            self.purge_expired()
@@ -0,0 +1,174 @@
+# Progressive (streamed) analysis: per-room cards while the model is still typing
+#
+# The model reply is fed in chunk by chunk; every completed room/direction
+# pair becomes a card event straight away, and the full score follows once the
+# reply is complete. Events are plain dicts, written one per line (NDJSON).
+
+import json
+import time
+
+from extraction import record_analysis
+from metrics import stage_seconds, timed
+from reply_parser import DIRECTION_FIELDS, ROOM_FIELDS, pick_field
+from responses import layout_token
+from upstream_guard import UpstreamUnavailable, is_quota_error
+from vastu_engine import analyze_vastu, room_suggestion
+from vocabulary import LayoutBuilder
+
+
+class IncrementalLayoutParser:
+    """Single-pass scanner for room/direction pairs of a streaming JSON reply.
+
+    Anything before the first '{' (markdown fences, a preamble) is skipped.
+    Accepts the same shapes as reply_parser.layout_pairs: flat
+    "room": "direction" members of the top-level object are reported as
+    soon as the value closes; nested {"room": ..., "direction": ...}
+    objects (the schema-constrained form) when the object closes. `feed()`
+    returns the pairs completed by that chunk.
+    """
+
+    def __init__(self):
+        self.text = []
+        self.done = False
+        # One frame per open container: [is_object, key, expecting_value, members, parent_key]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._chars = []
+
+    def feed(self, chunk):
+        self.text.append(chunk)
+        pairs = []
+        if self.done:
+            return pairs
+        stack = self._stack
+        for ch in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._chars.append(ch)
+                elif ch == '\\':
+                    self._escape = True
+                    self._chars.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_done(pairs)
+                else:
+                    self._chars.append(ch)
+            elif ch == '"':
+                if stack:
+                    self._in_string = True
+                    self._chars = []
+            elif ch == '{' or ch == '[':
+                parent_key = None
+                if stack and stack[-1][0]:
+                    parent = stack[-1]
+                    parent_key = parent[1] if parent[2] else None
+                    parent[1], parent[2] = None, False
+                stack.append([ch == '{', None, False, {}, parent_key])
+            elif ch == '}' or ch == ']':
+                if not stack:
+                    continue
+                frame = stack.pop()
+                if not stack:
+                    self.done = True
+                    break
+                if frame[0]:
+                    members = frame[3]
+                    room = frame[4] or pick_field(members, ROOM_FIELDS)
+                    direction = pick_field(members, DIRECTION_FIELDS)
+                    if isinstance(room, str) and isinstance(direction, str):
+                        pairs.append((room, direction))
+            elif stack and stack[-1][0]:
+                frame = stack[-1]
+                if ch == ':' and frame[1] is not None:
+                    frame[2] = True
+                elif ch == ',':
+                    frame[1], frame[2] = None, False
+        return pairs
+
+    def _string_done(self, pairs):
+        frame = self._stack[-1]
+        if not frame[0]:
+            return
+        raw = ''.join(self._chars)
+        try:
+            value = json.loads('"' + raw + '"') if '\\' in raw else raw
+        except ValueError:
+            value = raw
+        if not frame[2]:
+            frame[1] = value
+            return
+        if len(self._stack) == 1:
+            pairs.append((frame[1], value))
+        else:
+            frame[3][frame[1]] = value
+        frame[1], frame[2] = None, False
+
+    def getvalue(self):
+        return ''.join(self.text)
+
+
+class ProgressiveAnalysis:
+    """Turns streamed model text into room events and a final result event."""
+
+    def __init__(self, language='en', started=None, city=None):
+        self.language = language
+        self.city = city
+        self.parser = IncrementalLayoutParser()
+        self.layout = LayoutBuilder()
+        self.started = time.perf_counter() if started is None else started
+
+    def _events(self, pairs):
+        events = []
+        for room, direction in pairs:
+            added = self.layout.add(room, direction)
+            if added is None:
+                continue
+            room, direction = added
+            if len(self.layout.layout) == 1:
+                stage_seconds.observe(time.perf_counter() - self.started, stage="stream_first_result")
+            events.append({
+                "event": "room",
+                "room": room,
+                "direction": direction,
+                "suggestion": room_suggestion(room, direction, self.language),
+            })
+        return events
+
+    def feed(self, chunk):
+        return self._events(self.parser.feed(chunk))
+
+    def replay(self, data):
+        """Room events for an already-known layout (cache hit)."""
+        return self._events(data.items())
+
+    @property
+    def text(self):
+        return self.parser.getvalue()
+
+    def result(self, data, prepared=None, **extra):
+        """Final event; the analysis is added to the history when `prepared` is given."""
+        with timed("analyze_vastu"):
+            analysis = analyze_vastu(data, self.language)
+        if prepared is not None:
+            record_analysis(prepared, data, analysis["score"], self.language, self.city)
+        return {"event": "result", "raw_data": data, "analysis": analysis,
+                "analysis_token": layout_token(data, self.language), **extra}
+
+
+def error_event(e):
+    """Map a pipeline failure to the same codes/messages as /analyze."""
+    if isinstance(e, json.JSONDecodeError):
+        return {"event": "error", "code": 500, "error": f"AI response was not valid JSON: {str(e)}"}
+    if isinstance(e, UpstreamUnavailable):
+        return {"event": "error", "code": 503, "error": "AI service is busy. Please try again shortly.",
+                "details": str(e), "retry_after": e.retry_after}
+    if is_quota_error(e):
+        return {"event": "error", "code": 429, "error": "API Quota Exceeded. Please try again in a minute.",
+                "details": "The free tier limit for the AI model has been reached."}
+    return {"event": "error", "code": 500, "error": str(e)}
+
+
+def ndjson(event):
+    return json.dumps(event, ensure_ascii=False) + "\n"
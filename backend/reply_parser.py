@@ -0,0 +1,285 @@
+# Model reply -> room/direction layout, tolerating the usual defects
+#
+# Schema-constrained replies are plain JSON and take the json.loads fast
+# path. Anything else (markdown fences, a prose preamble, trailing commas,
+# single quotes, unquoted words, a reply cut off mid-object) is repaired in
+# one pass instead of failing the request and wasting the paid model call.
+
+import re
+import json
+
+from vocabulary import LayoutBuilder
+
+# Field names accepted for list-shaped replies: [{"room": ..., "direction": ...}]
+ROOM_FIELDS = ('room', 'name', 'type')
+DIRECTION_FIELDS = ('direction', 'zone', 'position')
+
+
+
+class _Object(dict):
+    """A JSON object that also keeps its pairs in order, repeated keys included.
+
+    Models list a second bedroom as another "bedroom" key; a plain dict would
+    keep only the last one.
+    """
+
+    def __init__(self, pairs):
+        super().__init__(pairs)
+        self.pairs = pairs
+
+
+_decoder = json.JSONDecoder(object_pairs_hook=_Object)
+_WS = ' \t\r\n'
+_ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LITERALS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+_STRING_END = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_BARE = re.compile(r'[^\s,:\[\]{}"\']+')
+_NUMBER = re.compile(r'-?\d+(\.\d+)?([eE][-+]?\d+)?$')
+
+
+class _TolerantParser:
+    """Recursive-descent JSON reader that records the repairs it makes."""
+
+    def __init__(self, text, pos):
+        self.s = text
+        self.i = pos
+        self.n = len(text)
+        self.repairs = set()
+        # Set when the reply ends inside a string: that value is incomplete
+        self.cut = False
+
+    def fail(self, message):
+        raise json.JSONDecodeError(message, self.s, min(self.i, self.n))
+
+    def skip(self):
+        s, i, n = self.s, self.i, self.n
+        while i < n:
+            if s[i] in _WS:
+                i += 1
+            elif s.startswith('//', i):
+                end = s.find('\n', i)
+                i = n if end < 0 else end + 1
+                self.repairs.add('comment')
+            elif s.startswith('/*', i):
+                end = s.find('*/', i + 2)
+                i = n if end < 0 else end + 2
+                self.repairs.add('comment')
+            else:
+                break
+        self.i = i
+
+    def value(self):
+        self.skip()
+        if self.i >= self.n:
+            self.repairs.add('truncated')
+            return None
+        c = self.s[self.i]
+        if c == '{':
+            return self.obj()
+        if c == '[':
+            return self.arr()
+        if c in '"\'':
+            return self.string()
+        return self.bare()
+
+    def obj(self):
+        self.i += 1
+        out = []
+        comma = False
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.repairs.add('truncated')
+                return _Object(out)
+            c = self.s[self.i]
+            if c == '}':
+                if comma:
+                    self.repairs.add('trailing_comma')
+                self.i += 1
+                return _Object(out)
+            if c == ',':
+                if comma or not out:
+                    self.repairs.add('trailing_comma')
+                comma = True
+                self.i += 1
+                continue
+            if out and not comma:
+                self.repairs.add('missing_comma')
+            if c in '"\'':
+                key = self.string()
+            else:
+                key = self.bare()
+                if not isinstance(key, str):
+                    self.fail("Expecting property name")
+            self.skip()
+            if self.i >= self.n:
+                self.repairs.add('truncated')
+                return _Object(out)
+            if self.s[self.i] != ':':
+                self.fail("Expecting ':' delimiter")
+            self.i += 1
+            self.skip()
+            if self.i >= self.n:
+                self.repairs.add('truncated')
+                return _Object(out)
+            value = self.value()
+            if self.cut and isinstance(value, str):
+                return _Object(out)
+            out.append((key, value))
+            comma = False
+
+    def arr(self):
+        self.i += 1
+        out = []
+        comma = False
+        while True:
+            self.skip()
+            if self.i >= self.n:
+                self.repairs.add('truncated')
+                return out
+            c = self.s[self.i]
+            if c == ']':
+                if comma:
+                    self.repairs.add('trailing_comma')
+                self.i += 1
+                return out
+            if c == ',':
+                if comma or not out:
+                    self.repairs.add('trailing_comma')
+                comma = True
+                self.i += 1
+                continue
+            if out and not comma:
+                self.repairs.add('missing_comma')
+            value = self.value()
+            if self.cut and isinstance(value, str):
+                return out
+            out.append(value)
+            comma = False
+
+    def string(self):
+        s = self.s
+        quote = s[self.i]
+        if quote == "'":
+            self.repairs.add('single_quotes')
+        end = _STRING_END[quote]
+        i = self.i + 1
+        parts = []
+        while True:
+            m = end.search(s, i)
+            if m is None:
+                parts.append(s[i:])
+                self.repairs.add('truncated')
+                self.cut = True
+                self.i = self.n
+                return ''.join(parts)
+            j = m.start()
+            parts.append(s[i:j])
+            if s[j] == quote:
+                self.i = j + 1
+                return ''.join(parts)
+            escaped = s[j + 1:j + 2]
+            if escaped == 'u':
+                try:
+                    parts.append(chr(int(s[j + 2:j + 6], 16)))
+                    i = j + 6
+                    continue
+                except ValueError:
+                    pass
+            parts.append(_ESCAPES.get(escaped, escaped))
+            i = j + 2
+
+    def bare(self):
+        m = _BARE.match(self.s, self.i)
+        if m is None:
+            self.fail(f"Unexpected character {self.s[self.i]!r}")
+        word = m.group()
+        self.i = m.end()
+        if word in _LITERALS:
+            return _LITERALS[word]
+        if _NUMBER.match(word):
+            return float(word) if any(c in word for c in '.eE') else int(word)
+        self.repairs.add('unquoted')
+        return word
+
+
+def loads_tolerant(text):
+    """Parse the first JSON object/array in `text`. Returns (value, repairs).
+
+    `repairs` is a sorted list of what had to be fixed (empty for clean
+    JSON). Raises json.JSONDecodeError when nothing usable is found.
+    """
+    start = text.find('{')
+    bracket = text.find('[')
+    # A list reply is a list of objects; "[...]" in a preamble is just prose
+    if bracket >= 0 and (start < 0 or bracket < start) and text[bracket + 1:].lstrip()[:1] in ('{', ']'):
+        start = bracket
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object in model reply", text, 0)
+
+    repairs = set()
+    prefix = text[:start]
+    if '```' in prefix:
+        repairs.add('fence')
+        prefix = prefix.replace('```json', '').replace('```', '')
+    if prefix.strip():
+        repairs.add('preamble')
+
+    try:
+        # Well-formed JSON behind a fence or preamble: stay in the C decoder
+        value, _ = _decoder.raw_decode(text, start)
+    except ValueError:
+        parser = _TolerantParser(text, start)
+        value = parser.value()
+        repairs |= parser.repairs
+    return value, sorted(repairs)
+
+
+def layout_pairs(value):
+    """Yield (room, direction) pairs from any of the reply shapes we accept.
+
+    {"kitchen": "south-east", ...}, {"kitchen": {"direction": ...}},
+    [{"room": ..., "direction": ...}, ...] or {"rooms": [...]}.
+    """
+    if isinstance(value, dict):
+        items = value.get('rooms')
+        if isinstance(items, list):
+            value = items
+        else:
+            for room, entry in getattr(value, 'pairs', value.items()):
+                if isinstance(entry, dict):
+                    entry = pick_field(entry, DIRECTION_FIELDS)
+                yield room, entry
+            return
+    if isinstance(value, list):
+        for entry in value:
+            if isinstance(entry, dict):
+                yield pick_field(entry, ROOM_FIELDS), pick_field(entry, DIRECTION_FIELDS)
+
+
+def pick_field(entry, names):
+    """First present field of `names` in a reply entry (None if absent)."""
+    for name in names:
+        if name in entry:
+            return entry[name]
+    return None
+
+
+def parse_layout(text):
+    """Model reply -> (normalized room -> direction dict, repairs).
+
+    Raises json.JSONDecodeError if the reply holds no JSON object/array, or
+    no rooms (an empty layout must not be analyzed or cached).
+    """
+    try:
+        value, repairs = _decoder.decode(text), []
+    except ValueError:
+        value, repairs = loads_tolerant(text)
+    if not isinstance(value, (dict, list)):
+        raise json.JSONDecodeError("Model reply is not a JSON object", text, 0)
+    builder = LayoutBuilder()
+    for room, direction in layout_pairs(value):
+        builder.add(room, direction)
+    if not builder.layout:
+        raise json.JSONDecodeError("No rooms in model reply", text, 0)
+    return builder.layout, repairs
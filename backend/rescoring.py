@@ -0,0 +1,114 @@
+# Incremental re-scoring: apply single-room edits to a previous analysis
+#
+# A score is 50 plus one weight per room, so moving or removing a room only
+# changes that room's contribution. The client sends back the
+# `analysis_token` of its last response with the rooms it changed and gets
+# a patch: the new score and its delta, the cards of the changed rooms, the
+# removed rooms and a token for the edited layout. No image, no model call.
+#
+# The token is not signed: it holds nothing the client could not send in a
+# layout anyway, and only the sender sees the result.
+
+from metrics import Counter, timed
+from responses import (
+    card_fragment, decode_token, dumps, encode_token, final_score, get_fragments, scored_response_body
+)
+from vocabulary import normalize_direction, normalize_room
+
+rescores_total = Counter(
+    "vastu_rescores_total", "Room edits applied to a previous analysis, by result.", ("result",)
+)
+
+# Rooms one request may add, move or remove
+RESCORE_MAX_ROOMS = 64
+
+
+def _parse_rooms(rooms, layout):
+    """Edits keyed and valued as the layout is: "Kitchen": "SE" edits "kitchen"."""
+    if not isinstance(rooms, dict) or not rooms:
+        raise ValueError("Provide 'rooms': {room: direction, or null to remove it}")
+    if len(rooms) > RESCORE_MAX_ROOMS:
+        raise ValueError(f"Too many rooms: limit is {RESCORE_MAX_ROOMS} per edit")
+    edits = {}
+    for room_key, direction in rooms.items():
+        if not room_key.strip():
+            raise ValueError("Room names must not be empty")
+        if direction is not None and not (isinstance(direction, str) and direction.strip()):
+            raise ValueError(f"Direction for '{room_key}' must be a non-empty string or null")
+        # Layouts from a model reply hold normalized names; geometry ones keep theirs
+        key = room_key if room_key in layout else normalize_room(room_key)
+        edits[key] = None if direction is None else normalize_direction(direction)
+    return edits
+
+
+def rescore(token, rooms):
+    """Apply room edits to the analysis behind `token`. Returns JSON bytes.
+
+    `rooms` maps room keys to their new direction (None removes the room).
+    A moved room keeps its place in the layout; a new room is appended, as
+    in a dict update. The patch lists the changed rooms' cards under
+    `added` and the removed rooms under `removed`, plus `score`,
+    `score_delta`, `explanation` (only when it changed) and the next
+    `analysis_token`.
+
+    If the rules have changed since the token was issued, the old score
+    can't be patched: the full analysis of the edited layout is returned
+    instead, with `"full": true`.
+    Raises ValueError for a malformed token or edit.
+    """
+    state = decode_token(token)
+    layout = dict(state["layout"])
+    rooms = _parse_rooms(rooms, layout)
+    fragments = get_fragments()
+    ruleset = fragments.source
+    language = state["language"] if state["language"] in ruleset.languages else 'en'
+    weights = dict(state.get("weights") or {})
+
+    if state.get("version") != ruleset.version or language != state["language"]:
+        for room_key, direction in rooms.items():
+            if direction is None:
+                layout.pop(room_key, None)
+            else:
+                layout[room_key] = direction
+            weights.pop(room_key, None)
+        rescores_total.inc(result="full")
+        return scored_response_body(layout, language, weights or None, full=True)[1]
+
+    with timed("rescore"):
+        total = state["total"]
+        old_score, old_band = final_score(total)
+        added, removed = [], []
+        for room_key, direction in rooms.items():
+            old = layout.get(room_key)
+            if old == direction:
+                continue
+            if old is not None:
+                # Take out the room's previous contribution (a geometry
+                # weight no longer applies once the room has been moved)
+                old_weight = weights.pop(room_key, None)
+                if old_weight is None:
+                    old_weight = card_fragment(fragments, language, room_key, old)[0]
+                total -= old_weight
+            if direction is None:
+                del layout[room_key]
+                removed.append(room_key)
+                continue
+            weight, card = card_fragment(fragments, language, room_key, direction)
+            total += weight
+            layout[room_key] = direction
+            added.append(b''.join((b'{"room":', dumps(room_key), b',"direction":', dumps(direction),
+                                   b',"card":', card, b'}')))
+
+        score, band = final_score(total)
+        state.update(language=language, layout=layout, total=total)
+        if weights:
+            state["weights"] = weights
+        else:
+            state.pop("weights", None)
+        parts = [b'{"score":', str(score).encode(), b',"score_delta":', str(score - old_score).encode()]
+        if band != old_band:
+            parts += [b',"explanation":', fragments.explanations[language][band]]
+        parts += [b',"added":[', b','.join(added), b'],"removed":', dumps(removed),
+                  b',"analysis_token":', dumps(encode_token(state)), b'}']
+    rescores_total.inc(result="patch")
+    return b''.join(parts)
@@ -0,0 +1,276 @@
+# Analysis responses: language negotiation, pre-serialized cards, compression
+#
+# Suggestion cards are long (and twice as long in Tamil) and identical for
+# every plan with the same room in the same zone, so each (room, direction,
+# language) card is serialized once per ruleset and responses are assembled
+# from those byte fragments. Bodies are compressed when the client accepts it.
+#
+# Every response carries an `analysis_token`: the layout, language and raw
+# score total it was computed from, so single-room edits can be re-scored
+# without the image (see rescoring.py). Tokens are signed, so the total
+# inside can be trusted, and size-capped before and after inflating.
+
+import os
+import gzip
+import hmac
+import json
+import zlib
+import base64
+import hashlib
+import threading
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None
+
+from metrics import timed
+from ruleset import base_room, get_ruleset
+
+# Bodies smaller than this are sent as-is (compression wouldn't pay off)
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+# Key for signing analysis tokens. Without it every server run makes its own
+# (gunicorn workers share the master's), so set it when several hosts, or a
+# restart, must accept each other's tokens.
+TOKEN_SECRET = os.getenv("ANALYSIS_TOKEN_SECRET", "").encode('utf-8') or os.urandom(32)
+# Longest token accepted, and the most its state may inflate to
+TOKEN_MAX_CHARS = 16 * 1024
+TOKEN_MAX_STATE_BYTES = 256 * 1024
+
+
+def dumps(obj):
+    """JSON-encode to UTF-8 bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def pick_language(requested=None, accept_language=None):
+    """Language for the response: explicit field, then Accept-Language, then 'en'.
+
+    Only languages the ruleset has text for are chosen; region tags are
+    ignored ("ta-IN" -> "ta").
+    """
+    supported = get_ruleset().languages
+    if requested:
+        code = requested.strip().lower().split('-')[0]
+        if code in supported:
+            return code
+    if accept_language:
+        ranked = []
+        for i, part in enumerate(accept_language.split(',')):
+            tag, _, params = part.strip().partition(';')
+            q = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            ranked.append((-q, i, tag.strip().lower().split('-')[0]))
+        for neg_q, _, code in sorted(ranked):
+            if neg_q < 0 and code in supported:
+                return code
+    return 'en'
+
+
+class CardFragments:
+    """Per-ruleset cache of serialized suggestion cards and general strings."""
+
+    def __init__(self, ruleset):
+        self.source = ruleset
+        self.cards = {key: (weight, dumps(dict(card)))
+                      for key, (_, weight, card) in ruleset.cards.items()}
+        self.explanations = {
+            lang: {band: dumps(ruleset.strings(lang)[band]) for band in ('excellent', 'average', 'poor')}
+            for lang in ruleset.languages
+        }
+
+
+_fragments = None
+_fragments_lock = threading.Lock()
+
+
+def get_fragments():
+    global _fragments
+    ruleset = get_ruleset()
+    fragments = _fragments
+    if fragments is None or fragments.source is not ruleset:
+        with _fragments_lock:
+            if _fragments is None or _fragments.source is not ruleset:
+                _fragments = CardFragments(ruleset)
+            fragments = _fragments
+    return fragments
+
+
+def card_fragment(fragments, language, room_key, direction):
+    """(rule weight, serialized card) for one room, as analyze_vastu() lists it."""
+    room = base_room(room_key)
+    base_dir = direction.lower().strip()
+    entry = fragments.cards.get((room, base_dir, language))
+    if entry is not None:
+        return entry
+    gt = fragments.source.strings(language)
+    return 0, dumps({
+        "suggestion_type": "neutral",
+        "card_title": gt['neutral_title'].format(room=room_key, dir=direction),
+        "impact": gt['neutral_impact'],
+        "remedy": gt['neutral_remedy'],
+        "detail": ""
+    })
+
+
+def final_score(total):
+    """(score, explanation band) for a raw total (50 + room weights)."""
+    score = max(0, min(100, round(total)))
+    return score, 'excellent' if score > 80 else 'average' if score > 50 else 'poor'
+
+
+def _analysis(data, language, room_weights):
+    # (language actually used, raw total, final score, analysis JSON bytes)
+    fragments = get_fragments()
+    if language not in fragments.source.languages:
+        language = 'en'
+
+    total = 50
+    parts = []
+    for room_key, direction in data.items():
+        weight, card = card_fragment(fragments, language, room_key, direction)
+        parts.append(card)
+        if room_weights is not None and room_key in room_weights:
+            weight = room_weights[room_key]
+        total += weight
+
+    score, band = final_score(total)
+    body = b''.join((
+        b'{"score":', str(score).encode(),
+        b',"suggestions":[', b','.join(parts),
+        b'],"explanation":', fragments.explanations[language][band], b'}',
+    ))
+    return language, total, score, body
+
+
+def analysis_json(data, language='en', room_weights=None):
+    """analyze_vastu(data, language, room_weights), serialized: (score, JSON bytes).
+
+    Same scoring, cards and explanation as the engine; known cards come
+    from the fragment cache and only neutral cards are encoded per call.
+    """
+    return _analysis(data, language, room_weights)[2:]
+
+
+def _sign(payload):
+    digest = hmac.new(TOKEN_SECRET, payload.encode('ascii'), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_token(state):
+    """Opaque, URL-safe, signed analysis token for a re-scoring state."""
+    payload = base64.urlsafe_b64encode(zlib.compress(dumps(state))).rstrip(b'=').decode('ascii')
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token):
+    """The state inside an analysis token; ValueError if it is malformed, forged or too large."""
+    if not isinstance(token, str):
+        raise ValueError("Invalid analysis token")
+    if len(token) > TOKEN_MAX_CHARS:
+        raise ValueError("Analysis token too large")
+    payload, _, signature = token.rpartition('.')
+    try:
+        if not hmac.compare_digest(signature.encode('ascii'), _sign(payload).encode('ascii')):
+            raise ValueError
+        inflater = zlib.decompressobj()
+        raw = inflater.decompress(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)),
+                                  TOKEN_MAX_STATE_BYTES)
+        if inflater.unconsumed_tail:
+            raise ValueError
+        state = json.loads(raw)
+    except (TypeError, ValueError, zlib.error):
+        raise ValueError("Invalid analysis token") from None
+    if not (isinstance(state, dict) and isinstance(state.get("layout"), dict)
+            and _is_number(state.get("total")) and isinstance(state.get("language"), str)):
+        raise ValueError("Invalid analysis token")
+    weights = state.get("weights") or {}
+    if not (all(isinstance(k, str) and isinstance(v, str) for k, v in state["layout"].items())
+            and isinstance(weights, dict) and all(_is_number(v) for v in weights.values())):
+        raise ValueError("Invalid analysis token")
+    return state
+
+
+def analysis_token(data, language, total, room_weights=None):
+    """Token for an analysis of `data` whose raw total was `total`."""
+    state = {"version": get_ruleset().version, "language": language, "layout": data, "total": total}
+    if room_weights:
+        state["weights"] = room_weights
+    return encode_token(state)
+
+
+def layout_token(data, language='en', room_weights=None):
+    """analysis_token() for a layout scored elsewhere (e.g. by analyze_vastu())."""
+    language, total = _analysis(data, language, room_weights)[:2]
+    return analysis_token(data, language, total, room_weights)
+
+
+def scored_response_body(data, language='en', room_weights=None, **extra):
+    """(score, bytes of the /analyze response: raw_data, analysis, analysis_token and any extra fields)."""
+    with timed("analyze_vastu"):
+        language, total, score, analysis = _analysis(data, language, room_weights)
+    with timed("serialize"):
+        parts = [b'{"raw_data":', dumps(data), b',"analysis":', analysis,
+                 b',"analysis_token":', dumps(analysis_token(data, language, total, room_weights))]
+        for key, value in extra.items():
+            parts += [b',', dumps(key), b':', dumps(value)]
+        parts.append(b'}')
+        return score, b''.join(parts)
+
+
+def analysis_response_body(data, language='en', room_weights=None, **extra):
+    return scored_response_body(data, language, room_weights, **extra)[1]
+
+
+def pick_encoding(accept_encoding):
+    """'br', 'gzip' or None: the coding to use for an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def encode(body, coding, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    if coding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+def compress(body, accept_encoding):
+    """Compress `body` for the client. Returns (body, content_encoding or None)."""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    coding = pick_encoding(accept_encoding)
+    if coding is None:
+        return body, None
+    with timed("compress"):
+        return encode(body, coding), coding
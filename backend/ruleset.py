@@ -0,0 +1,148 @@
+# Vastu Ruleset (compiled from vastu_rules.json, hot reloaded on change)
+
+import logging
+import os
+import re
+import json
+import threading
+import time
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.getenv(
+    "VASTU_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "vastu_rules.json"),
+)
+# How often (seconds) the rules file is stat'ed for changes. 0 checks on every call.
+RELOAD_INTERVAL = float(os.getenv("VASTU_RULES_RELOAD_SECONDS", "2"))
+
+SUPPORTED_SCHEMA = 1
+
+# "bedroom_2", "bedroom_2_2": repeated rooms (see vocabulary.LayoutBuilder)
+_REPEAT_SUFFIX = re.compile(r'(_\d+)+$')
+
+
+def base_room(room_key):
+    """Room type a layout key is scored as: 'Bedroom 2' / 'bedroom_2' -> 'bedroom'."""
+    return _REPEAT_SUFFIX.sub('', room_key.lower().replace(" ", "_").strip())
+
+
+class Ruleset:
+    """Immutable, pre-compiled view of the Vastu knowledge base.
+
+    `cards` maps (room, direction, language) -> (type, weight, card) where card
+    is the ready-to-serve suggestion dict. `general` maps language -> the
+    generic strings (neutral card text, score explanations).
+    """
+
+    def __init__(self, version, cards, general, languages, source=None, room_aliases=None):
+        self.version = version
+        self.cards = MappingProxyType(cards)
+        self.general = MappingProxyType(general)
+        self.languages = tuple(languages)
+        self.source = source
+        # canonical room -> other names the model may use for it
+        self.room_aliases = MappingProxyType(room_aliases or {})
+
+    def lookup(self, room, direction, language):
+        return self.cards.get((room, direction, language))
+
+    def strings(self, language):
+        return self.general.get(language) or self.general['en']
+
+
+def compile_ruleset(doc, source=None):
+    """Validate a parsed rules document and build the lookup index."""
+    version = doc.get('version')
+    if not isinstance(version, int):
+        raise ValueError("Rules file must carry an integer 'version'")
+    if doc.get('schema', SUPPORTED_SCHEMA) != SUPPORTED_SCHEMA:
+        raise ValueError(f"Unsupported rules schema: {doc.get('schema')}")
+
+    rules = doc['rules']
+    general_doc = doc['general']
+    if 'en' not in general_doc:
+        raise ValueError("Rules file must define general 'en' strings")
+
+    languages = list(general_doc.keys())
+    general = {lang: MappingProxyType(dict(strings)) for lang, strings in general_doc.items()}
+
+    cards = {}
+    for room, directions in rules.items():
+        for direction, rule in directions.items():
+            rule_type = rule['type']
+            weight = int(rule['weight'])
+            for lang in languages:
+                # Missing translations fall back to English, as before
+                content = rule.get(lang, rule['en'])
+                card = MappingProxyType({
+                    "suggestion_type": rule_type,
+                    "card_title": content['problem'],
+                    "impact": content['impact'],
+                    "remedy": content['remedy'],
+                    "detail": content.get('detail', ''),
+                })
+                cards[(room, direction, lang)] = (rule_type, weight, card)
+
+    room_aliases = {room: tuple(names) for room, names in doc.get('aliases', {}).get('rooms', {}).items()}
+
+    return Ruleset(version, cards, general, languages, source=source, room_aliases=room_aliases)
+
+
+def load_ruleset(path=RULES_PATH):
+    with open(path, encoding='utf-8') as f:
+        doc = json.load(f)
+    return compile_ruleset(doc, source=path)
+
+
+# --- Hot reload state ---
+_lock = threading.Lock()
+_current = None
+_signature = None
+_last_check = 0.0
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def get_ruleset(path=RULES_PATH):
+    """Return the active ruleset, reloading it if the file changed on disk.
+
+    A broken edit never takes effect: if the new file fails to parse or
+    validate, the previously compiled ruleset keeps serving.
+    """
+    global _current, _signature, _last_check
+
+    now = time.monotonic()
+    if _current is not None and now - _last_check < RELOAD_INTERVAL:
+        return _current
+
+    with _lock:
+        if _current is not None and now - _last_check < RELOAD_INTERVAL:
+            return _current
+        _last_check = now
+        try:
+            signature = _file_signature(path)
+        except OSError as e:
+            if _current is None:
+                raise
+            logger.warning("Cannot stat rules file %s: %s", path, e)
+            return _current
+
+        if _current is None or signature != _signature or _current.source != path:
+            try:
+                compiled = load_ruleset(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if _current is None:
+                    raise
+                logger.warning("Ignoring invalid rules file %s: %s", path, e)
+                return _current
+            if _current is not None:
+                logger.info("Vastu ruleset reloaded: v%s -> v%s", _current.version, compiled.version)
+            # Single reference swap; readers see either the old or new index
+            _current = compiled
+            _signature = signature
+        return _current
@@ -0,0 +1,156 @@
+# Compact, versioned ruleset export for clients that score offline
+#
+# GET /ruleset serves everything analyze_vastu() needs: rule weights and
+# types, card texts per language, the neutral-card and explanation strings,
+# room aliases and the scoring constants. Rooms, directions and types are
+# listed once and referenced by index; a translation that falls back to
+# English is sent as null. Clients cache it under its ETag, revalidate with
+# If-None-Match and only call the server for image extraction.
+#
+# score() is the reference implementation of client-side scoring: it uses
+# nothing but the exported document and matches analyze_vastu().
+
+import os
+import hashlib
+import threading
+
+from ruleset import base_room, get_ruleset
+from responses import COMPRESS_MIN_BYTES, dumps, encode, pick_encoding
+from vocabulary import CENTER, DIRECTIONS
+
+EXPORT_FORMAT = 1
+# Clients may reuse a downloaded ruleset this long before revalidating
+RULESET_MAX_AGE = int(os.getenv("RULESET_MAX_AGE_SECONDS", "300"))
+
+# Scoring constants shared with analyze_vastu()
+BASE_SCORE = 50
+# (exclusive lower bound, explanation key), checked in order; below all: 'poor'
+SCORE_BANDS = ((80, 'excellent'), (50, 'average'))
+TYPES = ('good', 'average', 'neutral', 'defect')
+
+
+def build_export(ruleset, languages=None):
+    """The export document for `ruleset`, limited to `languages` if given."""
+    languages = [lang for lang in (languages or ruleset.languages) if lang in ruleset.languages]
+    if 'en' not in languages:
+        # English is the fallback for every missing translation
+        languages.insert(0, 'en')
+
+    rooms, directions, rules = [], list(DIRECTIONS) + [CENTER], []
+    texts = {lang: [] for lang in languages}
+    keys = sorted({(room, direction) for room, direction, _ in ruleset.cards})
+    for room, direction in keys:
+        if room not in rooms:
+            rooms.append(room)
+        if direction not in directions:
+            directions.append(direction)
+        rule_type, weight, en_card = ruleset.cards[(room, direction, 'en')]
+        rules.append([rooms.index(room), directions.index(direction), TYPES.index(rule_type), weight])
+        en = [en_card["card_title"], en_card["impact"], en_card["remedy"], en_card["detail"]]
+        for lang in languages:
+            card = ruleset.cards[(room, direction, lang)][2]
+            text = [card["card_title"], card["impact"], card["remedy"], card["detail"]]
+            texts[lang].append(text if lang == 'en' or text != en else None)
+
+    return {
+        "format": EXPORT_FORMAT,
+        "version": ruleset.version,
+        "scoring": {"base": BASE_SCORE, "min": 0, "max": 100,
+                    "bands": [list(band) for band in SCORE_BANDS], "below": "poor"},
+        "types": list(TYPES),
+        "rooms": rooms,
+        "directions": directions,
+        "aliases": {room: list(names) for room, names in ruleset.room_aliases.items()},
+        # [room index, direction index, type index, weight]
+        "rules": rules,
+        "languages": {
+            lang: {"strings": dict(ruleset.strings(lang)), "cards": texts[lang]}
+            for lang in languages
+        },
+    }
+
+
+def score(export, data, language='en'):
+    """Score a room -> direction layout from an export alone (as a client would).
+
+    Returns the same dict as analyze_vastu(data, language).
+    """
+    if language not in export["languages"]:
+        language = 'en'
+    index = {(export["rooms"][r], export["directions"][d]): i
+             for i, (r, d, _, _) in enumerate(export["rules"])}
+    strings = export["languages"][language]["strings"]
+    total = export["scoring"]["base"]
+    suggestions = []
+    for room_key, direction in data.items():
+        i = index.get((base_room(room_key), direction.lower().strip()))
+        if i is None:
+            suggestions.append({
+                "suggestion_type": "neutral",
+                "card_title": strings['neutral_title'].format(room=room_key, dir=direction),
+                "impact": strings['neutral_impact'],
+                "remedy": strings['neutral_remedy'],
+                "detail": "",
+            })
+            continue
+        _, _, rule_type, weight = export["rules"][i]
+        text = export["languages"][language]["cards"][i] or export["languages"]["en"]["cards"][i]
+        total += weight
+        suggestions.append(dict(zip(("suggestion_type", "card_title", "impact", "remedy", "detail"),
+                                    [export["types"][rule_type]] + text)))
+    final = max(export["scoring"]["min"], min(export["scoring"]["max"], round(total)))
+    band = next((name for bound, name in export["scoring"]["bands"] if final > bound), export["scoring"]["below"])
+    return {"score": final, "suggestions": suggestions, "explanation": strings[band]}
+
+
+class RulesetExport:
+    """One serialized export: body, ETag and lazily compressed variants."""
+
+    def __init__(self, ruleset, languages=None):
+        self.source = ruleset
+        self.body = dumps(build_export(ruleset, languages))
+        digest = hashlib.sha256(self.body).hexdigest()[:20]
+        # Weak: the same validator covers the gzip/br encodings of the body
+        self.etag = f'W/"{ruleset.version}-{digest}"'
+        self._encoded = {}
+
+    def encoded(self, accept_encoding):
+        """(body, content_encoding or None) for the client.
+
+        Each coding is produced once, at the highest level: the body is
+        served many times per change.
+        """
+        coding = pick_encoding(accept_encoding) if len(self.body) >= COMPRESS_MIN_BYTES else None
+        if coding is None:
+            return self.body, None
+        body = self._encoded.get(coding)
+        if body is None:
+            body = self._encoded[coding] = encode(self.body, coding, gzip_level=9, brotli_quality=11)
+        return body, coding
+
+    def matches(self, if_none_match):
+        """Weak comparison against an If-None-Match header."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any(tag.removeprefix('W/') == self.etag.removeprefix('W/') for tag in tags)
+
+
+_exports = {}
+_exports_lock = threading.Lock()
+
+
+def get_export(languages=None):
+    """Export for the active ruleset (rebuilt when it reloads)."""
+    ruleset = get_ruleset()
+    languages = sorted(set(languages or ()) & set(ruleset.languages))
+    key = tuple(languages) or None
+    export = _exports.get(key)
+    if export is None or export.source is not ruleset:
+        with _exports_lock:
+            export = _exports.get(key)
+            if export is None or export.source is not ruleset:
+                if any(e.source is not ruleset for e in _exports.values()):
+                    _exports.clear()
+                export = _exports[key] = RulesetExport(ruleset, languages)
+    return export
@@ -0,0 +1,159 @@
+# Process start-up: preload, warm-up, readiness and cold-start timing
+#
+# Under the pre-forking server (gunicorn.conf.py) the master calls preload()
+# once, so the Gemini SDK import, the model client object and the compiled
+# ruleset caches are shared copy-on-write by every worker. Connections are
+# not shared: each worker drops the SQLite handles it inherited and opens its
+# own Gemini connection in warm_up() before it accepts requests.
+#
+# /livez only says the process is up; /readyz turns 200 once warm_up() is done.
+#
+# Measure cold start (fresh interpreter to ready) with:  python startup.py
+
+import os
+import sys
+import time
+import logging
+import threading
+
+from metrics import register_collector, start_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+def _process_start_time():
+    """Wall-clock time this process started (fork/exec), falling back to now."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, after the parenthesised command name (which may hold spaces)
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+_lock = threading.Lock()
+_state = {
+    "started_at": _process_start_time(),
+    "preloaded": False,
+    "ready": False,
+    "warming": False,
+    "model_warm": None,
+    "preload": {},
+    "timings": {},
+}
+
+
+def _phase(name, fn, into="timings"):
+    start = time.perf_counter()
+    result = fn()
+    _state[into][name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def preload():
+    """Load everything that can be shared across forked workers (idempotent)."""
+    with _lock:
+        if _state["preloaded"]:
+            return
+        import extraction
+        from responses import get_fragments
+        from ruleset import get_ruleset
+        from vastu_batch import get_rule_matrix
+
+        _phase("model_clients", extraction.load_models, into="preload")
+        _phase("ruleset", lambda: (get_ruleset(), get_fragments(), get_rule_matrix()), into="preload")
+        _state["preloaded"] = True
+
+
+def _forget_inherited_connections():
+    # SQLite handles must not be used across fork(); the per-thread
+    # connections are reopened on first use in the child.
+    import extraction
+    import app
+    for holder in (extraction.extraction_cache, extraction.similar_plans, extraction.history,
+                   extraction.upstream.bucket, app.job_queue):
+        holder._local = threading.local()
+
+
+def after_fork():
+    """Reset per-process state in a freshly forked worker (preload timings are kept)."""
+    _state.update(started_at=time.time(), ready=False, warming=False, model_warm=None, timings={})
+    _forget_inherited_connections()
+    start_snapshots()
+
+
+def warm_up():
+    """Get this process ready to serve: preload, connect to Gemini, start job workers."""
+    with _lock:
+        if _state["ready"] or _state["warming"]:
+            return
+        _state["warming"] = True
+    try:
+        preload()
+        import extraction
+        from app import job_queue
+
+        _state["model_warm"] = _phase("model_warmup", extraction.warm_model)
+        job_queue.start()
+    finally:
+        with _lock:
+            _state["warming"] = False
+    _state["timings"]["total"] = round(time.time() - _state["started_at"], 4)
+    _state["ready"] = True
+    logger.info("Ready in %.2fs (pid %d): %s", _state["timings"]["total"], os.getpid(), _state["timings"])
+
+
+def ensure_warm_up():
+    """Start warm_up() in the background if no server hook has run it."""
+    if not (_state["ready"] or _state["warming"]):
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+def is_ready():
+    return _state["ready"]
+
+
+def report():
+    return {
+        "ready": _state["ready"],
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.time() - _state["started_at"], 3),
+        "model_warm": _state["model_warm"],
+        "preload_seconds": dict(_state["preload"]),
+        "startup_seconds": dict(_state["timings"]),
+    }
+
+
+@register_collector
+def _startup_metrics():
+    yield ("vastu_ready", "gauge", "1 once this process has finished warming up.",
+           [({}, 1 if _state["ready"] else 0)])
+    yield ("vastu_startup_seconds", "gauge",
+           "Start-up time by phase (total: process start to ready; preload_* ran before any fork).",
+           [({"phase": f"preload_{k}"}, v) for k, v in _state["preload"].items()] +
+           [({"phase": k}, v) for k, v in _state["timings"].items()])
+
+
+def measure_cold_start(runs=5):
+    """Median seconds for a fresh interpreter to import the app, and to be ready."""
+    import json
+    import statistics
+    import subprocess
+
+    probe = ("import time, json; t0 = time.perf_counter(); import app, startup; "
+             "t1 = time.perf_counter(); startup.warm_up(); "
+             "print(json.dumps({'import': t1 - t0, 'ready': time.perf_counter() - t0}))")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {k: round(statistics.median(s[k] for s in samples), 3) for k in ("import", "ready")}
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(measure_cold_start(runs))
@@ -84,23 +84,54 @@ function App() {
         formData.append('language', language);
 
         try {
-            const response = await fetch('/analyze', {
+            // Streamed: each room's card shows up as soon as the model names it
+            const response = await fetch('/analyze/stream', {
                 method: 'POST',
                 body: formData
             });
 
-            const data = await response.json();
-
             if (!response.ok) {
+                const data = await response.json();
                 throw new Error(data.error || 'Analysis failed');
             }
 
-            setResults(data);
-
-            // Smooth scroll to results
-            setTimeout(() => {
-                resultsRef.current?.scrollIntoView({ behavior: 'smooth' });
-            }, 100);
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const cards = [];
+            let buffered = '';
+            let scrolled = false;
+            let finished = false;
+
+            const handleEvent = (event) => {
+                if (event.event === 'room') {
+                    cards.push(event.suggestion);
+                    setResults({ analysis: { score: null, explanation: '…', suggestions: [...cards] }, pending: true });
+                } else if (event.event === 'result') {
+                    finished = true;
+                    setResults(event);
+                } else if (event.event === 'error') {
+                    setResults(null);
+                    throw new Error(event.error || 'Analysis failed');
+                }
+                if (!scrolled) {
+                    scrolled = true;
+                    // Smooth scroll to results
+                    setTimeout(() => {
+                        resultsRef.current?.scrollIntoView({ behavior: 'smooth' });
+                    }, 100);
+                }
+            };
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+            }
+            if (buffered.trim()) handleEvent(JSON.parse(buffered));
+            if (!finished) throw new Error('Analysis ended unexpectedly');
 
         } catch (err) {
             console.error("Backend Error:", err);
@@ -111,7 +142,7 @@ function App() {
     };
 
     useEffect(() => {
-        if (results && canvasRef.current) {
+        if (results && results.analysis.score != null && canvasRef.current) {
             if (chartRef.current) chartRef.current.destroy();
             const ctx = canvasRef.current.getContext('2d');
 
@@ -259,7 +290,7 @@ function App() {
                                     <canvas ref={canvasRef} className="z-10"></canvas>
                                     <div className="absolute top-1/2 left-1/2 -translate-x-1/2 -translate-y-1/4 text-center z-20">
                                         <span className={`text-6xl font-bold block ${results.analysis.score > 80 ? 'text-emerald-400' : results.analysis.score > 50 ? 'text-amber-400' : 'text-red-400'}`}>
-                                            {results.analysis.score}
+                                            {results.analysis.score ?? '…'}
                                         </span>
                                         <span className="text-gray-600 text-xl font-medium">/100</span>
                                     </div>
@@ -0,0 +1,90 @@
+# Synthetic floor-plan images for offline benchmarks and load tests
+
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+
+def make_plan(size=(1200, 900), fmt='PNG', kind='lineart', seed=0):
+    """Draw a plan-like image (room outlines; 'photo' adds a paper/noise
+    background like a phone shot) and return it encoded as bytes.
+
+    Different seeds give structurally different plans, so they miss both the
+    exact and the near-duplicate extraction caches.
+    """
+    rng = random.Random(seed)
+    w, h = size
+    if kind == 'photo':
+        img = Image.effect_noise(size, 40).convert('RGB')
+        img = Image.blend(img, Image.new('RGB', size, (210, 190, 160)), 0.6)
+    else:
+        img = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+    line = max(2, w // 400)
+    for _ in range(14):
+        x0, y0 = rng.randrange(0, w // 2), rng.randrange(0, h // 2)
+        draw.rectangle([x0, y0, x0 + rng.randrange(w // 8, w // 2), y0 + rng.randrange(h // 8, h // 2)],
+                       outline='black', width=line)
+    buf = io.BytesIO()
+    img.save(buf, fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    return buf.getvalue()
+
+
+ROOM_NAMES = ['Kitchen', 'Master Bedroom', 'Toilet', 'Entrance', 'Pooja Room', 'Hall',
+              'Dining', 'Study', 'Store Room', 'Balcony']
+
+
+def make_vector_plan(rooms=12, fmt='svg', seed=0):
+    """A CAD-style export: a grid of labeled room outlines inside an outer wall.
+
+    fmt is 'svg' (rects and L-shaped paths with <text> labels) or 'dxf'
+    (closed LWPOLYLINEs with TEXT/MTEXT labels). Returns bytes.
+    """
+    rng = random.Random(seed)
+    cols = max(1, round(rooms ** 0.5))
+    rows = -(-rooms // cols)
+    cell = 400
+    outlines = []
+    for i in range(rooms):
+        r, c = divmod(i, cols)
+        x0, y0 = c * cell + rng.randrange(0, 40), r * cell + rng.randrange(0, 40)
+        x1, y1 = (c + 1) * cell - rng.randrange(0, 40), (r + 1) * cell - rng.randrange(0, 40)
+        if i % 4 == 3:
+            mx, my = (x0 + x1) // 2, (y0 + y1) // 2
+            points = [(x0, y0), (x1, y0), (x1, my), (mx, my), (mx, y1), (x0, y1)]
+            label_at = ((x0 + mx) / 2, (y0 + y1) / 2)
+        else:
+            points = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+            label_at = ((x0 + x1) / 2, (y0 + y1) / 2)
+        name = ROOM_NAMES[i % len(ROOM_NAMES)] + ('' if i < len(ROOM_NAMES) else f' {i}')
+        outlines.append((points, name, label_at))
+    width, height = cols * cell, rows * cell
+
+    if fmt == 'svg':
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}">',
+                 f'<rect x="0" y="0" width="{width}" height="{height}" fill="none" stroke="black"/>']
+        for points, name, (lx, ly) in outlines:
+            d = 'M ' + ' L '.join(f'{x} {y}' for x, y in points) + ' Z'
+            parts.append(f'<g><path d="{d}" fill="none" stroke="black"/>'
+                         f'<text x="{lx}" y="{ly}">{name}</text>'
+                         f'<text x="{lx}" y="{ly + 20}">12\'x10\'</text></g>')
+        parts.append('</svg>')
+        return '\n'.join(parts).encode()
+
+    def group(code, value):
+        return f"{code}\n{value}\n"
+
+    # CAD coordinates: y grows upwards
+    out = [group(0, 'SECTION'), group(2, 'ENTITIES')]
+    outer = ([(0, 0), (width, 0), (width, height), (0, height)], None, (0, 0))
+    for i, (points, name, (lx, ly)) in enumerate(outlines + [outer]):
+        out += [group(0, 'LWPOLYLINE'), group(8, 'ROOMS'), group(90, len(points)), group(70, 1)]
+        for x, y in points:
+            out += [group(10, x), group(20, height - y)]
+        if name:
+            kind = 'MTEXT' if i % 2 else 'TEXT'
+            text = f'{{\\fArial|b1;{name}}}\\P3.5 x 4 m' if kind == 'MTEXT' else name
+            out += [group(0, kind), group(8, 'LABELS'), group(10, lx), group(20, height - ly), group(1, text)]
+    out += [group(0, 'ENDSEC'), group(0, 'EOF')]
+    return ''.join(out).encode()
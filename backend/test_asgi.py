@@ -0,0 +1,27 @@
+import pytest
+from starlette.testclient import TestClient
+
+import asgi
+
+
+@pytest.fixture
+def client():
+    return TestClient(asgi.app)
+
+
+@pytest.mark.parametrize("path", ["/analyze", "/analyze/stream"])
+@pytest.mark.parametrize("length, status", [("abc", 400), ("-5", 400), (str(10 ** 12), 413)])
+def test_content_length_is_checked_before_reading(client, path, length, status):
+    response = client.post(path, content=b"x", headers={
+        "Content-Length": length, "Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == status
+    assert "error" in response.json()
+
+
+def test_missing_image(client):
+    response = client.post("/analyze", data={"language": "en"})
+    assert response.status_code == 400
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,52 @@
+# Parity of the rules-file engine with the original hard-coded analyze_vastu.
+# testdata/engine_baseline.json holds that engine's output: the card and
+# score of every single room/direction pair (English and Tamil) and the
+# scores of mixed layouts.
+
+import json
+import os
+
+import pytest
+
+from vastu_batch import analyze_vastu_batch
+from vastu_engine import analyze_vastu, room_suggestion
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "engine_baseline.json"),
+          encoding="utf-8") as f:
+    BASELINE = json.load(f)
+
+SINGLE = [(language, *case) for language, cases in BASELINE["rooms"].items() for case in cases]
+
+
+@pytest.mark.parametrize("language, room, direction, score, card", SINGLE)
+def test_single_rooms_match_the_baseline(language, room, direction, score, card):
+    result = analyze_vastu({room: direction}, language)
+    assert result["score"] == score
+    assert result["suggestions"] == [card]
+    assert room_suggestion(room, direction, language) == card
+
+
+@pytest.mark.parametrize("case", BASELINE["layouts"])
+def test_layouts_match_the_baseline(case):
+    layout = case["layout"]
+    for language, score in case["scores"].items():
+        result = analyze_vastu(layout, language)
+        assert result["score"] == score
+        assert result["explanation"] == case["explanation"][language]
+        assert result["suggestions"] == [room_suggestion(r, d, language) for r, d in layout.items()]
+
+
+def test_unknown_language_falls_back_to_english():
+    layout = BASELINE["layouts"][0]["layout"]
+    assert analyze_vastu(layout, "xx") == analyze_vastu(layout, "en")
+
+
+def test_batch_scores_match():
+    layouts = [case["layout"] for case in BASELINE["layouts"]]
+    batch = analyze_vastu_batch(layouts, "ta")
+    assert batch["score"].tolist() == [case["scores"]["ta"] for case in BASELINE["layouts"]]
+    assert batch["explanation"] == [case["explanation"]["ta"] for case in BASELINE["layouts"]]
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+from plan_geometry import MAX_POLYGON_POINTS, PlanGeometry, _polygon_cells
+
+BOUNDS = [0, 0, 90, 90]
+
+
+def plan(*rooms, **kw):
+    return PlanGeometry.from_json({"rooms": list(rooms), "bounds": BOUNDS, **kw})
+
+
+def share(geometry, i, zone):
+    names = geometry.zones + ('center',)
+    return geometry.shares()[i, names.index(zone)]
+
+
+def test_rooms_inside_one_zone():
+    g = plan({"room": "kitchen", "bbox": [80, 80, 90, 90]},
+             {"room": "pooja", "bbox": [0, 0, 10, 10]},
+             {"room": "hall", "bbox": [30, 30, 60, 60]})
+    assert share(g, 0, "south-east") == pytest.approx(1.0)
+    assert share(g, 1, "north-west") == pytest.approx(1.0)
+    assert share(g, 2, "center") == pytest.approx(1.0)
+    assert list(g.layout().values()) == ["south-east", "north-west", "center"]
+
+
+def test_straddling_room_splits_symmetrically():
+    g = plan({"room": "hall", "bbox": [0, 0, 90, 30]})
+    assert share(g, 0, "north-west") == pytest.approx(share(g, 0, "north-east"), abs=1e-3)
+    assert share(g, 0, "west") == pytest.approx(share(g, 0, "east"), abs=1e-3)
+    assert share(g, 0, "south") == share(g, 0, "center") == 0
+    assert g.shares().sum() == pytest.approx(1.0)
+
+
+def test_north_rotation():
+    # North drawn to the right: the right-hand strip is the north of the plan
+    g = plan({"room": "store", "bbox": [80, 40, 90, 50]}, north=90)
+    assert list(g.layout().values()) == ["north"]
+
+
+def test_rectilinear_polygon_equals_its_boxes():
+    l_shape = [[0, 0], [60, 0], [60, 30], [30, 30], [30, 60], [0, 60]]
+    g = plan({"room": "hall", "polygon": l_shape},
+             {"room": "a", "bbox": [0, 0, 60, 30]}, {"room": "b", "bbox": [0, 30, 30, 60]})
+    union = g.shares()[1] * 1800 + g.shares()[2] * 900
+    assert g.shares()[0] == pytest.approx(union / 2700, abs=1e-6)
+
+
+def test_slanted_polygon_is_sampled_like_its_mirror():
+    g = plan({"room": "a", "polygon": [[0, 0], [45, 0], [0, 45]]},
+             {"room": "b", "polygon": [[90, 0], [45, 0], [90, 45]]})
+    names = g.zones + ('center',)
+    mirror = [names.index(z.replace('west', 'EAST').replace('east', 'west').replace('EAST', 'east'))
+              for z in names]
+    assert g.shares()[0] == pytest.approx(g.shares()[1][mirror], abs=0.02)
+
+
+def test_polygon_cells_memory_is_per_row():
+    t = np.linspace(0, 2 * math.pi, MAX_POLYGON_POINTS, endpoint=False)
+    circle = np.column_stack([128 + 100 * np.cos(t), 128 + 100 * np.sin(t)])
+    _, _, inside = _polygon_cells(circle, 256, 256)
+    assert inside.sum() == pytest.approx(math.pi * 100 ** 2, rel=0.01)
+
+
+def test_outline_point_caps():
+    t = np.linspace(0, 2 * math.pi, MAX_POLYGON_POINTS + 1, endpoint=False)
+    with pytest.raises(ValueError, match="points"):
+        plan({"room": "hall", "polygon": [[45 + 40 * math.cos(a), 45 + 40 * math.sin(a)] for a in t]})
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
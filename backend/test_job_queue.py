@@ -0,0 +1,127 @@
+import io
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import job_queue
+from job_queue import JobQueue, RetryableJobError
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(handler, **kw):
+        q = JobQueue(handler, db_path=str(tmp_path / "jobs.sqlite3"), jobs_dir=str(tmp_path / "inputs"), **kw)
+        queues.append(q)
+        return q
+
+    yield make
+    for q in queues:
+        q.stop()
+
+
+def _column(q, job_id, name):
+    return q._conn().execute(f"SELECT {name} FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_nothing_is_created_before_first_use(tmp_path, make_queue):
+    make_queue(lambda f, p: {})
+    assert not (tmp_path / "jobs.sqlite3").exists()
+    assert not (tmp_path / "inputs").exists()
+
+
+def test_retry_waits_for_run_after_in_every_worker(make_queue):
+    def quota(f, params):
+        raise RetryableJobError("quota")
+
+    q = make_queue(quota)
+    job_id = q.submit(io.BytesIO(b"plan"))
+    q._run(q._claim())
+    job = q.get(job_id)
+    assert job["status"] == "queued" and job["retry_at"] > time.time()
+    # A second worker (or process) sees the same database
+    other = make_queue(quota)
+    assert other._claim() is None
+
+    q._conn().execute("UPDATE jobs SET run_after = ?", (time.time() - 1,))
+    assert other._claim()["id"] == job_id
+
+
+def test_retries_stop_at_max_attempts(make_queue):
+    def quota(f, params):
+        raise RetryableJobError("quota")
+
+    q = make_queue(quota)
+    job_id = q.submit(io.BytesIO(b"plan"))
+    for _ in range(job_queue.JOB_MAX_ATTEMPTS):
+        q._conn().execute("UPDATE jobs SET run_after = NULL")
+        q._run(q._claim())
+    job = q.get(job_id)
+    assert (job["status"], job["error_code"], job["attempts"]) == ("failed", 429, job_queue.JOB_MAX_ATTEMPTS)
+
+
+def test_expired_lease_is_requeued_then_failed(make_queue):
+    q = make_queue(lambda f, p: {})
+    job_id = q.submit(io.BytesIO(b"plan"))
+    q._claim()
+    q._conn().execute("UPDATE jobs SET lease_until = 0")
+    assert q._claim()["id"] == job_id  # reclaimed and handed out again
+    assert _column(q, job_id, "attempts") == 2
+
+    q._conn().execute("UPDATE jobs SET lease_until = 0, attempts = ?", (job_queue.JOB_MAX_ATTEMPTS,))
+    assert q._claim() is None
+    job = q.get(job_id)
+    assert (job["status"], job["error_code"]) == ("failed", 500)
+
+
+def test_heartbeat_renews_running_leases(make_queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOB_LEASE_SECONDS", 0.3)
+    q = make_queue(lambda f, p: {})
+    job_id = q.submit(io.BytesIO(b"plan"))
+    q._claim()
+    first = _column(q, job_id, "lease_until")
+    q._running.add(job_id)
+    threading.Thread(target=q._heartbeat, daemon=True).start()
+    time.sleep(0.5)
+    assert _column(q, job_id, "lease_until") > first
+
+
+def test_idle_claim_does_not_take_the_write_lock(tmp_path, make_queue):
+    q = make_queue(lambda f, p: {})
+    q.metrics()
+    writer = sqlite3.connect(str(tmp_path / "jobs.sqlite3"), isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        assert q._claim() is None
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute("ROLLBACK")
+
+
+def test_worker_survives_database_errors(make_queue):
+    q = make_queue(lambda f, p: {"ok": True}, workers=1)
+    finish = q._finish
+    calls = []
+
+    def flaky_finish(*args, **kw):
+        calls.append(1)
+        # The result and then the failure can't be stored
+        if len(calls) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return finish(*args, **kw)
+
+    q._finish = flaky_finish
+    first = q.submit(io.BytesIO(b"plan"))
+    q.start()
+    second = q.submit(io.BytesIO(b"plan"))
+    assert q.wait(second, 5)["status"] == "done"
+    assert q._threads[0].is_alive()
+    assert q.get(first)["status"] == "running"  # left for lease expiry
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
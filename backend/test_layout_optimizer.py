@@ -0,0 +1,70 @@
+from itertools import permutations, product
+
+import pytest
+
+from layout_optimizer import InfeasibleLayout, optimize_layout
+from vastu_batch import get_rule_matrix
+from vastu_engine import analyze_vastu
+
+
+def raw_score(layout):
+    matrix = get_rule_matrix()
+    return 50 + sum(int(matrix.weights[matrix.room_code(r), matrix.direction_code(d)])
+                    for r, d in layout.items())
+
+
+def brute_force(rooms, zones, one_room_per_zone=True, fixed=None):
+    fixed = fixed or {}
+    free = [r for r in rooms if r not in fixed]
+    pool = [z for z in zones if z not in fixed.values()] if one_room_per_zone else zones
+    choices = permutations(pool, len(free)) if one_room_per_zone else product(pool, repeat=len(free))
+    return sorted((raw_score({**fixed, **dict(zip(free, c))}) for c in choices), reverse=True)
+
+
+ZONES = get_rule_matrix().directions[1:]
+
+
+@pytest.mark.parametrize("rooms, one_room_per_zone", [
+    (["kitchen", "toilet", "entrance", "master_bedroom"], True),
+    (["kitchen", "toilet", "entrance", "master_bedroom"], False),
+    (["kitchen", "toilet", "toilet", "pooja"], True),
+])
+def test_matches_brute_force(rooms, one_room_per_zone):
+    keys = [r if r not in rooms[:i] else f"{r}_2" for i, r in enumerate(rooms)]
+    # Rooms without rules can go anywhere; alternatives differ in the others
+    scored = [k for k in keys if get_rule_matrix().room_code(k)]
+    expected = brute_force(scored, ZONES, one_room_per_zone)
+    result = optimize_layout(rooms, one_room_per_zone=one_room_per_zone, top_k=5)
+    assert [alt["raw_score"] for alt in result["alternatives"]] == expected[:5]
+    for alt in result["alternatives"]:
+        assert raw_score(alt["layout"]) == alt["raw_score"]
+        if one_room_per_zone:
+            assert len(set(alt["layout"].values())) == len(rooms)
+
+
+def test_fixed_and_forbidden_rooms():
+    rooms = ["kitchen", "toilet", "entrance"]
+    result = optimize_layout(rooms, fixed={"kitchen": "north-east"}, forbidden=["north"])
+    zones = [z for z in ZONES if z != "north"]
+    assert result["alternatives"][0]["raw_score"] == brute_force(rooms, zones, fixed={"kitchen": "north-east"})[0]
+    for alt in result["alternatives"]:
+        assert alt["layout"]["kitchen"] == "north-east"
+        assert "north" not in alt["layout"].values()
+
+
+def test_repeated_rooms_are_kept():
+    result = optimize_layout(["Toilet", "Toilet", "kitchen"])
+    layout = result["alternatives"][0]["layout"]
+    assert list(layout) == ["Toilet", "Toilet_2", "kitchen"]
+    # Both toilets are scored by the toilet rules
+    assert analyze_vastu(layout)["score"] == result["alternatives"][0]["score"]
+    assert raw_score({"toilet": layout["Toilet_2"]}) != 50
+
+
+def test_not_enough_zones():
+    with pytest.raises(InfeasibleLayout):
+        optimize_layout(["kitchen", "toilet", "entrance"], zones=["north", "south"])
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,101 @@
+import io
+import types
+
+import pytest
+from PIL import Image
+
+import pdf_ingest
+from pdf_ingest import PdfPlanError, analyze_pdf, is_pdf
+from vastu_engine import analyze_vastu
+
+pytestmark = pytest.mark.skipif(pdf_ingest.pdfium is None, reason="pypdfium2 is not installed")
+
+
+def make_pdf(pages):
+    """A small PDF with a text title and an outline on each (width, title) page."""
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for i, (width, title) in enumerate(pages):
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} 400]"
+                    f" /Resources << /Font << /F1 {font} 0 R >> >> /Contents {4 + 2 * i} 0 R >>")
+        content = f"BT /F1 18 Tf 40 360 Td ({title}) Tj ET 40 40 m 300 40 l 300 300 l 40 300 l h S"
+        objs.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objs.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+# Page width (pages are 400pt tall) -> layout the fake model reads off the render
+LAYOUTS = {
+    600: {"kitchen": "south-east", "master_bedroom": "south-west"},
+    500: {"kitchen": "north-east", "toilet": "north-east"},
+    400: {},
+}
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    def extract_plan(file):
+        img = Image.open(file)
+        width = round(400 * img.width / img.height)
+        return types.SimpleNamespace(cached=False, source="model"), dict(LAYOUTS[width])
+
+    monkeypatch.setattr(pdf_ingest, "extract_plan", extract_plan)
+    monkeypatch.setattr(pdf_ingest, "record_analysis", lambda *a, **kw: None)
+
+
+def test_floors_in_page_order_with_titles(fake_model):
+    pdf = make_pdf([(600, "GROUND FLOOR PLAN"), (500, "First Floor"), (400, "Notes")])
+    assert is_pdf(io.BytesIO(pdf))
+    result = analyze_pdf(io.BytesIO(pdf))
+    assert result["pages"] == 3
+    floors = result["floors"]
+    assert [(f["page"], f["title"], f["status"]) for f in floors] == [
+        (1, "GROUND FLOOR PLAN", "ok"), (2, "First Floor", "ok"), (3, "Page 3", "ok")]
+    assert floors[0]["raw_data"] == LAYOUTS[600]
+    assert floors[0]["analysis"] == analyze_vastu(LAYOUTS[600])
+
+    building = result["building"]
+    scores = [analyze_vastu(LAYOUTS[w])["score"] for w in (600, 500)]
+    assert building["floors_scored"] == 2
+    assert building["score"] == round(sum(scores) / 2)
+    assert building["rooms"] == 4
+    assert building["weakest_floor"]["page"] == 1 + scores.index(min(scores))
+    assert {d["page"] for d in building["defects"]} <= {1, 2}
+
+
+def test_failed_floor_is_reported_not_raised(fake_model, monkeypatch):
+    extract = pdf_ingest.extract_plan
+
+    def flaky(file):
+        prepared, data = extract(file)
+        if not data:
+            raise ValueError("model exploded")
+        return prepared, data
+
+    monkeypatch.setattr(pdf_ingest, "extract_plan", flaky)
+    result = analyze_pdf(io.BytesIO(make_pdf([(400, "Roof"), (600, "Ground floor")])))
+    assert [(f["status"], f.get("code")) for f in result["floors"]] == [("error", 500), ("ok", None)]
+    assert result["building"]["floors_scored"] == 1
+
+
+def test_unreadable_and_oversized_pdfs(fake_model, monkeypatch):
+    with pytest.raises(PdfPlanError):
+        analyze_pdf(io.BytesIO(b"%PDF-1.4 garbage"))
+    monkeypatch.setattr(pdf_ingest, "PDF_MAX_PAGES", 1)
+    with pytest.raises(PdfPlanError, match="limit"):
+        analyze_pdf(io.BytesIO(make_pdf([(600, "A"), (500, "B")])))
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
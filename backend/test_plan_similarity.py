@@ -0,0 +1,75 @@
+import io
+import random
+import sqlite3
+
+import pytest
+from PIL import Image, ImageDraw
+
+from plan_similarity import MAX_DISTANCE, BKTree, NearDuplicateIndex, dhash, hamming
+
+
+def plan_image(seed, size=(800, 600)):
+    rng = random.Random(seed)
+    img = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([20, 20, size[0] - 20, size[1] - 20], outline=0, width=6)
+    for _ in range(6):
+        x, y = rng.randrange(40, size[0] - 200), rng.randrange(40, size[1] - 150)
+        draw.rectangle([x, y, x + rng.randrange(80, 200), y + rng.randrange(60, 150)], outline=0, width=4)
+    return img
+
+
+def resaved(img, scale=1.0, quality=70):
+    if scale != 1.0:
+        img = img.resize((int(img.width * scale), int(img.height * scale)), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    buf.seek(0)
+    return Image.open(buf)
+
+
+def test_copies_match_and_other_plans_do_not():
+    hashes = [dhash(plan_image(seed)) for seed in range(30)]
+    for seed in range(30):
+        img = plan_image(seed)
+        for copy in (resaved(img), resaved(img, quality=85)):
+            assert hamming(dhash(copy), hashes[seed]) <= MAX_DISTANCE
+    closest = min(hamming(a, b) for i, a in enumerate(hashes) for b in hashes[i + 1:])
+    assert closest > MAX_DISTANCE
+
+
+def test_bk_tree_nearest_matches_a_linear_scan():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    tree = BKTree()
+    for h in hashes:
+        tree.add(h, h)
+    for _ in range(200):
+        probe = rng.choice(hashes) ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64))
+        best = min(hamming(probe, h) for h in hashes)
+        found = tree.nearest(probe, 3)
+        assert (found[0] if found else None) == (best if best <= 3 else None)
+
+
+@pytest.mark.parametrize("persisted", [True, False])
+def test_matches_stay_within_their_scope(tmp_path, persisted):
+    index = NearDuplicateIndex(db_path=str(tmp_path / "hashes.sqlite3") if persisted else None)
+    index.add(0xF0F0, {"kitchen": "south-east"}, "model-a")
+    assert index.lookup(0xF0F1, ["model-b"]) is None
+    assert index.lookup(0xF0F1, ["model-b", "model-a"]) == ("model-a", {"kitchen": "south-east"})
+
+
+def test_unscoped_rows_are_dropped(tmp_path):
+    db = str(tmp_path / "hashes.sqlite3")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE plan_hashes (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                 " phash TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL DEFAULT 0)")
+    conn.execute("INSERT INTO plan_hashes (phash, data, created) VALUES ('000000000000f0f0', '{}', 1e12)")
+    conn.commit()
+    conn.close()
+    index = NearDuplicateIndex(db_path=db)
+    assert index.lookup(0xF0F0, [""]) is None
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,57 @@
+import base64
+import json
+import zlib
+
+import pytest
+
+from rescoring import rescore
+from responses import TOKEN_MAX_CHARS, decode_token, encode_token, layout_token
+from vastu_engine import analyze_vastu
+
+
+def test_patch_matches_full_analysis():
+    token = layout_token({"kitchen": "north-east", "toilet": "north-west"})
+    patch = json.loads(rescore(token, {"kitchen": "south-east"}))
+    assert patch["score"] == analyze_vastu({"kitchen": "south-east", "toilet": "north-west"})["score"]
+    assert patch["added"][0]["room"] == "kitchen"
+
+
+def test_edits_are_normalized_like_model_replies():
+    token = layout_token({"kitchen": "north-east"})
+    patch = json.loads(rescore(token, {"Kitchen": "SE"}))
+    assert [(a["room"], a["direction"]) for a in patch["added"]] == [("kitchen", "south-east")]
+    assert decode_token(patch["analysis_token"])["layout"] == {"kitchen": "south-east"}
+
+
+def test_rejects_unsigned_or_tampered_tokens():
+    token = layout_token({"kitchen": "north-east"})
+    payload, _, signature = token.partition('.')
+    state = decode_token(token)
+    state["total"] = 1000
+    forged = base64.urlsafe_b64encode(zlib.compress(json.dumps(state).encode())).rstrip(b'=').decode()
+    for bad in (payload, f"{forged}.{signature}", token[:-2] + "AA", "", "not a token", "é.é"):
+        with pytest.raises(ValueError):
+            decode_token(bad)
+
+
+def test_rejects_oversized_tokens():
+    with pytest.raises(ValueError, match="too large"):
+        decode_token("A" * (TOKEN_MAX_CHARS + 1))
+    # Signed but inflating past the cap (a zip bomb would stop at the cap too)
+    big = encode_token({"layout": {}, "total": 50, "language": "en", "pad": "x" * 1_000_000})
+    assert len(big) <= TOKEN_MAX_CHARS
+    with pytest.raises(ValueError):
+        decode_token(big)
+
+
+def test_rejects_malformed_state():
+    for state in ({"layout": {"kitchen": 1}, "total": 50, "language": "en"},
+                  {"layout": {"kitchen": "east"}, "total": True, "language": "en"},
+                  {"layout": {"kitchen": "east"}, "total": 50, "language": "en", "weights": {"kitchen": "x"}},
+                  {"layout": [], "total": 50, "language": "en"}):
+        with pytest.raises(ValueError):
+            decode_token(encode_token(state))
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
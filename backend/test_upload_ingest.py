@@ -0,0 +1,49 @@
+import io
+
+import pytest
+from PIL import Image
+
+from image_preprocess import preprocess
+
+import upload_ingest
+from upload_ingest import UnsafeImage, UploadTooLarge, detach_upload, open_plan, spool_upload
+
+
+def encoded(fmt, size):
+    buf = io.BytesIO()
+    Image.new("L", size, 255).save(buf, fmt)
+    buf.seek(0)
+    return buf
+
+
+def test_png_over_full_decode_limit_is_refused(monkeypatch):
+    monkeypatch.setattr(upload_ingest, "MAX_FULL_DECODE_PIXELS", 100 * 100)
+    with spool_upload(encoded("PNG", (200, 200))) as upload:
+        with pytest.raises(UnsafeImage, match="PNG"):
+            open_plan(upload)
+
+
+def test_jpeg_over_full_decode_limit_is_draft_decoded(monkeypatch):
+    monkeypatch.setattr(upload_ingest, "MAX_FULL_DECODE_PIXELS", 100 * 100)
+    with spool_upload(encoded("JPEG", (4000, 4000))) as upload:
+        img = open_plan(upload)
+    assert img.size[0] < 4000
+
+
+def test_original_dimensions_come_from_the_header():
+    with spool_upload(encoded("JPEG", (7000, 7000))) as upload:
+        img = open_plan(upload)
+        _, report = preprocess(img, upload)
+    assert img.size != (7000, 7000)
+    assert report["original_dimensions"] == [7000, 7000]
+
+
+def test_detach_upload_is_capped(monkeypatch):
+    monkeypatch.setattr(upload_ingest, "MAX_UPLOAD_BYTES", 1000)
+    assert detach_upload(io.BytesIO(b"x" * 1000)).read() == b"x" * 1000
+    with pytest.raises(UploadTooLarge):
+        detach_upload(io.BytesIO(b"x" * 1001))
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from upstream_guard import CircuitBreaker, SharedTokenBucket, UpstreamGuard, UpstreamUnavailable, is_quota_error
+
+
+def half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    return breaker
+
+
+def guard(breaker=None, bucket=None, **kw):
+    return UpstreamGuard(bucket=bucket or SharedTokenBucket(db_path=''), breaker=breaker or half_open(),
+                         max_retries=0, **kw)
+
+
+def test_breaker_opens_and_admits_one_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.before_call() is None
+    breaker.record_failure()
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()
+    time.sleep(0.06)
+    ticket = breaker.before_call()
+    assert ticket is not None and breaker.state == "half-open"
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and not breaker.probing
+
+
+def test_failed_probe_reopens():
+    breaker = half_open()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.probing
+    assert breaker.report()["opened"] == 2
+
+
+def test_stale_ticket_does_not_free_a_new_probe():
+    breaker = half_open()
+    first = breaker.before_call()
+    breaker.record_failure()
+    time.sleep(0.06)
+    second = breaker.before_call()
+    breaker.release(first)
+    assert breaker.probing
+    breaker.release(second)
+    assert not breaker.probing
+
+
+def test_probe_refused_by_the_rate_budget_keeps_the_slot_free(tmp_path):
+    bucket = SharedTokenBucket(db_path=str(tmp_path / "rate.sqlite3"), rate_per_minute=1, burst=1)
+    bucket.acquire()
+    g = guard(bucket=bucket)
+    with pytest.raises(UpstreamUnavailable):
+        g.call(lambda: "ok", max_wait=0)
+    assert not g.breaker.probing
+    assert guard(breaker=g.breaker).call(lambda: "ok") == "ok"
+    assert g.breaker.state == "closed"
+
+
+def test_cancelled_async_probe_releases_the_slot():
+    async def main():
+        g = guard()
+
+        async def slow():
+            await asyncio.sleep(5)
+
+        task = asyncio.ensure_future(g.call_async(slow))
+        await asyncio.sleep(0.02)
+        assert g.breaker.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not g.breaker.probing
+
+    asyncio.run(main())
+
+
+def test_hedges_never_take_the_probe_slot():
+    g = guard()
+    with pytest.raises(UpstreamUnavailable):
+        g.call(lambda: "ok", probe=False)
+    assert not g.breaker.probing and g.breaker.state == "half-open"
+
+
+@pytest.mark.parametrize("error, quota", [
+    (google_exceptions.TooManyRequests("slow down"), True),
+    (google_exceptions.ResourceExhausted("quota"), True),
+    (google_exceptions.InvalidArgument("quota project not set"), False),
+    (ValueError("429 rooms"), False),
+    (UpstreamUnavailable("Gemini rate budget exhausted (quota)", 1), False),
+])
+def test_is_quota_error(error, quota):
+    assert is_quota_error(error) is quota
+
+
+def test_stats_are_exact_under_threads():
+    g = UpstreamGuard(bucket=SharedTokenBucket(db_path=''), breaker=CircuitBreaker(), max_retries=0)
+
+    def work():
+        for _ in range(2000):
+            g.call(lambda: None)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert g.report()["calls"] == 16000
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from vector_plans import VectorPlanError, parse_vector_plan, sniff, sniff_stream
+
+SVG = b'''<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 90 90">
+  <rect x="0" y="0" width="90" height="90" fill="none"/>
+  <rect x="0" y="0" width="20" height="20"/><text x="10" y="10">Pooja Room</text>
+  <rect x="70" y="70" width="20" height="20" data-room="Kitchen"/>
+  <g transform="translate(70 0)"><rect width="20" height="20"/><text x="5" y="10">Bedroom</text></g>
+</svg>'''
+
+
+def dxf(*entities):
+    body = "".join(entities)
+    return f"0\nSECTION\n2\nENTITIES\n{body}0\nENDSEC\n0\nEOF\n".encode()
+
+
+def lwpolyline(*points, closed=True):
+    coords = "".join(f"10\n{x}\n20\n{y}\n" for x, y in points)
+    return f"0\nLWPOLYLINE\n90\n{len(points)}\n70\n{1 if closed else 0}\n{coords}"
+
+
+def text(x, y, label):
+    return f"0\nTEXT\n10\n{x}\n20\n{y}\n40\n2\n1\n{label}\n"
+
+
+@pytest.mark.parametrize("head, kind", [
+    (SVG, 'svg'),
+    (b'\xef\xbb\xbf<?xml version="1.0"?>\n<svg>', 'svg'),
+    (b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" [<!ENTITY a "b">]><svg:svg xmlns:svg="x">', 'svg'),
+    (dxf(), 'dxf'),
+    (b'999\nexported\n  0\nSECTION\n', 'dxf'),
+    (b'AutoCAD Binary DXF\r\n\x1a\x00', 'dxf'),
+    (b'\x89PNG\r\n\x1a\n', None),
+    (b'\xff\xd8\xff\xe0', None),
+    (b'<html><body><svg></svg></body></html>', None),
+])
+def test_sniff(head, kind):
+    assert sniff(head) == kind
+
+
+def test_sniff_reads_past_a_long_prolog():
+    svg = b'<?xml version="1.0"?>\n<!-- ' + b'x' * 5000 + b' -->\n' + SVG
+    stream = io.BytesIO(svg)
+    assert sniff_stream(stream) == 'svg'
+    assert stream.tell() == 0
+
+
+def test_svg_rooms_and_labels():
+    layout = parse_vector_plan(SVG, 'svg')
+    assert sorted(layout.values()) == ['north-east', 'north-west', 'south-east']
+    assert layout['kitchen'] == 'south-east'
+    assert layout['bedroom'] == 'north-east'
+
+
+def test_dxf_rooms_with_y_up():
+    data = dxf(lwpolyline((0, 0), (90, 0), (90, 90), (0, 90)),
+               lwpolyline((0, 70), (20, 70), (20, 90), (0, 90)), text(5, 80, "Kitchen"),
+               lwpolyline((70, 0), (90, 0), (90, 20), (70, 20)), text(75, 10, "Toilet"))
+    layout = parse_vector_plan(data, 'dxf')
+    assert layout == {'kitchen': 'north-west', 'toilet': 'south-east'}
+
+
+def test_unlabeled_or_binary_files_are_rejected():
+    with pytest.raises(VectorPlanError):
+        parse_vector_plan(b'<svg xmlns="http://www.w3.org/2000/svg"><rect width="9" height="9"/></svg>', 'svg')
+    with pytest.raises(VectorPlanError):
+        parse_vector_plan(b'AutoCAD Binary DXF\r\n\x1a\x00', 'dxf')
+
+
+def test_svg_upload_needs_no_api_key(monkeypatch):
+    import app
+    monkeypatch.setattr(app, "api_key", None)
+    svg = b'<?xml version="1.0"?>\n<!-- ' + b'x' * 5000 + b' -->\n' + SVG
+    response = app.app.test_client().post(
+        '/analyze', data={"image": (io.BytesIO(svg), "plan.svg")}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert response.get_json()["source"] == "vector"
+
+
+if __name__ == '__main__':
+    raise SystemExit(pytest.main([__file__, "-q"]))
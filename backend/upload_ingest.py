@@ -0,0 +1,223 @@
+# Bounded-memory upload ingestion
+
+import os
+import sys
+import mmap
+import hashlib
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from PIL import Image
+
+from image_preprocess import MAX_DIMENSION
+from metrics import register_collector, stage_seconds
+
+try:
+    import resource
+except ImportError:
+    # Windows: no peak RSS (the metric is simply left out)
+    resource = None
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024)
+# Uploads larger than this are spooled to a temporary file instead of RAM
+SPOOL_THRESHOLD_BYTES = int(float(os.getenv("UPLOAD_SPOOL_THRESHOLD_MB", "2")) * 1024 * 1024)
+# Decompression-bomb guard: refuse anything that would decode to more pixels
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(60_000_000)))
+# Formats without draft decoding (PNG, WebP, TIFF...) are decoded at full size
+MAX_FULL_DECODE_PIXELS = int(os.getenv("MAX_FULL_DECODE_PIXELS", str(16_000_000)))
+CHUNK_SIZE = 64 * 1024
+
+# Pillow's own check raises at 2x this value; keep it in line with ours
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsafeImage(Exception):
+    pass
+
+
+class Upload:
+    """A spooled upload: size and SHA-256 computed while copying."""
+
+    def __init__(self, stream, size, digest):
+        self.stream = stream
+        self.size = size
+        self.digest = digest
+        # Pixel size from the image header, set by open_plan
+        self.dimensions = None
+
+    @property
+    def on_disk(self):
+        return bool(getattr(self.stream, '_rolled', False))
+
+    def getvalue(self):
+        self.stream.seek(0)
+        data = self.stream.read()
+        self.stream.seek(0)
+        return data
+
+
+# --- Per-worker memory accounting ---
+_lock = threading.Lock()
+stats = {
+    "in_flight_uploads": 0,
+    "in_flight_memory_bytes": 0,
+    "uploads_total": 0,
+    "uploads_spooled_to_disk": 0,
+    "rejected_too_large": 0,
+    "rejected_unsafe_image": 0,
+}
+
+
+def _rss_bytes():
+    # Linux only; None elsewhere (the metric is left out)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def memory_report():
+    with _lock:
+        report = dict(stats)
+    report["rss_bytes"] = _rss_bytes()
+    report["peak_rss_bytes"] = _peak_rss_bytes()
+    return report
+
+
+def _count(key, delta=1):
+    with _lock:
+        stats[key] += delta
+
+
+@contextmanager
+def spool_upload(file_storage):
+    """Copy an uploaded file into a bounded spool, hashing as it goes.
+
+    Accepts a werkzeug FileStorage or any binary file object.
+
+    Never holds more than SPOOL_THRESHOLD_BYTES of the upload in memory and
+    rejects it with UploadTooLarge as soon as MAX_UPLOAD_BYTES is exceeded
+    (the Content-Length check can be bypassed with chunked bodies).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD_BYTES)
+    h = hashlib.sha256()
+    size = 0
+    memory = 0
+    _count("in_flight_uploads")
+    start = time.perf_counter()
+    try:
+        src = getattr(file_storage, 'stream', file_storage)
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                _count("rejected_too_large")
+                raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+            h.update(chunk)
+            spool.write(chunk)
+        spool.seek(0)
+        stage_seconds.observe(time.perf_counter() - start, stage="upload_read")
+        upload = Upload(spool, size, h.hexdigest())
+        _count("uploads_total")
+        if upload.on_disk:
+            _count("uploads_spooled_to_disk")
+        else:
+            memory = size
+            _count("in_flight_memory_bytes", memory)
+        yield upload
+    finally:
+        if memory:
+            _count("in_flight_memory_bytes", -memory)
+        _count("in_flight_uploads", -1)
+        spool.close()
+
+
+def detach_upload(file_storage):
+    """Copy a request file into a spool owned by the caller.
+
+    Request files are closed once the view returns, so streamed responses
+    that keep working on uploads afterwards need their own copy. Raises
+    UploadTooLarge past MAX_UPLOAD_BYTES, like spool_upload.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD_BYTES)
+    src = getattr(file_storage, 'stream', file_storage)
+    size = 0
+    try:
+        while True:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                _count("rejected_too_large")
+                raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def open_plan(upload):
+    """Decode an upload without materializing an oversized bitmap.
+
+    Only the header is read before the pixel-count check; JPEGs are then
+    decoded at the smallest DCT scale that still covers MAX_DIMENSION.
+    Other formats decode at full size, so they get the lower
+    MAX_FULL_DECODE_PIXELS limit.
+    """
+    upload.stream.seek(0)
+    try:
+        img = Image.open(upload.stream)
+    except Image.DecompressionBombError as e:
+        _count("rejected_unsafe_image")
+        raise UnsafeImage(str(e))
+    w, h = upload.dimensions = img.size
+    if w * h > MAX_IMAGE_PIXELS:
+        _count("rejected_unsafe_image")
+        raise UnsafeImage(f"Image is {w}x{h}; limit is {MAX_IMAGE_PIXELS} pixels")
+    if img.format == 'JPEG':
+        img.draft(img.mode, (MAX_DIMENSION, MAX_DIMENSION))
+    elif w * h > MAX_FULL_DECODE_PIXELS:
+        _count("rejected_unsafe_image")
+        raise UnsafeImage(f"{img.format} image is {w}x{h}; limit is {MAX_FULL_DECODE_PIXELS} pixels "
+                          "(JPEG allows more)")
+    img.load()
+    return img
+
+
+@register_collector
+def _memory_metrics():
+    report = memory_report()
+    yield ("vastu_uploads_in_flight", "gauge", "Uploads currently being processed.",
+           [({}, report["in_flight_uploads"])])
+    yield ("vastu_upload_memory_bytes", "gauge", "Upload bytes currently held in RAM.",
+           [({}, report["in_flight_memory_bytes"])])
+    yield ("vastu_uploads_total", "counter", "Uploads accepted, and how many spooled to disk.",
+           [({"storage": "any"}, report["uploads_total"]),
+            ({"storage": "disk"}, report["uploads_spooled_to_disk"])])
+    yield ("vastu_uploads_rejected_total", "counter", "Uploads rejected by reason.",
+           [({"reason": "too_large"}, report["rejected_too_large"]),
+            ({"reason": "unsafe_image"}, report["rejected_unsafe_image"])])
+    yield ("vastu_process_resident_memory_bytes", "gauge", "Current RSS of this worker.",
+           [({}, report["rss_bytes"])])
+    yield ("vastu_process_peak_resident_memory_bytes", "gauge", "Peak RSS of this worker.",
+           [({}, report["peak_rss_bytes"])])
@@ -0,0 +1,350 @@
+# Upstream protection for Gemini calls: shared rate limit, retry, circuit breaker
+
+import logging
+import os
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+
+from google.api_core import exceptions as google_exceptions
+
+from metrics import upstream_errors
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB_PATH = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.sqlite3"),
+)
+# Requests per minute allowed by the Gemini quota (0 disables pacing)
+RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", "15"))
+RATE_BURST = float(os.getenv("GEMINI_RATE_BURST", os.getenv("GEMINI_RATE_PER_MINUTE", "15")))
+# Longest a request will wait for a token before giving up
+RATE_MAX_WAIT = float(os.getenv("GEMINI_RATE_MAX_WAIT_SECONDS", "20"))
+
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "1"))
+RETRY_MAX_DELAY = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "16"))
+
+BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+TRANSIENT_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class UpstreamUnavailable(Exception):
+    """The model is not being called right now (breaker open or no rate budget)."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+def is_quota_error(e):
+    if isinstance(e, (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)):
+        return True
+    # Other API errors only count by their status (our own messages may say "quota")
+    return isinstance(e, google_exceptions.GoogleAPICallError) and e.code == 429
+
+
+def is_transient(e):
+    return isinstance(e, TRANSIENT_ERRORS) or is_quota_error(e)
+
+
+class SharedTokenBucket:
+    """Token bucket stored in SQLite so every worker process draws from one budget."""
+
+    def __init__(self, db_path=RATE_LIMIT_DB_PATH, rate_per_minute=RATE_PER_MINUTE, burst=RATE_BURST, name="gemini"):
+        self.db_path = db_path
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1.0, burst)
+        self.name = name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "waited_seconds": 0.0, "rejected": 0}
+        if self.enabled:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_buckets ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO token_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, self.burst, time.time()),
+            )
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and bool(self.db_path)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _take(self):
+        """Take a token if available. Returns seconds to wait (0 = acquired)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated = conn.execute(
+                "SELECT tokens, updated FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                "UPDATE token_buckets SET tokens = ?, updated = ? WHERE name = ?",
+                (tokens, now, self.name),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def drain(self):
+        """Empty the bucket after an upstream 429 so all workers back off."""
+        if self.enabled:
+            self._conn().execute(
+                "UPDATE token_buckets SET tokens = MIN(tokens, 0), updated = ? WHERE name = ?",
+                (time.time(), self.name),
+            )
+
+    def _record(self, waited):
+        with self._lock:
+            self.stats["acquired"] += 1
+            self.stats["waited_seconds"] = round(self.stats["waited_seconds"] + waited, 3)
+
+    def _reject(self, wait):
+        with self._lock:
+            self.stats["rejected"] += 1
+        raise UpstreamUnavailable("Gemini rate budget exhausted", wait)
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def acquire(self, max_wait=RATE_MAX_WAIT):
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait == 0:
+                self._record(time.monotonic() - start)
+                return
+            if time.monotonic() - start + wait > max_wait:
+                self._reject(wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, max_wait=RATE_MAX_WAIT):
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        while True:
+            # SQLite may wait on other workers' locks; keep that off the event loop
+            wait = await asyncio.to_thread(self._take)
+            if wait == 0:
+                self._record(time.monotonic() - start)
+                return
+            if time.monotonic() - start + wait > max_wait:
+                self._reject(wait)
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Per-process breaker: opens after consecutive upstream failures and
+    lets a single probe through once `reset_seconds` have passed.
+
+    The probe slot is held by a ticket from before_call(); a probe that ends
+    without a result (refused, cancelled) must hand it back with release().
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probe = None
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "short_circuited": 0}
+
+    @property
+    def probing(self):
+        return self._probe is not None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def _refuse(self):
+        # Caller holds self._lock
+        self.stats["short_circuited"] += 1
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        raise UpstreamUnavailable("Gemini is temporarily unavailable", max(remaining, 1))
+
+    def check(self):
+        """Raise UpstreamUnavailable if a call would be refused right now (takes nothing)."""
+        with self._lock:
+            if self.state == "open" or (self.state == "half-open" and self.probing):
+                self._refuse()
+
+    def before_call(self, probe=True):
+        """Admit a call. Returns the probe ticket if this call is the
+        half-open probe, else None; `probe=False` calls never take the slot."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return None
+            if state == "half-open" and probe and not self.probing:
+                self._probe = object()
+                return self._probe
+            self._refuse()
+
+    def report(self):
+        with self._lock:
+            return {"state": self.state, **self.stats}
+
+    def release(self, ticket):
+        """Free the probe slot if `ticket` still holds it (no result was recorded)."""
+        if ticket is None:
+            return
+        with self._lock:
+            if self._probe is ticket:
+                self._probe = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.stats["opened"] += 1
+                self.opened_at = time.monotonic()
+            self._probe = None
+
+
+def _backoff(attempt):
+    # Full jitter keeps retrying workers from synchronizing
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+class UpstreamGuard:
+    """Wraps model calls with pacing, jittered retries and a circuit breaker."""
+
+    def __init__(self, bucket=None, breaker=None, max_retries=MAX_RETRIES):
+        self.bucket = bucket or SharedTokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "quota_errors": 0, "failures": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _failed(self, e, attempt, retries):
+        """Book-keeping for a failed attempt; returns True if it should be retried."""
+        transient = is_transient(e)
+        upstream_errors.inc(kind="quota" if is_quota_error(e) else "transient" if transient else "other")
+        if is_quota_error(e):
+            self._count("quota_errors")
+            self.bucket.drain()
+        if transient:
+            self.breaker.record_failure()
+        else:
+            # Upstream answered (e.g. bad request); it is not saturated
+            self.breaker.record_success()
+        if transient and attempt < retries and self.breaker.state == "closed":
+            self._count("retries")
+            return True
+        self._count("failures")
+        return False
+
+    def call(self, fn, max_wait=RATE_MAX_WAIT, retries=None, probe=True):
+        """Run fn() under the guard. max_wait=0, retries=0 and probe=False give
+        a single attempt that is refused unless it can go out right now (hedges)."""
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            # Rate budget first: the probe slot is only taken by a call that can go out
+            self.breaker.check()
+            self.bucket.acquire(max_wait)
+            ticket = self.breaker.before_call(probe)
+            self._count("calls")
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._failed(e, attempt, retries):
+                    raise
+                delay = _backoff(attempt)
+                logger.warning("Gemini call failed (%s); retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # No-op once a result was recorded
+                self.breaker.release(ticket)
+
+    async def call_async(self, fn, max_wait=RATE_MAX_WAIT, retries=None, probe=True):
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self.breaker.check()
+            await self.bucket.acquire_async(max_wait)
+            ticket = self.breaker.before_call(probe)
+            self._count("calls")
+            try:
+                result = await fn()
+            except Exception as e:
+                if not self._failed(e, attempt, retries):
+                    raise
+                delay = _backoff(attempt)
+                logger.warning("Gemini call failed (%s); retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # Also runs on cancellation (BaseException); no-op once a result was recorded
+                self.breaker.release(ticket)
+
+    def report(self):
+        with self._lock:
+            report = dict(self.stats)
+        report["rate_limiter"] = self.bucket.report()
+        report["circuit"] = self.breaker.report()
+        return report
@@ -0,0 +1,219 @@
+# Vectorized bulk scoring (NumPy) and a streaming CSV/JSONL CLI
+#
+#   python vastu_batch.py layouts.jsonl -o scores.jsonl
+#   python vastu_batch.py layouts.csv -o scores.csv --language ta
+#
+# Scores match analyze_vastu() exactly; only the score, explanation and
+# good/defect counts are produced (no suggestion cards).
+
+import sys
+import csv
+import json
+import argparse
+import threading
+from itertools import islice
+
+import numpy as np
+
+from ruleset import base_room, get_ruleset
+
+TYPE_CODES = {'good': 1, 'average': 0, 'defect': -1}
+# Bound on memoized raw spellings per vocabulary (free-text input can be unbounded)
+MEMO_LIMIT = 100_000
+
+
+def normalize_room(room):
+    return base_room(room)
+
+
+def normalize_direction(direction):
+    return direction.lower().strip()
+
+
+class RuleMatrix:
+    """The ruleset as integer vocabularies plus room x direction matrices.
+
+    Row/column 0 is reserved for "not in the knowledge base", so unknown
+    rooms or directions index a zero weight without any branching.
+    """
+
+    def __init__(self, ruleset):
+        self.source = ruleset
+        self.version = ruleset.version
+        rooms, directions = set(), set()
+        for room, direction, _ in ruleset.cards:
+            rooms.add(room)
+            directions.add(direction)
+        self.rooms = ['<unknown>'] + sorted(rooms)
+        self.directions = ['<unknown>'] + sorted(directions)
+        self.room_codes = {r: i for i, r in enumerate(self.rooms) if i}
+        self.direction_codes = {d: i for i, d in enumerate(self.directions) if i}
+
+        self.weights = np.zeros((len(self.rooms), len(self.directions)), dtype=np.int32)
+        self.types = np.zeros_like(self.weights, dtype=np.int8)
+        for (room, direction, lang), (rule_type, weight, _) in ruleset.cards.items():
+            if lang != 'en':
+                continue
+            r, d = self.room_codes[room], self.direction_codes[direction]
+            self.weights[r, d] = weight
+            self.types[r, d] = TYPE_CODES.get(rule_type, 0)
+
+        # Memo of raw strings (as produced by the model / database) -> codes
+        self._room_memo = {}
+        self._dir_memo = {}
+
+    def room_code(self, raw):
+        code = self._room_memo.get(raw)
+        if code is None:
+            if len(self._room_memo) >= MEMO_LIMIT:
+                self._room_memo.clear()
+            code = self._room_memo[raw] = self.room_codes.get(normalize_room(raw), 0)
+        return code
+
+    def direction_code(self, raw):
+        code = self._dir_memo.get(raw)
+        if code is None:
+            if len(self._dir_memo) >= MEMO_LIMIT:
+                self._dir_memo.clear()
+            code = self._dir_memo[raw] = self.direction_codes.get(normalize_direction(raw), 0)
+        return code
+
+    def encode(self, layouts):
+        """Encode layouts into padded (n, max_rooms) room/direction code arrays."""
+        width = max((len(layout) for layout in layouts), default=0)
+        rooms = np.zeros((len(layouts), max(width, 1)), dtype=np.int32)
+        directions = np.zeros_like(rooms)
+        for i, layout in enumerate(layouts):
+            for j, (room, direction) in enumerate(layout.items()):
+                rooms[i, j] = self.room_code(room)
+                directions[i, j] = self.direction_code(direction)
+        return rooms, directions
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_rule_matrix():
+    """RuleMatrix for the active ruleset, rebuilt when the ruleset reloads."""
+    global _matrix
+    ruleset = get_ruleset()
+    matrix = _matrix
+    if matrix is None or matrix.source is not ruleset:
+        with _matrix_lock:
+            if _matrix is None or _matrix.source is not ruleset:
+                _matrix = RuleMatrix(ruleset)
+            matrix = _matrix
+    return matrix
+
+
+def analyze_vastu_batch(layouts, language='en'):
+    """Score many room->direction layouts in one vectorized pass.
+
+    Returns a dict of arrays: `score` (int, 0-100), `good` and `defects`
+    (rule counts per layout) and `explanation` (list of strings in
+    `language`).
+    """
+    layouts = list(layouts)
+    matrix = get_rule_matrix()
+    rooms, directions = matrix.encode(layouts)
+
+    raw = 50 + matrix.weights[rooms, directions].sum(axis=1)
+    scores = np.clip(raw, 0, 100)
+    types = matrix.types[rooms, directions]
+
+    ruleset = matrix.source
+    gt = ruleset.strings(language if language in ruleset.languages else 'en')
+    labels = np.array([gt['poor'], gt['average'], gt['excellent']], dtype=object)
+    # Same thresholds as analyze_vastu: > 80 excellent, > 50 average
+    bands = (scores > 50).astype(np.int8) + (scores > 80).astype(np.int8)
+
+    return {
+        "score": scores,
+        "good": (types == 1).sum(axis=1),
+        "defects": (types == -1).sum(axis=1),
+        "explanation": labels[bands].tolist(),
+    }
+
+
+# --- Streaming CLI ---
+
+def _read_jsonl(f):
+    for n, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if isinstance(record.get('layout'), dict):
+            yield record.get('id', n), record['layout']
+        else:
+            yield record.pop('id', n), record
+
+
+def _read_csv(f):
+    # Wide format: optional 'id' column, one column per room, direction as value
+    for n, row in enumerate(csv.DictReader(f)):
+        row_id = row.pop('id', None) or n
+        yield row_id, {room: d for room, d in row.items() if room and d}
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk Vastu scoring for CSV/JSONL layout files.")
+    parser.add_argument('input', help="Input file (.jsonl or .csv), or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="Output file (.jsonl or .csv), default stdout")
+    parser.add_argument('--input-format', choices=['jsonl', 'csv'])
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'])
+    parser.add_argument('--language', default='en')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help="Layouts scored per vectorized pass (bounds memory)")
+    args = parser.parse_args(argv)
+
+    def fmt(path, explicit):
+        if explicit:
+            return explicit
+        return 'csv' if path.endswith('.csv') else 'jsonl'
+
+    in_fmt = fmt(args.input, args.input_format)
+    out_fmt = fmt(args.output, args.output_format)
+
+    fin = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    fout = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        records = _read_csv(fin) if in_fmt == 'csv' else _read_jsonl(fin)
+        writer = None
+        if out_fmt == 'csv':
+            writer = csv.writer(fout)
+            writer.writerow(['id', 'score', 'good', 'defects', 'explanation'])
+        total = 0
+        for chunk in _chunks(records, args.chunk_size):
+            ids = [row_id for row_id, _ in chunk]
+            result = analyze_vastu_batch([layout for _, layout in chunk], args.language)
+            rows = zip(ids, result['score'].tolist(), result['good'].tolist(),
+                       result['defects'].tolist(), result['explanation'])
+            for row_id, score, good, defects, explanation in rows:
+                if writer:
+                    writer.writerow([row_id, score, good, defects, explanation])
+                else:
+                    fout.write(json.dumps({"id": row_id, "score": score, "good": good,
+                                           "defects": defects, "explanation": explanation},
+                                          ensure_ascii=False) + "\n")
+            total += len(chunk)
+        print(f"Scored {total} layouts", file=sys.stderr)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+
+if __name__ == '__main__':
+    main()
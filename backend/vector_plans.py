@@ -0,0 +1,396 @@
+# Vector floor plans (SVG, ASCII DXF): rooms read locally, no model call
+#
+# CAD exports already carry the room outlines and their labels, so the
+# layout comes straight out of the file in milliseconds instead of a model
+# round trip. Closed shapes (rects, polygons, closed paths and polylines)
+# are room outlines; a room is named by its own label (data-room,
+# inkscape:label, <title>) or by the text placed inside it. Each room's
+# direction is the zone holding most of its area (see plan_geometry.py),
+# with North at the top of the drawing.
+#
+# Not handled: <use>/block references (INSERT), hatches, gzipped SVGZ and
+# binary DXF; such files are reported back instead of guessed at.
+
+import os
+import re
+import math
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from plan_geometry import MAX_ROOMS, GridIndex, PlanGeometry, point_in_polygon
+
+# Bound on the work per upload (SVG elements / DXF entities)
+MAX_ELEMENTS = int(os.getenv("VECTOR_MAX_ELEMENTS", "200000"))
+
+# Bytes read to find the SVG root element behind an XML prolog (comments,
+# DOCTYPE, processing instructions); other files are told apart in the first 4 KB
+SNIFF_BYTES = 4096
+PROLOG_MAX_BYTES = 256 * 1024
+_PROLOG = re.compile(rb'(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE(?:[^\[>]|\[.*?\])*>)*', re.S | re.I)
+_SVG_ROOT = re.compile(rb'<(?:[\w.-]+:)?svg[\s>/]')
+_DXF_HEAD = re.compile(rb'\s*(?:999\r?\n[^\n]*\n\s*)?0\r?\n\s*SECTION\b')
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_TRANSFORM = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)')
+_PATH_TOKEN = re.compile(r'[MmLlHhVvZzCcSsQqTtAa]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+# Numbers consumed per segment of each path command (curves keep their end point)
+_PATH_ARITY = {'m': 2, 'l': 2, 'h': 1, 'v': 1, 'c': 6, 's': 4, 'q': 4, 't': 2, 'a': 7, 'z': 0}
+# Labels that are measurements, not names: 12'x10', 3.5 x 4 m, 120 sq ft
+_DIMENSION = re.compile(r"\d[\d.,'\"\s]*[x×X*]\s*\d[\d.,'\"]*\s*(?:mm|cm|m|ft)?\b"
+                        r"|\d[\d.,]*\s*(?:sq\.?\s*(?:ft|m)|sqft|m²|m2)\b")
+_MTEXT_CODES = re.compile(r'\\[A-Za-z][^;\\]*;|\\[LlOoKk~]|[{}]')
+# Elements whose content is never drawn as-is
+_SKIPPED_TAGS = {'defs', 'symbol', 'clipPath', 'mask', 'pattern', 'marker', 'style', 'script', 'metadata'}
+_LABEL_ATTRS = ('data-room', 'data-name', 'data-label',
+                '{http://www.inkscape.org/namespaces/inkscape}label', 'aria-label')
+
+
+class VectorPlanError(ValueError):
+    """A vector upload that can't be turned into a layout (reported as a 400)."""
+
+
+def sniff(head):
+    """'svg', 'dxf' or None (raster / unknown) from the first bytes of an upload.
+
+    An SVG is recognized by its root element, so `head` must reach past the
+    prolog (see sniff_stream()).
+    """
+    if head.startswith(b'AutoCAD Binary DXF'):
+        return 'dxf'
+    text = head.lstrip(b'\xef\xbb\xbf')
+    if text.lstrip().startswith(b'<'):
+        return 'svg' if _SVG_ROOT.match(text, _PROLOG.match(text).end()) else None
+    if _DXF_HEAD.match(head):
+        return 'dxf'
+    return None
+
+
+def sniff_stream(stream):
+    """sniff() an upload stream, reading further for markup; leaves it rewound."""
+    head = stream.read(SNIFF_BYTES)
+    if head.lstrip(b'\xef\xbb\xbf').lstrip().startswith(b'<'):
+        head += stream.read(PROLOG_MAX_BYTES - len(head))
+    stream.seek(0)
+    return sniff(head)
+
+
+def _numbers(text):
+    return [float(v) for v in _NUMBER.findall(text or '')]
+
+
+def _length(el, name):
+    # "12.5mm" / "40px" -> the number; units are irrelevant to zone shares
+    values = _numbers(el.get(name))
+    return values[0] if values else 0.0
+
+
+def _label_text(text):
+    """Room name from a label, or None for measurements, arrows and blanks."""
+    for line in text.splitlines():
+        line = _DIMENSION.sub('', line).strip(" \t-:,;()")
+        if sum(ch.isalpha() for ch in line) >= 2:
+            return ' '.join(line.split())
+    return None
+
+
+# --- SVG ---
+
+def _transform(text):
+    """3x3 affine matrix for an SVG transform list."""
+    m = np.eye(3)
+    for name, args in _TRANSFORM.findall(text):
+        v = _numbers(args)
+        t = np.eye(3)
+        if name == 'matrix' and len(v) == 6:
+            t[:2] = [[v[0], v[2], v[4]], [v[1], v[3], v[5]]]
+        elif name == 'translate' and v:
+            t[0, 2], t[1, 2] = v[0], v[1] if len(v) > 1 else 0.0
+        elif name == 'scale' and v:
+            t[0, 0], t[1, 1] = v[0], v[1] if len(v) > 1 else v[0]
+        elif name == 'rotate' and v:
+            a = math.radians(v[0])
+            t[:2, :2] = [[math.cos(a), -math.sin(a)], [math.sin(a), math.cos(a)]]
+            if len(v) == 3:
+                shift, back = np.eye(3), np.eye(3)
+                shift[:2, 2], back[:2, 2] = v[1:], [-v[1], -v[2]]
+                t = shift @ t @ back
+        elif name == 'skewX' and v:
+            t[0, 1] = math.tan(math.radians(v[0]))
+        elif name == 'skewY' and v:
+            t[1, 0] = math.tan(math.radians(v[0]))
+        m = m @ t
+    return m
+
+
+def _path_outlines(d):
+    """Closed subpaths of an SVG path as point lists (curves reduced to their end points)."""
+    outlines = []
+    points = []
+    x = y = 0.0
+    start = (0.0, 0.0)
+    command = None
+    args = []
+
+    def flush(closed):
+        if len(points) >= 3 and (closed or points[0] == points[-1]):
+            outlines.append(list(points))
+        points.clear()
+
+    for token in _PATH_TOKEN.findall(d or ''):
+        if token.isalpha():
+            command, args = token, []
+            if command in 'Zz':
+                flush(True)
+                x, y = start
+            continue
+        if command is None or command in 'Zz':
+            continue
+        args.append(float(token))
+        lower = command.lower()
+        if len(args) < _PATH_ARITY[lower]:
+            continue
+        relative = command.islower()
+        if lower == 'h':
+            x = x + args[0] if relative else args[0]
+        elif lower == 'v':
+            y = y + args[0] if relative else args[0]
+        else:
+            ex, ey = args[-2], args[-1]
+            x, y = (x + ex, y + ey) if relative else (ex, ey)
+        if lower == 'm':
+            flush(False)
+            start = (x, y)
+            # Further pairs after a moveto are linetos
+            command = 'l' if relative else 'L'
+        points.append((x, y))
+        args = []
+    flush(False)
+    return outlines
+
+
+def _svg_outlines(tag, el):
+    if tag == 'rect':
+        x, y, w, h = _length(el, 'x'), _length(el, 'y'), _length(el, 'width'), _length(el, 'height')
+        return [[(x, y), (x + w, y), (x + w, y + h), (x, y + h)]] if w > 0 and h > 0 else []
+    if tag in ('polygon', 'polyline'):
+        v = _numbers(el.get('points'))
+        points = list(zip(v[0::2], v[1::2]))
+        if len(points) < 3 or (tag == 'polyline' and points[0] != points[-1]):
+            return []
+        return [points]
+    if tag == 'path':
+        return _path_outlines(el.get('d'))
+    return []
+
+
+def _own_label(el):
+    for attr in _LABEL_ATTRS:
+        if el.get(attr):
+            return el.get(attr)
+    for child in el:
+        if child.tag.rsplit('}', 1)[-1] == 'title' and child.text:
+            return child.text
+    return None
+
+
+def _parse_svg(data):
+    if b'<!ENTITY' in data:
+        # Entity expansion is a resource-exhaustion vector and never needed for a plan
+        raise VectorPlanError("SVG files with entity declarations are not supported")
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise VectorPlanError(f"Invalid SVG: {e}")
+
+    shapes, texts = [], []
+    seen = 0
+    stack = [(root, np.eye(3))]
+    while stack:
+        el, matrix = stack.pop()
+        seen += 1
+        if seen > MAX_ELEMENTS:
+            raise VectorPlanError(f"SVG has more than {MAX_ELEMENTS} elements")
+        tag = el.tag.rsplit('}', 1)[-1] if isinstance(el.tag, str) else ''
+        if tag in _SKIPPED_TAGS:
+            continue
+        if el.get('transform'):
+            matrix = matrix @ _transform(el.get('transform'))
+        if tag == 'text':
+            x, y = _length(el, 'x'), _length(el, 'y')
+            if el.get('x') is None:
+                # Position given on the first <tspan> only
+                for child in el:
+                    if child.get('x') is not None:
+                        x, y = _length(child, 'x'), _length(child, 'y')
+                        break
+            px, py, _ = matrix @ (x, y, 1.0)
+            texts.append((px, py, '\n'.join(t.strip() for t in el.itertext() if t.strip())))
+            continue
+        label = None
+        for outline in _svg_outlines(tag, el):
+            if label is None:
+                label = _own_label(el) or ''
+            points = np.asarray(outline, dtype=np.float64) @ matrix[:2, :2].T + matrix[:2, 2]
+            shapes.append((points, label or None))
+        stack.extend((child, matrix) for child in reversed(el))
+    return shapes, texts
+
+
+# --- DXF ---
+
+def _dxf_entities(text):
+    """(type, [(code, value), ...]) for each entity in the ENTITIES section."""
+    lines = text.splitlines()
+    section = entity = None
+    count = 0
+    for i in range(0, len(lines) - 1, 2):
+        raw, value = lines[i].strip(), lines[i + 1].strip()
+        try:
+            code = int(raw)
+        except ValueError:
+            raise VectorPlanError(f"Malformed DXF group code on line {i + 1}")
+        if code == 0:
+            if entity is not None:
+                yield entity
+                entity = None
+            if value == 'SECTION':
+                section = ''
+            elif value == 'ENDSEC':
+                section = None
+            elif section == 'ENTITIES':
+                count += 1
+                if count > MAX_ELEMENTS:
+                    raise VectorPlanError(f"DXF has more than {MAX_ELEMENTS} entities")
+                entity = (value, [])
+        elif code == 2 and section == '':
+            section = value
+        elif entity is not None:
+            entity[1].append((code, value))
+    if entity is not None:
+        yield entity
+
+
+def _dxf_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise VectorPlanError(f"Malformed DXF coordinate: {value!r}")
+
+
+def _dxf_text(kind, codes):
+    values = dict(codes)
+    point = (values.get(10), values.get(20))
+    if kind == 'TEXT' and (values.get(72, '0') != '0' or values.get(73, '0') != '0') and 11 in values:
+        # Aligned text is anchored at its second alignment point
+        point = (values.get(11), values.get(21))
+    if point[0] is None or point[1] is None:
+        return None
+    if kind == 'MTEXT':
+        # Long MTEXT is split over 3 (continuation) codes before the final 1
+        raw = ''.join(v for c, v in codes if c == 3) + values.get(1, '')
+        raw = _MTEXT_CODES.sub('', raw.replace('\\P', '\n'))
+    else:
+        raw = values.get(1, '')
+    return _dxf_float(point[0]), _dxf_float(point[1]), raw
+
+
+def _parse_dxf(data):
+    if data.startswith(b'AutoCAD Binary DXF'):
+        raise VectorPlanError("Binary DXF is not supported; export the plan as ASCII DXF")
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        # Pre-2007 DXF files use the drawing's ANSI code page
+        text = data.decode('latin-1')
+
+    shapes, texts = [], []
+    polyline = None
+    for kind, codes in _dxf_entities(text):
+        if kind == 'LWPOLYLINE':
+            xs = [_dxf_float(v) for c, v in codes if c == 10]
+            ys = [_dxf_float(v) for c, v in codes if c == 20]
+            closed = int(dict(codes).get(70, '0') or 0) & 1
+            points = list(zip(xs, ys))
+            if len(points) >= 3 and (closed or points[0] == points[-1]):
+                shapes.append(points)
+        elif kind == 'POLYLINE':
+            polyline = (int(dict(codes).get(70, '0') or 0) & 1, [])
+        elif kind == 'VERTEX' and polyline is not None:
+            values = dict(codes)
+            if 10 in values and 20 in values:
+                polyline[1].append((_dxf_float(values[10]), _dxf_float(values[20])))
+        elif kind == 'SEQEND' and polyline is not None:
+            closed, points = polyline
+            if len(points) >= 3 and (closed or points[0] == points[-1]):
+                shapes.append(points)
+            polyline = None
+        elif kind in ('TEXT', 'MTEXT'):
+            text_entity = _dxf_text(kind, codes)
+            if text_entity is not None:
+                texts.append(text_entity)
+
+    # CAD y grows upwards; flip so the top of the drawing is North, as in images
+    shapes = [(np.array([(x, -y) for x, y in points]), None) for points in shapes]
+    texts = [(x, -y, raw) for x, y, raw in texts]
+    return shapes, texts
+
+
+# --- Layout ---
+
+def _shoelace(points):
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(y[:-1], x[1:]) + x[-1] * y[0] - y[-1] * x[0])
+
+
+def _layout(shapes, texts, kind):
+    shapes = [(points, label) for points, label in shapes if _shoelace(points) > 0]
+    if not shapes:
+        raise VectorPlanError(f"No closed room outlines found in the {kind.upper()} file")
+    boxes = np.array([(p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()) for p, _ in shapes])
+    extent = (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+    areas = [_shoelace(p) for p, _ in shapes]
+    names = [_label_text(label) if label else None for _, label in shapes]
+
+    # Each text names the smallest outline around it, unless that is already named
+    index = GridIndex(boxes, extent)
+    for x, y, raw in texts:
+        label = _label_text(raw)
+        if not label:
+            continue
+        hits = [i for i in index.at(x, y) if point_in_polygon(x, y, shapes[i][0])]
+        if hits:
+            i = min(hits, key=areas.__getitem__)
+            if names[i] is None:
+                names[i] = label
+
+    named = [i for i, name in enumerate(names) if name]
+    # A named outline around two or more named rooms is a unit/floor/plot, not a room
+    centroids = {i: shapes[i][0].mean(axis=0) for i in named}
+    rooms = []
+    for i in named:
+        inner = sum(1 for j in index.query(boxes[i])
+                    if j != i and j in centroids and point_in_polygon(*centroids[j], shapes[i][0]))
+        if inner < 2:
+            rooms.append((names[i], tuple(boxes[i]), shapes[i][0]))
+
+    if not rooms:
+        raise VectorPlanError(f"No labeled rooms found in the {kind.upper()} file "
+                              "(put each room's name inside its outline)")
+    if len(rooms) > MAX_ROOMS:
+        raise VectorPlanError(f"At most {MAX_ROOMS} rooms per plan")
+    try:
+        return PlanGeometry(rooms, bounds=extent).layout()
+    except VectorPlanError:
+        raise
+    except ValueError as e:
+        # Too many outline points, rooms outside the drawing, ...
+        raise VectorPlanError(str(e)) from None
+
+
+def parse_vector_plan(data, kind):
+    """Room -> direction layout (as analyze_vastu takes it) from SVG/DXF bytes.
+
+    Raises VectorPlanError when the file can't be read or has no labeled rooms.
+    """
+    shapes, texts = _parse_svg(data) if kind == 'svg' else _parse_dxf(data)
+    return _layout(shapes, texts, kind)
@@ -0,0 +1,126 @@
+# Room / direction vocabulary for model output
+#
+# The model says "Bathroom", "NE", "north east corner" or "top-right"; the
+# knowledge base says "toilet" and "north-east". Everything extracted from a
+# reply goes through here so lookups, caches and streamed cards agree.
+
+import re
+import threading
+from functools import lru_cache
+
+from ruleset import get_ruleset
+
+DIRECTIONS = ('north', 'north-east', 'east', 'south-east', 'south', 'south-west', 'west', 'north-west')
+CENTER = 'center'
+
+# Plan positions assume the top of the image is North (as the prompt says)
+_AXES = {
+    'n': ('north', None), 'north': ('north', None), 'northern': ('north', None),
+    'top': ('north', None), 'upper': ('north', None),
+    's': ('south', None), 'south': ('south', None), 'southern': ('south', None),
+    'bottom': ('south', None), 'lower': ('south', None),
+    'e': (None, 'east'), 'east': (None, 'east'), 'eastern': (None, 'east'), 'right': (None, 'east'),
+    'w': (None, 'west'), 'west': (None, 'west'), 'western': (None, 'west'), 'left': (None, 'west'),
+    'ne': ('north', 'east'), 'northeast': ('north', 'east'),
+    'nw': ('north', 'west'), 'northwest': ('north', 'west'),
+    'se': ('south', 'east'), 'southeast': ('south', 'east'),
+    'sw': ('south', 'west'), 'southwest': ('south', 'west'),
+}
+_UNKNOWN = {'', 'n/a', 'na', 'none', 'unknown', 'not visible'}
+_CENTER_WORDS = {'center', 'centre', 'central', 'middle', 'brahmasthan'}
+_TOKEN = re.compile(r'[a-z]+')
+_ROOM_SEP = re.compile(r'[\s\-/]+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_direction(raw):
+    """Canonical compass direction ("north-east", ..., "center").
+
+    Unrecognized text is returned lower-cased, so the engine treats it as a
+    neutral placement instead of failing.
+    """
+    text = raw.strip().lower()
+    if text in DIRECTIONS or text in _UNKNOWN:
+        return text
+    ns = ew = None
+    center = False
+    for token in _TOKEN.findall(text):
+        axes = _AXES.get(token)
+        if axes is None:
+            center = center or token in _CENTER_WORDS
+            continue
+        a, b = axes
+        if (a and ns and a != ns) or (b and ew and b != ew):
+            return text
+        ns, ew = a or ns, b or ew
+    if ns and ew:
+        return f"{ns}-{ew}"
+    if ns or ew:
+        return ns or ew
+    return CENTER if center else text
+
+
+def room_token(raw):
+    return _ROOM_SEP.sub('_', raw.strip().lower()).strip('_')
+
+
+# (ruleset, alias -> canonical room, memo of raw spelling -> normalized room)
+_alias_index = (None, {}, {})
+_alias_lock = threading.Lock()
+# Bound on memoized raw spellings (free-text input can be unbounded)
+MEMO_LIMIT = 10_000
+
+
+def _aliases():
+    """Alias index for the active ruleset (rebuilt when it reloads)."""
+    global _alias_index
+    ruleset = get_ruleset()
+    current = _alias_index
+    if current[0] is not ruleset:
+        with _alias_lock:
+            index = {}
+            for room, names in ruleset.room_aliases.items():
+                for name in names:
+                    index[room_token(name)] = room
+            current = _alias_index = (ruleset, index, {})
+    return current
+
+
+def normalize_room(raw, _index=None):
+    _, index, memo = _index or _aliases()
+    room = memo.get(raw)
+    if room is None:
+        if len(memo) >= MEMO_LIMIT:
+            memo.clear()
+        token = room_token(raw)
+        room = memo[raw] = index.get(token, token)
+    return room
+
+
+class LayoutBuilder:
+    """Accumulates normalized room -> direction pairs.
+
+    Used for both whole replies and streamed ones, so a streamed card and
+    the final layout always name a room the same way. A room seen again
+    (a second bedroom, whichever way it faces) is kept as "<room>_2",
+    "<room>_3", ...; rules for these are looked up by the base room.
+    """
+
+    def __init__(self):
+        self.layout = {}
+        # One ruleset for the whole reply, even if the rules reload meanwhile
+        self._aliases = _aliases()
+
+    def add(self, room, direction):
+        """Add one pair; returns the stored (room, direction), or None if nothing was added."""
+        if not isinstance(room, str) or not isinstance(direction, str) or not room.strip():
+            return None
+        key = normalize_room(room, self._aliases)
+        value = normalize_direction(direction)
+        if key in self.layout:
+            n = 2
+            while f"{key}_{n}" in self.layout:
+                n += 1
+            key = f"{key}_{n}"
+        self.layout[key] = value
+        return key, value
@@ -1,3 +1,5 @@
+import 'dart:convert';
+import 'dart:io';
 import 'dart:typed_data';
 import 'dart:math';
 import 'package:flutter/foundation.dart';
@@ -283,6 +285,10 @@ class VastuEngine {
       s.split(' ').map((w) => w.isEmpty ? '' : '${w[0].toUpperCase()}${w.substring(1)}').join(' ');
 
   static VastuResult analyze(Map<String, String> roomData) {
+    // Score with the server's rules once they have been downloaded
+    final rules = ServerRuleset.current;
+    if (rules != null) return rules.score(roomData);
+
     int score = 50;
     final List<VastuSuggestion> suggestions = [];
 
@@ -324,6 +330,121 @@ class VastuEngine {
   }
 }
 
+// ─── SERVER RULESET (offline scoring) ────────────────────────────────────────
+//
+// The backend serves its rules and translations at GET /ruleset (see
+// backend/ruleset_export.py). Once downloaded, layouts are scored here with
+// the server's own weights and texts; later refreshes send If-None-Match,
+// so an unchanged ruleset costs a 304. Build with
+// --dart-define=VASTU_API_URL=http://<host>:5000 to enable it; otherwise the
+// bundled table above is used.
+
+const String kApiUrl = String.fromEnvironment('VASTU_API_URL');
+
+class ServerRuleset {
+  ServerRuleset._(this.version, this.etag, this._doc) {
+    final rooms = (_doc['rooms'] as List).cast<String>();
+    final dirs = (_doc['directions'] as List).cast<String>();
+    final rules = _doc['rules'] as List;
+    for (var i = 0; i < rules.length; i++) {
+      final rule = rules[i] as List;
+      _index['${rooms[rule[0] as int]}|${dirs[rule[1] as int]}'] = i;
+    }
+  }
+
+  factory ServerRuleset.fromJson(String body, {String etag = ''}) {
+    final doc = jsonDecode(body) as Map<String, dynamic>;
+    if (doc['format'] != 1) {
+      throw FormatException('Unsupported ruleset format: ${doc['format']}');
+    }
+    return ServerRuleset._(doc['version'] as int, etag, doc);
+  }
+
+  static ServerRuleset? current;
+  static final _repeatSuffix = RegExp(r'(_\d+)+$');
+
+  final int version;
+  final String etag;
+  final Map<String, dynamic> _doc;
+  final Map<String, int> _index = {};
+
+  /// Downloads the ruleset, keeping the current one when the server answers 304.
+  static Future<void> refresh(String baseUrl) async {
+    final client = HttpClient()..connectionTimeout = const Duration(seconds: 5);
+    try {
+      final request = await client.getUrl(Uri.parse('$baseUrl/ruleset'));
+      final known = current;
+      if (known != null && known.etag.isNotEmpty) {
+        request.headers.set(HttpHeaders.ifNoneMatchHeader, known.etag);
+      }
+      final response = await request.close();
+      if (response.statusCode == HttpStatus.notModified) {
+        await response.drain<void>();
+        return;
+      }
+      if (response.statusCode != HttpStatus.ok) {
+        await response.drain<void>();
+        throw HttpException('GET /ruleset failed: ${response.statusCode}');
+      }
+      final body = await response.transform(utf8.decoder).join();
+      current = ServerRuleset.fromJson(body, etag: response.headers.value(HttpHeaders.etagHeader) ?? '');
+    } finally {
+      client.close();
+    }
+  }
+
+  /// Same result as the server's analyze_vastu() for this layout.
+  VastuResult score(Map<String, String> roomData, {String language = 'en'}) {
+    final languages = _doc['languages'] as Map<String, dynamic>;
+    final lang = languages.containsKey(language) ? language : 'en';
+    final strings = (languages[lang]['strings'] as Map).cast<String, String>();
+    final cards = languages[lang]['cards'] as List;
+    final fallback = languages['en']['cards'] as List;
+    final types = (_doc['types'] as List).cast<String>();
+    final rules = _doc['rules'] as List;
+    final scoring = _doc['scoring'] as Map<String, dynamic>;
+
+    int total = scoring['base'] as int;
+    final List<VastuSuggestion> suggestions = [];
+    for (final entry in roomData.entries) {
+      // 'bedroom_2' is a second bedroom: scored by the bedroom rules
+      final room = entry.key.toLowerCase().replaceAll(' ', '_').trim().replaceFirst(_repeatSuffix, '');
+      final dir = entry.value.toLowerCase().trim();
+      final i = _index['$room|$dir'];
+      if (i == null) {
+        suggestions.add(VastuSuggestion(
+          type: 'neutral',
+          title: strings['neutral_title']!.replaceAll('{room}', entry.key).replaceAll('{dir}', entry.value),
+          impact: strings['neutral_impact']!,
+          remedy: strings['neutral_remedy']!,
+          detail: '',
+        ));
+        continue;
+      }
+      final rule = rules[i] as List;
+      total += rule[3] as int;
+      final text = ((cards[i] ?? fallback[i]) as List).cast<String>();
+      suggestions.add(VastuSuggestion(
+        type: types[rule[2] as int],
+        title: text[0],
+        impact: text[1],
+        remedy: text[2],
+        detail: text[3],
+      ));
+    }
+
+    final score = total.clamp(scoring['min'] as int, scoring['max'] as int);
+    var band = scoring['below'] as String;
+    for (final b in scoring['bands'] as List) {
+      if (score > (b[0] as int)) {
+        band = b[1] as String;
+        break;
+      }
+    }
+    return VastuResult(score: score, explanation: strings[band]!, suggestions: suggestions);
+  }
+}
+
 // ─── APP ─────────────────────────────────────────────────────────────────────
 
 class VastuAIApp extends StatelessWidget {
@@ -375,6 +496,11 @@ class _HomePageState extends State<HomePage> with TickerProviderStateMixin {
       vsync: this,
       duration: const Duration(seconds: 8),
     )..repeat();
+    if (kApiUrl.isNotEmpty) {
+      ServerRuleset.refresh(kApiUrl).catchError((Object e) {
+        debugPrint('Ruleset download failed, using bundled rules: $e');
+      });
+    }
   }
 
   @override